@@ -5,10 +5,45 @@ Autor: Daniel Cambría + Warp
 """
 
 import os
+import sys
+import sqlite3
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from tilelib.landmask import LandMask
+from tilelib.pngcheck import write_repair_list, REPAIR_LIST_FILENAME
+from tilelib.region import iter_zoom_tiles
+from tilelib.tileindex import TileIndex, INVENTORY_INDEX_FILENAME
 
 TILES_DIR = Path(__file__).parent.parent / 'tiles'
+MBTILES_FILE = TILES_DIR.parent / 'tiles.mbtiles'
+REPAIR_LIST_FILE = TILES_DIR / REPAIR_LIST_FILENAME
+INVENTORY_INDEX_FILE = TILES_DIR / INVENTORY_INDEX_FILENAME
+
+# Mesmos zooms de download-tiles.py (cobertura comparada com o plano exato)
+MIN_ZOOM = 5
+MAX_ZOOM = 12
+
+# --crc: conferir o CRC de todos os chunks (lê cada arquivo inteiro, mais lento)
+# --full: descartar o índice de inventário e reler a árvore inteira
+# --workers=N: processos da varredura (padrão: núcleos da máquina)
+VERIFY_CRC = '--crc' in sys.argv
+FULL_RESCAN = '--full' in sys.argv
+WORKERS = next((int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--workers=')), os.cpu_count() or 4)
+
+def plan_coverage(index, landmask, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    {zoom: (esperados, encontrados)} contra o plano exato do download-tiles.py
+    (bounds + máscara de terra): só contam os tiles indexados que estão no
+    plano, então tiles de fora (bbox antiga, overzoom) não inflam a cobertura
+    """
+    coverage = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        planned = set(iter_zoom_tiles(zoom, min_zoom, landmask))
+        coverage[zoom] = (len(planned), len(planned & index.zoom_tiles(zoom)))
+    return coverage
+
 
 def analyze_tiles():
     """Analisar tiles baixados"""
@@ -19,54 +54,31 @@ def analyze_tiles():
     
     print(f"🔍 Analisando tiles em: {TILES_DIR}\n")
     
-    # Estatísticas por zoom level
-    stats_by_zoom = defaultdict(lambda: {
-        'count': 0,
-        'total_size': 0,
-        'min_size': float('inf'),
-        'max_size': 0,
-        'corrupted': 0,
-        'empty': 0
-    })
-    
-    total_files = 0
-    total_size = 0
-    corrupted_files = []
-    suspiciously_small = []
-    
-    print("Escaneando arquivos...")
-    
-    # Percorrer todos os tiles
-    for zoom_dir in sorted(TILES_DIR.iterdir()):
-        if not zoom_dir.is_dir() or zoom_dir.name.startswith('.'):
-            continue
-        
-        try:
-            zoom = int(zoom_dir.name)
-        except ValueError:
-            continue
-        
-        for x_dir in zoom_dir.iterdir():
-            if not x_dir.is_dir():
-                continue
-            
-            for tile_file in x_dir.glob('*.png'):
-                total_files += 1
-                size = tile_file.stat().st_size
-                total_size += size
-                
-                stats_by_zoom[zoom]['count'] += 1
-                stats_by_zoom[zoom]['total_size'] += size
-                stats_by_zoom[zoom]['min_size'] = min(stats_by_zoom[zoom]['min_size'], size)
-                stats_by_zoom[zoom]['max_size'] = max(stats_by_zoom[zoom]['max_size'], size)
-                
-                # Verificar tiles suspeitos
-                if size == 0:
-                    stats_by_zoom[zoom]['empty'] += 1
-                    corrupted_files.append(str(tile_file))
-                elif size < 100:  # Tiles válidos geralmente têm > 500 bytes
-                    stats_by_zoom[zoom]['corrupted'] += 1
-                    suspiciously_small.append((str(tile_file), size))
+    # Índice persistente: só os diretórios tiles/{z}/{x}/ alterados desde a
+    # última análise (mtime diferente) são relidos, num pool de processos
+    index = TileIndex(INVENTORY_INDEX_FILE)
+    if FULL_RESCAN:
+        index.reset()
+    print(f"Atualizando índice de inventário ({WORKERS} processos, "
+          f"{'CRC completo' if VERIFY_CRC else 'assinatura/IHDR/IEND'})...")
+    with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+        rescanned = index.reconcile(TILES_DIR, VERIFY_CRC,
+                                    map_fn=lambda fn, tasks: pool.map(fn, tasks, chunksize=16))
+    print(f"Diretórios relidos: {rescanned:,}")
+    
+    # Estatísticas por zoom level (agregados do índice)
+    stats_by_zoom = {
+        zoom: {'count': count, 'total_size': size, 'min_size': min_size, 'max_size': max_size}
+        for zoom, (count, size, min_size, max_size) in index.zoom_stats().items()
+    }
+    total_files, total_size, unique_size, shared_blobs = index.totals()
+    problems_by_reason = defaultdict(list)  # motivo -> [(z, x, y, size)]
+    for z, x, y, reason, size in index.problems():
+        problems_by_reason[reason].append((z, x, y, size))
+    derived_by_zoom = {z: sum(methods.values()) for z, methods in index.derived_stats().items()}
+    # Tiles esperados = plano exato do download-tiles.py (bounds + máscara de terra)
+    coverage_by_zoom = plan_coverage(index, LandMask())
+    index.close()
     
     # Relatório
     print(f"\n{'='*70}")
@@ -77,6 +89,33 @@ def analyze_tiles():
     print(f"Tamanho médio: {total_size / total_files / 1024:.1f} KB" if total_files > 0 else "N/A")
     print()
     
+    # Deduplicação (hardlinks gravados pelos downloaders para payloads idênticos)
+    if total_files > 0:
+        saved = total_size - unique_size
+        print(f"♻️  Deduplicação (hardlinks):")
+        print(f"   Blobs compartilhados: {shared_blobs:,}")
+        print(f"   Razão de dedup: {total_size / unique_size:.2f}x" if unique_size > 0 else "   Razão de dedup: N/A")
+        print(f"   Bytes economizados: {saved / (1024**2):.1f} MB (em disco: {unique_size / (1024**3):.2f} GB)")
+        print()
+    
+    if MBTILES_FILE.exists():
+        conn = sqlite3.connect(str(MBTILES_FILE))
+        try:
+            tiles_count, logical = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(i.tile_data)), 0)'
+                ' FROM map m JOIN images i ON i.tile_id = m.tile_id'
+            ).fetchone()
+            blobs_count, physical = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(tile_data)), 0) FROM images'
+            ).fetchone()
+        finally:
+            conn.close()
+        print(f"🗄️  MBTiles ({MBTILES_FILE.name}): {tiles_count:,} tiles, {blobs_count:,} blobs únicos")
+        if physical > 0:
+            print(f"   Razão de dedup: {logical / physical:.2f}x | "
+                  f"Bytes economizados: {(logical - physical) / (1024**2):.1f} MB")
+        print()
+    
     print(f"{'='*70}")
     print(f"📈 ESTATÍSTICAS POR ZOOM LEVEL")
     print(f"{'='*70}")
@@ -99,56 +138,57 @@ def analyze_tiles():
     print(f"⚠️  PROBLEMAS IDENTIFICADOS")
     print(f"{'='*70}")
     
-    if corrupted_files:
-        print(f"❌ Arquivos vazios (0 bytes): {len(corrupted_files)}")
-        if len(corrupted_files) <= 10:
-            for f in corrupted_files:
-                print(f"   - {f}")
-        else:
-            print(f"   (listando primeiros 10)")
-            for f in corrupted_files[:10]:
-                print(f"   - {f}")
-    
-    if suspiciously_small:
-        print(f"\n⚠️  Arquivos suspeitos (< 100 bytes): {len(suspiciously_small)}")
-        if len(suspiciously_small) <= 10:
-            for f, size in suspiciously_small:
-                print(f"   - {f} ({size} bytes)")
-        else:
+    reason_labels = {
+        'empty': '❌ Arquivos vazios (0 bytes)',
+        'html': '❌ Páginas HTML/erro gravadas como PNG',
+        'bad_signature': '❌ Assinatura PNG inválida',
+        'bad_ihdr': '❌ Cabeçalho IHDR inválido',
+        'truncated': '❌ PNG truncado (sem IEND)',
+        'bad_crc': '❌ CRC de chunk incorreto',
+        'blocked': '🛑 Imagem de bloqueio do OSM',
+        'unreadable': '❌ Arquivos ilegíveis',
+    }
+    for reason, tiles in sorted(problems_by_reason.items()):
+        print(f"{reason_labels.get(reason, reason)}: {len(tiles)}")
+        if len(tiles) > 10:
             print(f"   (listando primeiros 10)")
-            for f, size in suspiciously_small[:10]:
-                print(f"   - {f} ({size} bytes)")
+        for z, x, y, size in tiles[:10]:
+            print(f"   - {TILES_DIR / str(z) / str(x) / f'{y}.png'} ({size} bytes)")
     
-    if not corrupted_files and not suspiciously_small:
+    if problems_by_reason:
+        repair = [(z, x, y, reason) for reason, tiles in problems_by_reason.items() for z, x, y, _ in tiles]
+        repair.sort()
+        write_repair_list(REPAIR_LIST_FILE, repair)
+        print()
+        print(f"🔧 Lista de reparo ({len(repair):,} tiles): {REPAIR_LIST_FILE}")
+        print(f"   Baixar de novo: python3 scripts/download-tiles.py --repair")
+    else:
         print("✅ Nenhum problema encontrado!")
+        REPAIR_LIST_FILE.unlink(missing_ok=True)
     
     print()
     print(f"{'='*70}")
     print(f"💡 DIAGNÓSTICO")
     print(f"{'='*70}")
     
-    # Calcular tiles esperados vs encontrados
-    expected_tiles = 0
-    for zoom in range(5, 13):  # MIN_ZOOM to MAX_ZOOM
-        # Aproximação grosseira da área da América do Sul
-        tiles_per_zoom = {
-            5: 6 * 8,      # ~48
-            6: 12 * 16,    # ~192
-            7: 24 * 32,    # ~768
-            8: 48 * 64,    # ~3,072
-            9: 96 * 128,   # ~12,288
-            10: 192 * 256, # ~49,152
-            11: 384 * 512, # ~196,608
-            12: 768 * 1024 # ~786,432
-        }
-        expected_tiles += tiles_per_zoom.get(zoom, 0)
-    
-    found_tiles = total_files
-    coverage = (found_tiles / expected_tiles * 100) if expected_tiles > 0 else 0
-    
-    print(f"Tiles esperados (estimativa): ~{expected_tiles:,}")
-    print(f"Tiles encontrados: {found_tiles:,}")
-    print(f"Cobertura: ~{coverage:.1f}%")
+    expected_tiles_total = 0
+    found_in_plan = 0
+    print(f"{'Zoom':<6} {'Esperados':>12} {'No plano':>12} {'Derivados':>10} {'Cobertura':>10}")
+    for zoom, (expected, found) in coverage_by_zoom.items():
+        expected_tiles_total += expected
+        found_in_plan += found
+        print(f"{zoom:<6} {expected:>12,} {found:>12,} {derived_by_zoom.get(zoom, 0):>10,} "
+              f"{found / expected * 100 if expected else 0:>9.1f}%")
+    print()
+    
+    coverage = (found_in_plan / expected_tiles_total * 100) if expected_tiles_total > 0 else 0
+    
+    print(f"Tiles esperados (plano z={MIN_ZOOM}-{MAX_ZOOM}): {expected_tiles_total:,}")
+    print(f"Tiles encontrados no plano: {found_in_plan:,} (de {total_files:,} indexados)")
+    derived_in_range = sum(derived_by_zoom.get(zoom, 0) for zoom in coverage_by_zoom)
+    if derived_in_range:
+        print(f"   derivados localmente (derive-tiles.py, z={MIN_ZOOM}-{MAX_ZOOM}): {derived_in_range:,}")
+    print(f"Cobertura: {coverage:.1f}%")
     print()
     
     if coverage < 30:
@@ -162,7 +202,7 @@ def analyze_tiles():
         print("   - Áreas fora do limite do OSM")
         print()
         print("✅ Tiles baixados com sucesso SÃO os que importam!")
-        print("   Esses 206,934 tiles contêm TODO o mapeamento disponível da região.")
+        print(f"   Esses {found_in_plan:,} tiles contêm TODO o mapeamento disponível da região.")
 
 if __name__ == '__main__':
     analyze_tiles()
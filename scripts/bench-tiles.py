@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos downloaders contra um servidor de tiles local (sem rede)
+
+Uso:
+  python3 bench-tiles.py [--scenario=baseline,ocean,...] [--downloader=full,essential]
+                         [--tiles=N] [--rate=R] [--strace] [--results=ARQUIVO]
+
+Para cada cenário (tilelib/standin.py: baseline, jitter, ocean, throttle,
+blocked) e downloader (TileDownloader de download-tiles.py = full,
+EssentialDownloader de download-tiles-essential.py = essential):
+- sobe o servidor local em 127.0.0.1-3 (três "espelhos" no loopback)
+- roda o downloader num processo próprio, gravando num diretório temporário
+- mede tiles/s, latência p50/p99 por requisição, CPU, pico de RSS e syscalls
+  (total exato com --strace, se o strace estiver instalado; senão as
+  syscalls de leitura/escrita de /proc/self/io e as trocas de contexto)
+Os resultados vão para bench/bench.jsonl (fora de tiles/, ou --results=ARQUIVO)
+com a revisão do git, e cada medida é comparada com a anterior do mesmo
+cenário/downloader/carga. Os downloaders são importados com LOGS_DIR apontando
+para o diretório temporário, então nada é gravado na árvore de tiles real.
+"""
+
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+from tilelib.loader import load_script
+from tilelib.ratelimit import AdaptiveRateLimiter, host_of
+from tilelib.region import iter_zoom_tiles
+from tilelib.standin import SCENARIOS, serve
+from tilelib.storage import DirectoryStorage
+
+SCRIPTS_DIR = Path(__file__).parent
+RESULTS_FILE = SCRIPTS_DIR.parent / 'bench' / 'bench.jsonl'
+
+STANDIN_HOSTS = ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+BENCH_ZOOM = 10  # carga: os primeiros N tiles do plano z10 (bbox da América do Sul)
+DOWNLOADERS = {
+    'full': ('download-tiles', 'download_tile_with_retry'),
+    'essential': ('download-tiles-essential', 'download'),
+}
+
+
+def arg_value(name, default=None):
+    """Valor de uma opção --nome=valor em sys.argv"""
+    prefix = f'--{name}='
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def proc_io():
+    """(syscalls de leitura, de escrita) do processo — /proc/self/io (Linux)"""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['syscr']), int(fields['syscw'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def run_worker(config_path):
+    """Processo medido: um downloader contra o servidor local"""
+    with open(config_path) as f:
+        cfg = json.load(f)
+    tiles = [tuple(t) for t in cfg['tiles']]
+    urls = cfg['urls']
+    workdir = Path(cfg['workdir'])
+    script, method = DOWNLOADERS[cfg['downloader']]
+
+    module = load_script(script)
+    module.TILE_SERVERS = urls
+    module.LOGS_DIR = workdir
+    storage = DirectoryStorage(workdir / 'tiles')
+    limiter = AdaptiveRateLimiter(cfg['rate'], per_host_rate=cfg['rate'] / len(urls),
+                                  hosts=[host_of(u) for u in urls])
+    if cfg['downloader'] == 'full':
+        downloader = module.TileDownloader(storage=storage, limiter=limiter)
+        downloader.start_time = time.time()
+        job = lambda: module.download_all_tiles(iter(tiles), len(tiles), downloader, on_progress=lambda c: None)
+    else:
+        downloader = module.EssentialDownloader(storage=storage, limiter=limiter)
+        job = lambda: module.run(tiles, downloader)
+
+    # Latência de cada requisição (inclui o parsing da resposta, não a espera no limiter)
+    latencies = []
+    fetch = downloader.mirrors.fetch
+
+    async def timed_fetch(*args, wait=None, **kwargs):
+        start = None
+
+        async def timed_wait():
+            nonlocal start
+            if wait is not None:
+                await wait()
+            start = time.perf_counter()
+
+        try:
+            return await fetch(*args, wait=timed_wait, **kwargs)
+        finally:
+            if start is not None:
+                latencies.append(time.perf_counter() - start)
+
+    downloader.mirrors.fetch = timed_fetch
+
+    completed = 0
+    handle = getattr(downloader, method)
+
+    async def counted(*args, **kwargs):
+        nonlocal completed
+        result = await handle(*args, **kwargs)
+        completed += 1
+        return result
+
+    setattr(downloader, method, counted)
+
+    io_before = proc_io()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(job())
+    elapsed = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    io_after = proc_io()
+    storage.close()
+
+    latencies.sort()
+    result = {
+        'completed': completed,
+        'requests': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'tiles_per_s': round(completed / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime - usage_before.ru_utime - usage_before.ru_stime, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'io_syscalls': (io_after[0] - io_before[0]) + (io_after[1] - io_before[1]),
+        'ctx_switches': (usage.ru_nvcsw + usage.ru_nivcsw) - (usage_before.ru_nvcsw + usage_before.ru_nivcsw),
+        'limiter_rate': round(downloader.limiter.rate, 1),
+    }
+    with open(cfg['result'], 'w') as f:
+        json.dump(result, f)
+
+
+def strace_total(path):
+    """Número total de syscalls do resumo do `strace -c`"""
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields and fields[-1] == 'total':
+                return int(fields[3])
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_stats(port, timeout=10.0):
+    """GET /stats do servidor local (espera ele subir)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/stats', timeout=1) as response:
+                return json.load(response)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=SCRIPTS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_history(results_file):
+    if not results_file.exists():
+        return []
+    with open(results_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def bench_one(scenario, kind, tiles, rate, use_strace):
+    """Servidor novo + processo medido para um par cenário/downloader"""
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(STANDIN_HOSTS, port, SCENARIOS[scenario]), daemon=True)
+    server.start()
+    try:
+        server_stats(port)
+        with tempfile.TemporaryDirectory(prefix='bench-tiles-') as workdir:
+            config_path = os.path.join(workdir, 'config.json')
+            result_path = os.path.join(workdir, 'result.json')
+            with open(config_path, 'w') as f:
+                json.dump({
+                    'downloader': kind, 'tiles': tiles, 'rate': rate, 'workdir': workdir,
+                    'result': result_path,
+                    'urls': [f'http://{host}:{port}/{{z}}/{{x}}/{{y}}.png' for host in STANDIN_HOSTS],
+                }, f)
+            command = [sys.executable, str(Path(__file__).resolve()), f'--worker={config_path}']
+            strace_file = os.path.join(workdir, 'strace.txt')
+            if use_strace:
+                command = ['strace', '-f', '-c', '-o', strace_file] + command
+            subprocess.run(command, check=True)
+            with open(result_path) as f:
+                result = json.load(f)
+            result['syscalls'] = strace_total(strace_file) if use_strace else None
+        result['server'] = server_stats(port)
+    finally:
+        server.terminate()
+        server.join()
+    return result
+
+
+def format_delta(current, previous):
+    if current is None or not previous:
+        return ''
+    return f" ({(current - previous) / previous * 100:+.0f}%)"
+
+
+def main():
+    worker_config = arg_value('worker')
+    if worker_config:
+        run_worker(worker_config)
+        return
+
+    scenarios = arg_value('scenario', ','.join(SCENARIOS)).split(',')
+    kinds = arg_value('downloader', ','.join(DOWNLOADERS)).split(',')
+    for name in scenarios:
+        if name not in SCENARIOS:
+            print(f"❌ Cenário desconhecido: {name} (disponíveis: {', '.join(SCENARIOS)})")
+            sys.exit(1)
+    for kind in kinds:
+        if kind not in DOWNLOADERS:
+            print(f"❌ Downloader desconhecido: {kind} (disponíveis: {', '.join(DOWNLOADERS)})")
+            sys.exit(1)
+    count = int(arg_value('tiles', 2000))
+    results_file = Path(arg_value('results', RESULTS_FILE))
+    rate = float(arg_value('rate', 200))
+    use_strace = '--strace' in sys.argv
+    if use_strace and shutil.which('strace') is None:
+        print("⚠️  strace não encontrado: syscalls contadas só por /proc/self/io")
+        use_strace = False
+
+    tiles = []
+    for x, y in iter_zoom_tiles(BENCH_ZOOM, BENCH_ZOOM):
+        tiles.append((BENCH_ZOOM, x, y))
+        if len(tiles) >= count:
+            break
+    revision = git_revision()
+    history = load_history(results_file)
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+
+    print("=== Benchmark dos downloaders (servidor local) ===")
+    print(f"Revisão: {revision} | Carga: {len(tiles):,} tiles z{BENCH_ZOOM} | Teto: {rate:.0f} req/s")
+    print()
+
+    for scenario in scenarios:
+        print(f"🧪 {scenario}: {SCENARIOS[scenario]}")
+        for kind in kinds:
+            result = bench_one(scenario, kind, tiles, rate, use_strace)
+            record = {'time': datetime.now().isoformat(timespec='seconds'), 'revision': revision,
+                      'scenario': scenario, 'downloader': kind, 'tiles': len(tiles), 'rate': rate, **result}
+            previous = next((r for r in reversed(history)
+                             if (r['scenario'], r['downloader'], r['tiles'], r['rate'])
+                             == (scenario, kind, len(tiles), rate)), None)
+            syscalls = (f"{result['syscalls']:,} syscalls" if result['syscalls'] is not None
+                        else f"{result['io_syscalls']:,} syscalls r/w, {result['ctx_switches']:,} trocas de contexto")
+            print(f"   {kind:<10} ⚡ {result['tiles_per_s']:>7.1f} tiles/s"
+                  f"{format_delta(result['tiles_per_s'], previous and previous.get('tiles_per_s'))} | "
+                  f"p50 {result['p50_ms']:.1f} ms"
+                  f"{format_delta(result['p50_ms'], previous and previous.get('p50_ms'))} | "
+                  f"p99 {result['p99_ms']:.1f} ms"
+                  f"{format_delta(result['p99_ms'], previous and previous.get('p99_ms'))} | "
+                  f"CPU {result['cpu_s']:.1f}s | RSS {result['peak_rss_mb']:.0f} MB"
+                  f"{format_delta(result['peak_rss_mb'], previous and previous.get('peak_rss_mb'))} | "
+                  f"{syscalls}")
+            print(f"   {'':<10} {result['completed']:,}/{len(tiles):,} tiles, {result['requests']:,} requisições | "
+                  f"servidor: {result['server']}")
+            if previous:
+                print(f"   {'':<10} (comparado com {previous['revision']} de {previous['time']})")
+            with open(results_file, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            history.append(record)
+        print()
+
+    print(f"📄 Resultados: {results_file}")
+
+
+if __name__ == '__main__':
+    main()
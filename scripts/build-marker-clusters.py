@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Pré-calcular os clusters de marcadores dos artistas em tiles JSON estáticos
+
+Uso:
+  python3 build-marker-clusters.py EXPORT.fermat.csv [--out=tiles/clusters]
+                                   [--zoom=0-14] [--radius-px=40] [--min-points=2]
+
+Lê as coordenadas geradas pelo fermat-coords.py (coluna 'coordenada', ou
+colunas lat/lon), agrupa os pontos em todos os zooms de uma vez
+(tilelib/clusters.py, esquema do supercluster) e grava um GeoJSON por tile
+em tiles/clusters/{z}/{x}/{y}.json, servido pelo mesmo nginx dos PNGs.
+O front pede só os tiles da viewport no zoom atual (acima de points_zoom,
+usa os de points_zoom) em vez do conjunto inteiro de pontos; tile sem
+arquivo (404) é tile sem marcadores.
+
+Cada feature é um ponto (propriedades post_id, en_id, locality do CSV) ou um
+cluster (cluster, cluster_id, point_count, expansion_zoom: zoom em que ele se
+abre ao clicar). tiles/clusters/index.json guarda os parâmetros.
+
+Rodar de novo depois de cada fermat-coords.py: JSONs de tiles que ficaram
+vazios são removidos.
+"""
+
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from tilelib.clusters import (CLUSTER_MAX_ZOOM, CLUSTER_MIN_POINTS, CLUSTER_MIN_ZOOM, CLUSTER_RADIUS_PX,
+                              ClusterIndex, load_points, tile_size_summary, write_cluster_tiles)
+
+TILES_DIR = Path(__file__).parent.parent / 'tiles'
+CLUSTERS_DIR = TILES_DIR / 'clusters'
+
+
+def arg_value(name, default=None):
+    """Valor de uma opção --nome=valor em sys.argv"""
+    prefix = f'--{name}='
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+
+def zoom_range(value, default):
+    """'Z1-Z2' → (Z1, Z2)"""
+    if not value:
+        return default
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    source = Path(args[0])
+    out_dir = Path(arg_value('out', CLUSTERS_DIR))
+    min_zoom, max_zoom = zoom_range(arg_value('zoom'), (CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM))
+    radius_px = float(arg_value('radius-px', CLUSTER_RADIUS_PX))
+    min_points = int(arg_value('min-points', CLUSTER_MIN_POINTS))
+
+    lat, lon, props = load_points(source)
+    print("=== Clusters de marcadores por tile ===")
+    print(f"Pontos: {lat.size:,} ({source}) | Zooms: {min_zoom}-{max_zoom} (+{max_zoom + 1} soltos) | "
+          f"Raio: {radius_px:g} px")
+    if not lat.size:
+        print("❌ Nenhuma coordenada no arquivo")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    index = ClusterIndex(lat, lon, min_zoom, max_zoom, radius_px, min_points)
+    elapsed = time.perf_counter() - start
+    print(f"⚡ Hierarquia montada em {elapsed * 1000:.1f} ms")
+
+    meta = {'source': source.name, 'generated': datetime.now().isoformat(timespec='seconds')}
+    stats, stale = write_cluster_tiles(index, out_dir, props, meta)
+
+    print(f"\n{'Zoom':>4} {'Marcadores':>11} {'Clusters':>9} {'Tiles':>7} {'Maior tile':>11}")
+    for z, s in stats.items():
+        print(f"{z:>4} {s['entities']:>11,} {s['clusters']:>9,} {s['tiles']:>7,} {s['max_bytes'] / 1024:>9.1f}KB")
+
+    largest, mean = tile_size_summary(stats)
+    full = stats[max_zoom + 1]['bytes']
+    print(f"\n📦 Conjunto completo: {full / 1024:,.1f} KB | tile médio: {mean / 1024:.1f} KB | "
+          f"maior tile: {largest / 1024:.1f} KB")
+    print(f"📁 {sum(s['tiles'] for s in stats.values()):,} tiles em {out_dir}")
+    if stale:
+        print(f"🗑️  {stale:,} tiles antigos removidos")
+
+
+if __name__ == '__main__':
+    main()
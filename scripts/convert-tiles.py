@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Converter tiles entre o layout em diretório e MBTiles (nos dois sentidos)
+
+Uso:
+  python3 convert-tiles.py to-mbtiles [tiles_dir] [arquivo.mbtiles]
+  python3 convert-tiles.py to-dir     [arquivo.mbtiles] [tiles_dir]
+
+Padrões: tiles_dir = ../tiles, arquivo.mbtiles = ../tiles.mbtiles
+Tiles já presentes no destino são mantidos (conversão incremental).
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from tilelib.storage import DirectoryStorage, MBTilesStorage
+
+TILES_DIR = Path(__file__).parent.parent / 'tiles'
+MBTILES_FILE = TILES_DIR.parent / 'tiles.mbtiles'
+
+
+def convert(source, dest):
+    """Copiar todos os tiles de source para dest; retorna (copiados, pulados)"""
+    copied = 0
+    skipped = 0
+    start = time.time()
+    for z, x, y in source.tiles():
+        if (z, x, y) in dest:
+            skipped += 1
+            continue
+        data = source.read(z, x, y)
+        if data is None:
+            continue
+        dest.write(z, x, y, data)
+        copied += 1
+        if copied % 5000 == 0:
+            rate = copied / (time.time() - start)
+            print(f"\r  {copied:,} copiados | {skipped:,} pulados | {rate:.0f} tiles/s", end='', flush=True)
+    print()
+    return copied, skipped
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('to-mbtiles', 'to-dir'):
+        print(__doc__)
+        sys.exit(1)
+
+    mode = sys.argv[1]
+    if mode == 'to-mbtiles':
+        src_path = Path(sys.argv[2]) if len(sys.argv) > 2 else TILES_DIR
+        dst_path = Path(sys.argv[3]) if len(sys.argv) > 3 else MBTILES_FILE
+        if not src_path.is_dir():
+            print(f"❌ Diretório não encontrado: {src_path}")
+            sys.exit(1)
+        source = DirectoryStorage(src_path)
+        dest = MBTilesStorage(dst_path)
+    else:
+        src_path = Path(sys.argv[2]) if len(sys.argv) > 2 else MBTILES_FILE
+        dst_path = Path(sys.argv[3]) if len(sys.argv) > 3 else TILES_DIR
+        if not src_path.exists():
+            print(f"❌ Arquivo não encontrado: {src_path}")
+            sys.exit(1)
+        source = MBTilesStorage(src_path)
+        dest = DirectoryStorage(dst_path)
+
+    print(f"Convertendo {src_path} → {dst_path}")
+    try:
+        copied, skipped = convert(source, dest)
+    finally:
+        source.close()
+        dest.close()
+
+    print(f"✅ {copied:,} tiles copiados, {skipped:,} já existiam no destino")
+    print(f"💾 Tamanho do destino: {dest.total_size() / (1024**2):.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
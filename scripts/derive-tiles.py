@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Preencher buracos da cobertura derivando tiles dos zooms vizinhos, sem rede
+
+Uso:
+  python3 derive-tiles.py [--dry-run] [--workers=N] [--max-overzoom=N]
+                          [--no-pyramid] [--no-overzoom]
+
+1. Pirâmide (de MAX_ZOOM-1 até MIN_ZOOM): tile ausente montado com os 4 filhos
+   (filho que a máscara de terra descarta é água; filho em terra ausente adia o tile)
+2. Overzoom (de MIN_ZOOM+1 até MAX_ZOOM): o que ainda falta é recortado e
+   ampliado do ancestral mais próximo
+Só tiles do plano do download-tiles.py (bounds + máscara de terra) são
+gerados. Os derivados ficam marcados no índice de inventário
+(tiles/.inventory.sqlite) e o download-tiles.py não os pede à rede; um
+--refresh os pede sem GET condicional (o mtime de um derivado não diz nada
+sobre o servidor) e os substitui pelos tiles reais quando o servidor os tiver.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from tilelib.derive import (MAX_OVERZOOM, OVERZOOM, PYRAMID, build_from_children,
+                            crop_from_ancestor, overzoom_tasks, pyramid_tasks)
+from tilelib.inventory import TileInventory
+from tilelib.landmask import LandMask
+from tilelib.region import get_bounds_for_zoom, iter_zoom_tiles
+from tilelib.storage import DirectoryStorage
+from tilelib.tiling import bbox_tile_range
+
+TILES_DIR = Path(__file__).parent.parent / 'tiles'
+
+# Mesmos zooms de download-tiles.py
+MIN_ZOOM = 5
+MAX_ZOOM = 12
+
+DRY_RUN = '--dry-run' in sys.argv
+DO_PYRAMID = '--no-pyramid' not in sys.argv
+DO_OVERZOOM = '--no-overzoom' not in sys.argv
+WORKERS = next((int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--workers=')), os.cpu_count() or 4)
+MAX_LEVELS = next((int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--max-overzoom=')), MAX_OVERZOOM)
+
+
+def tile_path(z, x, y):
+    """Mesmo caminho de DirectoryStorage.tile_path (o dry-run não abre o storage)"""
+    return TILES_DIR / str(z) / str(x) / f"{y}.png"
+
+
+def run_level(pool, storage, inventory, worker, tasks, method):
+    """
+    Executar as tarefas de um zoom no pool e gravar os resultados.
+    Retorna ([(z, x, y, método, zoom de origem)], erros).
+    """
+    tasks = list(tasks)
+    source_zoom = (lambda task: task[0] + 1) if method == PYRAMID else (lambda task: task[3])
+    if DRY_RUN:
+        # Só no inventário em memória: os zooms seguintes contam com estes tiles
+        for task in tasks:
+            inventory.add(*task[:3])
+        return [(*task[:3], method, source_zoom(task)) for task in tasks], 0
+    derived = []
+    errors = 0
+    for (z, x, y, data, error), task in zip(pool.map(worker, tasks, chunksize=32), tasks):
+        if data is None:
+            errors += 1
+            continue
+        storage.write(z, x, y, data)
+        derived.append((z, x, y, method, source_zoom(task)))
+    storage.index.mark_derived(derived)
+    return derived, errors
+
+
+def main():
+    if not TILES_DIR.exists():
+        print(f"❌ Diretório de tiles não encontrado: {TILES_DIR}")
+        sys.exit(1)
+
+    print("=== Derivação de tiles ausentes (sem rede) ===")
+    print(f"Zoom levels: {MIN_ZOOM}-{MAX_ZOOM} | Processos: {WORKERS} | Overzoom máximo: {MAX_LEVELS} níveis")
+    if DRY_RUN:
+        print("(dry-run: nada será gravado)")
+    print()
+
+    start = time.time()
+    if DRY_RUN:
+        # Só leitura: nenhum índice sqlite (inventário, dedup) é aberto ou criado.
+        # Sem o índice, ampliados de execuções anteriores contam como origem
+        storage = None
+        inventory = TileInventory(TILES_DIR)
+        overzoomed = {}
+    else:
+        storage = DirectoryStorage(TILES_DIR)
+        inventory = storage.inventory
+        # Ampliados não servem de origem para nada (nem pirâmide, nem outro overzoom)
+        overzoomed = storage.index.derived_tiles(OVERZOOM)
+    inventory.scan(range(max(0, MIN_ZOOM - MAX_LEVELS), MAX_ZOOM + 1))
+    present = inventory.present
+    landmask = LandMask()
+
+    def usable(z):
+        return present.get(z, set()) - overzoomed.get(z, set())
+
+    def land(z):
+        """Tiles de z em terra (máscara) sob o bbox dos pais em z-1: fora disso é água"""
+        x_min, x_max, y_min, y_max = bbox_tile_range(get_bounds_for_zoom(z - 1, MIN_ZOOM), z - 1)
+        return set(landmask.tiles_for_zoom(z, range(2 * x_min, 2 * x_max + 2), range(2 * y_min, 2 * y_max + 2)))
+
+    def missing(z):
+        return [t for t in iter_zoom_tiles(z, MIN_ZOOM, landmask) if t not in present.get(z, ())]
+
+    totals = {PYRAMID: 0, OVERZOOM: 0}
+    errors = 0
+    try:
+        with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+            if DO_PYRAMID:
+                print("🔺 Pirâmide (reduzindo 2×2 filhos):")
+                for z in range(MAX_ZOOM - 1, MIN_ZOOM - 1, -1):
+                    tasks = pyramid_tasks(z, missing(z), usable(z + 1), tile_path, land(z + 1))
+                    derived, failed = run_level(pool, storage, inventory, build_from_children, tasks, PYRAMID)
+                    count = len(derived)
+                    totals[PYRAMID] += count
+                    errors += failed
+                    print(f"   z={z:<3} {count:>9,} derivados" + (f" ({failed} erros)" if failed else ""))
+
+            if DO_OVERZOOM:
+                print("🔍 Overzoom (ampliando o ancestral mais próximo):")
+                for z in range(MIN_ZOOM + 1, MAX_ZOOM + 1):
+                    sources = {az: usable(az) for az in range(max(0, z - MAX_LEVELS), z)}
+                    tasks = overzoom_tasks(z, missing(z), sources, tile_path, MAX_LEVELS)
+                    derived, failed = run_level(pool, storage, inventory, crop_from_ancestor, tasks, OVERZOOM)
+                    overzoomed.setdefault(z, set()).update((x, y) for _, x, y, _, _ in derived)
+                    count = len(derived)
+                    totals[OVERZOOM] += count
+                    errors += failed
+                    print(f"   z={z:<3} {count:>9,} derivados" + (f" ({failed} erros)" if failed else ""))
+    finally:
+        if storage is not None:
+            storage.close()
+
+    print()
+    verb = "seriam derivados" if DRY_RUN else "derivados"
+    print(f"✅ {totals[PYRAMID]:,} tiles {verb} por pirâmide, {totals[OVERZOOM]:,} por overzoom "
+          f"em {time.time() - start:.1f}s")
+    if errors:
+        print(f"⚠️  {errors:,} tiles de origem ilegíveis (rode analyze-tiles.py para a lista de reparo)")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,22 @@ Download de tiles ESSENCIAIS pos-bloqueio OSM (compliance rigoroso).
 
 Estrategia:
 - z=0 a z=4: mundo todo (341 tiles, ~10 MB) — vista mundial sempre visivel
-- z=5/6/7: APENAS bbox 3x3 ao redor de cada cidade onde existe artista TEDx
-           (US-DC, UK-London, DE-Berlin, MX-CDMX, NL-Amsterdam, FI-Helsinki,
-            IL-Jerusalem, ID-Jakarta, CM-Yaounde) → ~140 tiles
-- Total: ~480 tiles, ~5 min com rate 2 req/s (compliance OSM)
+- z=5/6/7: APENAS os tiles a ate TEDX_RADIUS_M (150 km) de cada cidade onde
+           existe artista TEDx (US-DC, UK-London, DE-Berlin, MX-CDMX, NL-Amsterdam,
+           FI-Helsinki, IL-Jerusalem, ID-Jakarta, CM-Yaounde) → 84 tiles
+- Total: ~425 tiles, ~2 min com rate 4 req/s (compliance OSM)
+
+Ate a troca pelo raio o padrao era o tile de cada cidade + 8 vizinhos em
+z5-7 (213 tiles: em z5 um bloco de ~3.700 km, a vista regional inteira).
+  --tedx-3x3               volta a esse plano para as cidades TEDx
+
+Pontos extras (tilelib/poiplan.py: raio em metros, so os tiles que o circulo toca):
+  --centroids[=Z1-Z2]      localidades do centroides.json com o radius_km de cada
+                           uma (padrao z5-12)
+  --points=ARQUIVO.csv     coordenadas dos artistas (CSV do fermat-coords.py)
+  --points-zoom=Z1-Z2      (padrao z5-12)   --points-radius-m=M (padrao 2000)
+  --skip-region            sem os tiles que o download-tiles.py ja baixa
+                           (America do Sul + mascara de terra, z5-12)
 """
 
 import asyncio
@@ -15,13 +27,21 @@ import sys
 import time
 import logging
 from pathlib import Path
-from math import pi, log, tan, cos, radians
 
-import aiohttp
+from tilelib.httpclient import TileClientError, http2_available, open_client
+from tilelib.mirrors import MirrorScheduler
+from tilelib.landmask import LandMask
+from tilelib.negcache import NegativeCache, NEGATIVE_CACHE_FILENAME
+from tilelib.poiplan import (WORLD_MAX_ZOOM, PointLayer, bbox_tile_count, centroid_layer, csv_layer,
+                             plan_poi_tiles, world_tiles)
+from tilelib.ratelimit import AdaptiveRateLimiter, host_of
+from tilelib.region import iter_zoom_tiles
+from tilelib.storage import DirectoryStorage, open_storage
+from tilelib.tiling import deg2num
+from tilelib.workqueue import run_pipeline
 
 TILES_DIR = Path(__file__).parent.parent / 'tiles'
-LOGS_DIR = TILES_DIR / 'logs'
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
+LOGS_DIR = TILES_DIR / 'logs'  # criado pelo EssentialDownloader: importar o script não toca em tiles/
 
 # Cidades TEDx fora da AM do Sul (lat, lng) — extraídas do banco
 TEDX_LOCATIONS = [
@@ -35,6 +55,16 @@ TEDX_LOCATIONS = [
     ('Jakarta',        -6.2088,  106.8456),
     ('Yaounde',         3.8480,   11.5021),
 ]
+TEDX_ZOOMS = range(5, 8)
+TEDX_RADIUS_M = 150_000  # cidade + arredores: 1-4 tiles em z5, ~3x3 em z7 (--tedx-3x3: 3x3 em todos)
+
+# --centroids / --points
+CENTROIDS_FILE = Path(__file__).parent / 'centroides.json'
+POI_ZOOMS = (5, 12)
+POINT_RADIUS_M = 2_000
+# Zooms do plano regional de download-tiles.py (--skip-region)
+REGION_MIN_ZOOM = 5
+REGION_MAX_ZOOM = 12
 
 # Tile servers — OSM.de (mirror alemao do OpenStreetMap, mesma cartografia
 # do tile.openstreetmap.org mas SEM bloqueio agressivo. Estilo verde-floresta
@@ -58,55 +88,107 @@ HEADERS = {
 # OSM.de — rate moderado (4 paralelos = ~4 req/s, dentro da politica)
 MAX_CONCURRENT = 4
 TIMEOUT = 30
-RATE_LIMIT_DELAY = 0.25  # 4 req/s
+RATE_LIMIT_DELAY = 0.25  # 4 req/s — teto do token bucket global (AIMD reduz em 429/bloqueio)
 BLOCKED_TILE_SIZE = 6987 # detector OSM padrao (mesmo formato de bloqueio se ocorrer)
 ABORT_AFTER_N_BLOCKED = 5
 
+# Mesmo cache negativo de download-tiles.py (404s recentes não são pedidos de novo)
+NEGATIVE_CACHE_FILE = TILES_DIR / NEGATIVE_CACHE_FILENAME
+
+# --mbtiles grava no mesmo arquivo MBTiles de download-tiles.py
+MBTILES_FILE = TILES_DIR.parent / 'tiles.mbtiles'
+
+
+def arg_value(name, default=None, bare=None):
+    """Valor de --nome=valor; `bare` quando a opção vem sem valor"""
+    for arg in sys.argv[1:]:
+        if arg == f'--{name}':
+            return bare
+        if arg.startswith(f'--{name}='):
+            return arg.split('=', 1)[1]
+    return default
+
+
+def zoom_range(text, default):
+    """'Z1-Z2' (ou 'Z') → (Z1, Z2)"""
+    if not text:
+        return default
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+
+def poi_layers():
+    """Camadas de pontos: cidades TEDx (fora do --tedx-3x3), centroides/artistas por opção"""
+    layers = []
+    if '--tedx-3x3' not in sys.argv:
+        layers.append(PointLayer('TEDx', [lat for _, lat, _ in TEDX_LOCATIONS], [lng for _, _, lng in TEDX_LOCATIONS],
+                                 TEDX_RADIUS_M, TEDX_ZOOMS))
+    centroids = arg_value('centroids', bare='')
+    if centroids is not None:
+        layers.append(centroid_layer(CENTROIDS_FILE, zoom_range(centroids, POI_ZOOMS)))
+    points = arg_value('points')
+    if points:
+        layers.append(csv_layer(points, zoom_range(arg_value('points-zoom'), POI_ZOOMS),
+                                float(arg_value('points-radius-m', POINT_RADIUS_M))))
+    return layers
+
+
+def tedx_grid_tiles():
+    """--tedx-3x3: tile de cada cidade TEDx + 8 vizinhos em TEDX_ZOOMS (o plano antigo)"""
+    tiles = set()
+    for z in TEDX_ZOOMS:
+        n = 2 ** z
+        for _, lat, lng in TEDX_LOCATIONS:
+            cx, cy = deg2num(lat, lng, z)
+            tiles.update((z, x, y) for x in range(cx - 1, cx + 2) for y in range(cy - 1, cy + 2)
+                         if 0 <= x < n and 0 <= y < n)
+    return tiles
 
-def deg2num(lat, lon, zoom):
-    lat = max(min(lat, 85.0511), -85.0511)
-    n = 2.0 ** zoom
-    xtile = int((lon + 180.0) / 360.0 * n)
-    lat_rad = radians(lat)
-    ytile = int((1.0 - log(tan(lat_rad) + (1.0 / cos(lat_rad))) / pi) / 2.0 * n)
-    return (xtile, ytile)
 
+def region_tiles(z):
+    """Tiles que o download-tiles.py já planeja no zoom (--skip-region)"""
+    if not REGION_MIN_ZOOM <= z <= REGION_MAX_ZOOM:
+        return set()
+    if not hasattr(region_tiles, 'landmask'):
+        region_tiles.landmask = LandMask()
+    return set(iter_zoom_tiles(z, REGION_MIN_ZOOM, region_tiles.landmask))
 
-def collect_essential_tiles():
-    """Retorna lista de (z, x, y) — sem duplicatas."""
-    tiles = set()
 
+def collect_essential_tiles(layers=None):
+    """
+    Retorna (lista de (z, x, y) sem duplicatas, estatísticas por zoom do
+    plano de pontos — ver plan_poi_tiles).
+    """
     # Camada 1: mundo todo z=0 a z=4
-    for z in range(0, 5):
-        n = 2 ** z
-        for x in range(n):
-            for y in range(n):
-                tiles.add((z, x, y))
-
-    # Camada 2: z=5/6/7 com bbox 3x3 ao redor de cada cidade TEDx
-    # 3x3 = tile da cidade + 8 vizinhos → cobre vista regional confortavel
-    for z in [5, 6, 7]:
-        for name, lat, lng in TEDX_LOCATIONS:
-            cx, cy = deg2num(lat, lng, z)
-            for dx in range(-1, 2):
-                for dy in range(-1, 2):
-                    x, y = cx + dx, cy + dy
-                    n = 2 ** z
-                    if 0 <= x < n and 0 <= y < n:
-                        tiles.add((z, x, y))
+    tiles = world_tiles(WORLD_MAX_ZOOM)
 
-    return sorted(tiles)
+    # Camada 2: só os tiles que o círculo de cada ponto toca, unidos entre pontos
+    plan, stats = plan_poi_tiles(layers if layers is not None else poi_layers(), WORLD_MAX_ZOOM,
+                                 exclude=region_tiles if '--skip-region' in sys.argv else None)
+    for z in sorted(plan):
+        tiles.extend((z, x, y) for x, y in plan[z])
+    if '--tedx-3x3' in sys.argv:
+        tiles = set(tiles) | tedx_grid_tiles()
+    return sorted(tiles), stats
 
 
 class EssentialDownloader:
-    def __init__(self):
+    def __init__(self, negative_cache=None, storage=None, limiter=None):
+        self.negative_cache = negative_cache
+        self.storage = storage or DirectoryStorage(TILES_DIR)
+        self.limiter = limiter or AdaptiveRateLimiter(
+            1 / RATE_LIMIT_DELAY,
+            per_host_rate=1 / RATE_LIMIT_DELAY / len(TILE_SERVERS),
+            hosts=[host_of(s) for s in TILE_SERVERS],
+        )
         self.downloaded = 0
         self.skipped = 0
         self.failed = 0
         self.blocked = 0
         self.abort = False
-        self.server_idx = 0
+        self.mirrors = MirrorScheduler(TILE_SERVERS)
 
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
         log_file = LOGS_DIR / f'essential_{int(time.time())}.log'
         self.logger = logging.getLogger('EssentialDownloader')
         self.logger.setLevel(logging.INFO)
@@ -114,50 +196,53 @@ class EssentialDownloader:
         fh.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
         self.logger.addHandler(fh)
 
-    def next_server(self):
-        s = TILE_SERVERS[self.server_idx % len(TILE_SERVERS)]
-        self.server_idx += 1
-        return s
-
-    async def download(self, session, z, x, y):
+    async def download(self, client, z, x, y):
         if self.abort:
             return False, 'abort'
 
-        tile_file = TILES_DIR / str(z) / str(x) / f"{y}.png"
-        if tile_file.exists():
+        if (z, x, y) in self.storage:
             self.skipped += 1
             return True, 'exists'
 
-        tile_file.parent.mkdir(parents=True, exist_ok=True)
-
+        server = None
         for attempt in range(3):
-            url = self.next_server().format(z=z, x=x, y=y)
+            server = self.mirrors.pick(avoid=server)
+            url = server.format(z=z, x=x, y=y)
+            host = host_of(server)
             try:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=TIMEOUT, connect=10)) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        if len(content) < 100:
-                            self.logger.warning(f'tile {z}/{x}/{y}: muito pequeno ({len(content)}b)')
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                        if len(content) == BLOCKED_TILE_SIZE:
-                            self.blocked += 1
-                            self.logger.error(f'tile {z}/{x}/{y}: OSM ACCESS BLOCKED')
-                            if self.blocked >= ABORT_AFTER_N_BLOCKED:
-                                self.abort = True
-                            return False, 'blocked'
-                        await asyncio.to_thread(tile_file.write_bytes, content)
-                        self.downloaded += 1
-                        return True, 'downloaded'
-                    elif resp.status == 404:
-                        return True, 'not_found'  # tile vazio, normal
-                    elif resp.status == 429:
-                        await asyncio.sleep(5)
+                resp = await self.mirrors.fetch(client, server, url,
+                                                wait=lambda: self.limiter.acquire(host))
+                if resp.status == 200:
+                    content = resp.content
+                    if len(content) < 100:
+                        self.logger.warning(f'tile {z}/{x}/{y}: muito pequeno ({len(content)}b)')
+                        await asyncio.sleep(2 ** attempt)
                         continue
-                    else:
-                        if attempt == 2:
-                            self.logger.warning(f'tile {z}/{x}/{y}: HTTP {resp.status}')
-            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                    if len(content) == BLOCKED_TILE_SIZE:
+                        self.blocked += 1
+                        self.limiter.on_throttle(host)
+                        self.mirrors.on_throttle(server)
+                        self.logger.error(f'tile {z}/{x}/{y}: OSM ACCESS BLOCKED')
+                        if self.blocked >= ABORT_AFTER_N_BLOCKED:
+                            self.abort = True
+                        return False, 'blocked'
+                    self.limiter.on_success(host)
+                    await asyncio.to_thread(self.storage.write, z, x, y, content)
+                    self.downloaded += 1
+                    return True, 'downloaded'
+                elif resp.status == 404:
+                    self.limiter.on_success(host)
+                    if self.negative_cache is not None:
+                        self.negative_cache.add(z, x, y)
+                    return True, 'not_found'  # tile vazio, normal
+                elif resp.status in (429, 403, 503):
+                    self.limiter.on_throttle(host)
+                    await asyncio.sleep(5)
+                    continue
+                else:
+                    if attempt == 2:
+                        self.logger.warning(f'tile {z}/{x}/{y}: HTTP {resp.status}')
+            except (asyncio.TimeoutError, TileClientError) as e:
                 self.logger.debug(f'tile {z}/{x}/{y} attempt {attempt+1}: {type(e).__name__}')
                 await asyncio.sleep(2 ** attempt)
                 continue
@@ -166,32 +251,23 @@ class EssentialDownloader:
         return False, 'failed'
 
 
-async def run(tiles, downloader):
-    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT, limit_per_host=MAX_CONCURRENT)
-    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
-        sem = asyncio.Semaphore(MAX_CONCURRENT)
-
-        async def bounded(z, x, y):
-            async with sem:
-                if downloader.abort:
-                    return
-                result = await downloader.download(session, z, x, y)
-                # Rate limit: 0.5s por tile after each completion
-                await asyncio.sleep(RATE_LIMIT_DELAY)
-                return result
-
-        total = len(tiles)
+async def run(tiles, downloader, total=None):
+    # --http2: as requisições dividem 2 conexões por servidor em vez de MAX_CONCURRENT sockets
+    async with open_client(
+        http2='--http2' in sys.argv,
+        headers=HEADERS,
+        max_connections=MAX_CONCURRENT,
+        max_per_host=MAX_CONCURRENT,
+        timeout=TIMEOUT,
+    ) as client:
+        total = total if total is not None else len(tiles)
         start = time.time()
         last_print = start
-
-        tasks = [asyncio.create_task(bounded(z, x, y)) for z, x, y in tiles]
-
         completed = 0
-        for coro in asyncio.as_completed(tasks):
-            await coro
+
+        def on_done(tile, result):
+            nonlocal completed, last_print
             completed += 1
-            if downloader.abort:
-                break
             now = time.time()
             if now - last_print > 2 or completed == total:
                 elapsed = now - start
@@ -202,35 +278,65 @@ async def run(tiles, downloader):
                 bar = '█' * bar_filled + '░' * (30 - bar_filled)
                 print(
                     f"\r[{bar}] {pct:5.1f}% | {completed:>4}/{total} | "
-                    f"⚡ {rate:.1f}/s | ETA {eta:.0f}s | "
+                    f"⚡ {rate:.1f}/s | 🚦 {downloader.limiter.rate:.1f} req/s | ETA {eta:.0f}s | "
                     f"✓{downloader.downloaded} ⊘{downloader.skipped} "
                     f"✗{downloader.failed} 🛑{downloader.blocked}",
                     end='', flush=True,
                 )
                 last_print = now
 
-        # Cancelar tasks pendentes em caso de abort
-        if downloader.abort:
-            for t in tasks:
-                if not t.done():
-                    t.cancel()
+        # MAX_CONCURRENT workers fixos puxando de uma fila limitada;
+        # em abort o produtor para e os workers descartam o resto da fila
+        await run_pipeline(
+            tiles,
+            lambda z, x, y: downloader.download(client, z, x, y),
+            workers=MAX_CONCURRENT,
+            on_done=on_done,
+            should_stop=lambda: downloader.abort,
+        )
 
         print()
 
 
 def main():
-    tiles = collect_essential_tiles()
-    print(f"Plano: {len(tiles)} tiles essenciais (z=0-4 mundo + z=5/6/7 cidades TEDx)")
+    if '--http2' in sys.argv and not http2_available():
+        print("❌ --http2 requer httpx com suporte a HTTP/2: pip install 'httpx[http2]'")
+        sys.exit(1)
 
-    # Filtrar pre-existentes
-    pending = [t for t in tiles if not (TILES_DIR / str(t[0]) / str(t[1]) / f"{t[2]}.png").exists()]
+    layers = poi_layers()
+    tiles, stats = collect_essential_tiles(layers)
+    print(f"Plano: {len(tiles)} tiles essenciais (z=0-{WORLD_MAX_ZOOM} mundo + "
+          + ", ".join((["TEDx: 3x3 em volta de cada cidade"] if '--tedx-3x3' in sys.argv else [])
+                      + [f"{layer.name}: {len(layer)} pontos z{layer.zooms.start}-{layer.zooms.stop - 1}"
+                         for layer in layers]) + ")")
+    for z, s in sorted(stats.items()):
+        bbox = bbox_tile_count(layers, z)
+        print(f"  z={z:<3} {s['tiles']:>7,} tiles ({s['points']} pontos, {s['pairs']:,} ponto×tile → "
+              f"{s['merged']:,} após união"
+              + (f", -{s['excluded']:,} já no plano regional" if s['excluded'] else "")
+              + (f"; bbox dos pontos: {bbox:,})" if bbox else ")"))
+
+    # Filtrar pre-existentes (uma varredura por diretório em vez de stat por tile)
+    storage = open_storage(TILES_DIR, MBTILES_FILE if '--mbtiles' in sys.argv else None)
+    storage.scan(sorted({t[0] for t in tiles}))
+    pending = storage.missing(tiles)
     existing = len(tiles) - len(pending)
 
+    negative_cache = NegativeCache(NEGATIVE_CACHE_FILE)
+    known_404 = 0
+    if '--retry-404' not in sys.argv:
+        before = len(pending)
+        pending = negative_cache.filter(pending)
+        known_404 = before - len(pending)
+
     print(f"  já existentes: {existing}")
+    print(f"  404 em cache:  {known_404}")
     print(f"  a baixar:      {len(pending)}")
 
     if not pending:
         print("Nada a baixar.")
+        negative_cache.close()
+        storage.close()
         return
 
     eta_min = (len(pending) * RATE_LIMIT_DELAY) / 60
@@ -241,10 +347,16 @@ def main():
         ans = input("Continuar? (s/N): ").strip().lower()
         if ans != 's':
             print("Cancelado.")
+            negative_cache.close()
+            storage.close()
             return
 
-    downloader = EssentialDownloader()
-    asyncio.run(run(pending, downloader))
+    downloader = EssentialDownloader(negative_cache=negative_cache, storage=storage)
+    try:
+        asyncio.run(run(pending, downloader))
+    finally:
+        negative_cache.close()
+        storage.close()
 
     print()
     print("=" * 60)
@@ -254,6 +366,10 @@ def main():
         sys.exit(1)
     else:
         print(f"✅ Concluído: {downloader.downloaded} baixados, {downloader.skipped} pulados, {downloader.failed} falhas")
+    for line in downloader.limiter.summary():
+        print(f"   🚦 {line}")
+    for line in downloader.mirrors.summary():
+        print(f"   🌐 {line}")
 
 
 if __name__ == '__main__':
@@ -9,47 +9,41 @@ import sys
 import time
 import json
 import asyncio
-import aiohttp
+import multiprocessing
+import queue
 from pathlib import Path
-from math import pi, log, tan, atan, sinh, cos, radians
-import threading
 import logging
 from datetime import datetime
 
-# Coordenadas da América do Sul (aproximadas)
-# Bounds mais amplos para zoom baixo (visão continental com oceanos)
-SOUTH_AMERICA_BOUNDS_WIDE = {
-    'north': 12.5,   # Norte da Colômbia/Venezuela
-    'south': -56.0,  # Sul da Argentina
-    'west': -81.0,   # Oeste do Peru/Equador (inclui oceano Pacífico)
-    'east': -34.0    # Leste do Brasil (inclui oceano Atlântico)
-}
-
-# Bounds restritos para zooms maiores (exclui maior parte dos oceanos)
-SOUTH_AMERICA_BOUNDS_LAND = {
-    'north': 12.5,   # Norte da Colômbia/Venezuela
-    'south': -56.0,  # Sul da Argentina
-    'west': -73.0,   # Oeste do Peru/Equador (exclui Pacífico)
-    'east': -35.0    # Leste do Brasil (exclui Atlântico)
-}
+from tilelib.journal import DownloadJournal, replay
+from tilelib.httpclient import TileClientError, http2_available, open_client
+from tilelib.landmask import LandMask
+from tilelib.pngcheck import load_repair_list, REPAIR_LIST_FILENAME
+from tilelib.metrics import (METRICS_JSON_INTERVAL, MetricsRegistry, serve_metrics,
+                             snapshot_loop, write_snapshot)
+from tilelib.mirrors import MirrorScheduler
+from tilelib.negcache import NegativeCache, NEGATIVE_CACHE_FILENAME
+from tilelib.poiplan import centroid_layer
+from tilelib.ratelimit import AdaptiveRateLimiter, host_of
+from tilelib.render import LOCAL_TILE_URL, METATILE, metatile_order, open_source
+from tilelib.region import AMAZON_BOUNDS, get_bounds_for_zoom, iter_zoom_tiles
+from tilelib.schedule import PRIORITY_FULL_ZOOM, PriorityAreas, scheduled_tiles
+from tilelib.storage import DirectoryStorage, content_hash, open_storage
+from tilelib.tiling import count_bbox_tiles, shard_of
+from tilelib.validators import VALIDATORS_FILENAME, ValidatorIndex
+from tilelib.workqueue import run_pipeline
 
 # Níveis de zoom a baixar (0-12 = ~20GB, 0-10 = ~5GB, 0-8 = ~1GB)
 MIN_ZOOM = 5
 MAX_ZOOM = 12
 
-def get_bounds_for_zoom(zoom):
-    """Retorna bounds apropriados para o nível de zoom"""
-    # Zoom mínimo: incluir oceanos para visão continental
-    if zoom <= MIN_ZOOM:
-        return SOUTH_AMERICA_BOUNDS_WIDE
-    # Zooms maiores: focar na massa terrestre
-    else:
-        return SOUTH_AMERICA_BOUNDS_LAND
+# Máscara de terra (tilelib/data/south-america-land.geojson) nos zooms > MIN_ZOOM:
+# só tiles que tocam terra entram na fila. Desligar com --no-landmask.
+USE_LANDMASK = '--no-landmask' not in sys.argv
 
 # Diretório de saída
 TILES_DIR = Path(__file__).parent.parent / 'tiles'
-LOGS_DIR = TILES_DIR / 'logs'
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
+LOGS_DIR = TILES_DIR / 'logs'  # criado pelo TileDownloader: importar o script não toca em tiles/
 
 # Tile servers OSM oficial (load balancing a/b/c - MESMO ESTILO VISUAL)
 TILE_SERVERS = [
@@ -58,6 +52,11 @@ TILE_SERVERS = [
     'https://c.tile.openstreetmap.org/{z}/{x}/{y}.png',
 ]
 
+# --tile-url=TEMPLATE (repetível): espelho local/próprio no lugar dos servidores OSM
+CUSTOM_TILE_SERVERS = [a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--tile-url=')]
+if CUSTOM_TILE_SERVERS:
+    TILE_SERVERS = CUSTOM_TILE_SERVERS
+
 # Headers para respeitar a política de uso
 HEADERS = {
     'User-Agent': 'Atlas Cultural Amazonias Offline Maps/1.0'
@@ -66,42 +65,117 @@ HEADERS = {
 # Configurações otimizadas para estabilidade
 MAX_CONCURRENT_DOWNLOADS = 50  # Reduzido para evitar rate limiting
 CONNECTION_LIMIT_PER_HOST = 20  # Limite por host mais conservador
+# --http2: multiplexar as requisições em 2 conexões por espelho (httpx[http2])
+# em vez de até MAX_CONCURRENT_DOWNLOADS sockets HTTP/1.1
+USE_HTTP2 = '--http2' in sys.argv
 RETRY_ATTEMPTS = 5  # Mais tentativas para lidar com falhas temporárias
 TIMEOUT = 30  # Timeout maior para conexões lentas
 RETRY_DELAY_BASE = 0.5  # Delay base para backoff exponencial
-RATE_LIMIT_DELAY = 0.02 # Tempo de espera entre requisições (0.02 = 50 req/s)
+RATE_LIMIT_DELAY = 0.02 # Tempo de espera entre requisições (0.02 = 50 req/s) — teto do token bucket global
+BLOCKED_TILE_SIZE = 6987 # Imagem "access blocked" do OSM (mesmo detector de download-tiles-essential.py)
 PROGRESS_UPDATE_INTERVAL = 100  # Atualizar progresso a cada N tiles
-PROGRESS_FILE = TILES_DIR / '.progress.json'
+PROGRESS_FILE = TILES_DIR / '.progress.jsonl'  # journal append-only (tilelib/journal.py), removido ao concluir
+NEGATIVE_CACHE_FILE = TILES_DIR / NEGATIVE_CACHE_FILENAME
 
-def deg2num(lat, lon, zoom):
-    """Converter lat/lon para número de tile"""
-    # Limitar latitude para evitar erros matemáticos (Mercator limit)
-    lat = max(min(lat, 85.0511), -85.0511)
-    
-    n = 2.0 ** zoom
-    xtile = int((lon + 180.0) / 360.0 * n)
-    
-    # Fórmula alternativa mais estável para ytile
-    lat_rad = radians(lat)
-    ytile = int((1.0 - log(tan(lat_rad) + (1.0 / cos(lat_rad))) / pi) / 2.0 * n)
-    
-    return (xtile, ytile)
+# 404s recentes (cache negativo) não são pedidos de novo. --retry-404 ignora o cache.
+USE_NEGATIVE_CACHE = '--retry-404' not in sys.argv
+
+# --mbtiles grava num único arquivo MBTiles em vez de tiles/{z}/{x}/{y}.png
+# (converter entre os formatos com scripts/convert-tiles.py)
+MBTILES_FILE = TILES_DIR.parent / 'tiles.mbtiles'
+USE_MBTILES = '--mbtiles' in sys.argv
+
+# --refresh revalida os tiles já baixados com GET condicional (ETag/Last-Modified)
+# em vez de `rm -rf tiles/*` + download completo. Só regrava o que mudou.
+#   --refresh-older-than=DIAS  só tiles verificados há mais de N dias (padrão 30)
+#   --refresh-order=age|zoom   mais antigos primeiro (padrão) ou zooms baixos primeiro
+VALIDATORS_FILE = TILES_DIR / VALIDATORS_FILENAME
+REFRESH_MODE = '--refresh' in sys.argv
+REFRESH_OLDER_THAN_DAYS = 30
+
+# --repair[=arquivo] baixa de novo os tiles da lista de reparo gerada pelo
+# analyze-tiles.py (PNGs truncados, HTML, bloqueio). Também aceita um
+# logs/failed_tiles_*.json.
+REPAIR_LIST_FILE = TILES_DIR / REPAIR_LIST_FILENAME
+REPAIR_MODE = any(a == '--repair' or a.startswith('--repair=') for a in sys.argv[1:])
+
+# --shards=N: N processos, cada um com event loop, storage e journal próprios,
+# dividindo os tiles por prefixo de quadkey (tilelib/tiling.py:shard_of). Para
+# espelhar de uma fonte local/própria (--tile-url), onde o gargalo é a CPU de um
+# único processo e não a taxa do servidor. O orçamento de taxa e de workers é
+# dividido igualmente entre os shards. Só com o storage em diretório: junto com
+# --mbtiles (um único arquivo, um único escritor) o script recusa e sai com erro.
+# Com --refresh o --shards é ignorado.
+SHARD_STATS_INTERVAL = 1.0  # s entre atualizações do coordenador
+
+def arg_value(name, default=None):
+    """Valor de uma opção --nome=valor em sys.argv"""
+    prefix = f'--{name}='
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+# --source=mbtiles:ARQUIVO | mapnik:ESTILO.xml gera os tiles a partir de dados
+# locais, sem rede (tilelib/render.py), com a mesma saída tiles/{z}/{x}/{y}.png.
+# O render mapnik usa metatiles 8×8 num pool de --render-processes processos.
+LOCAL_SOURCE = arg_value('source')
+RENDER_PROCESSES = int(arg_value('render-processes', os.cpu_count() or 1))
+if LOCAL_SOURCE:
+    TILE_SERVERS = [LOCAL_TILE_URL]
+    RATE_LIMIT_DELAY = 0.0001  # sem servidor remoto para proteger
+
+# Ordem do plano (tilelib/schedule.py): zooms ≤ PRIORITY_FULL_ZOOM inteiros,
+# depois Amazônia Legal + localidades do centroides.json (raio + buffer), depois
+# o resto; curva de Hilbert dentro de cada zoom. Uma execução interrompida deixa
+# um mapa navegável e as gravações ficam sequenciais no disco.
+# --order=xy volta à ordem antiga (zoom → x → y).
+PLAN_ORDER = arg_value('order', 'priority')
+CENTROIDS_FILE = Path(__file__).parent / 'centroides.json'
+CENTROID_BUFFER_M = 20_000  # além do radius_km: a vista em volta da cidade
+
+# Métricas (tilelib/metrics.py): contadores por resultado/zoom, latência por
+# espelho/status/zoom, bytes gravados, profundidade da fila e taxas do limiter.
+#   --metrics-port=N     endpoint http://127.0.0.1:N/metrics (Prometheus/OpenMetrics)
+#   --metrics-json[=S]   snapshot a cada S s (padrão 30) em logs/metrics_*.jsonl
+# Com --shards o shard i usa a porta N+i e um arquivo próprio.
+METRICS_PORT = int(arg_value('metrics-port', 0)) or None
+METRICS_JSON = '--metrics-json' in sys.argv or arg_value('metrics-json') is not None
+METRICS_JSON_EVERY = float(arg_value('metrics-json', METRICS_JSON_INTERVAL))
 
 class TileDownloader:
     """Gerenciador de downloads assíncronos com logging detalhado"""
     
-    def __init__(self):
+    def __init__(self, negative_cache=None, storage=None, limiter=None, validators=None):
         self.lock = asyncio.Lock()
+        self.negative_cache = negative_cache  # NegativeCache ou None
+        self.storage = storage or DirectoryStorage(TILES_DIR)
+        self.validators = validators  # ValidatorIndex (ETag/Last-Modified) ou None
+        self.derived = set()  # --refresh: (z, x, y) gerados pelo derive-tiles.py, pedidos sem GET condicional
+        # Token bucket global (1/RATE_LIMIT_DELAY) + um por servidor, com AIMD em 429/403/503/bloqueio
+        self.limiter = limiter or AdaptiveRateLimiter(
+            1 / RATE_LIMIT_DELAY,
+            per_host_rate=1 / RATE_LIMIT_DELAY / len(TILE_SERVERS),
+            hosts=[host_of(s) for s in TILE_SERVERS],
+        )
         self.downloaded_count = 0
+        self.downloaded_bytes = 0  # bytes dos tiles novos desta execução (tamanho médio no relatório)
         self.failed_count = 0
         self.skipped_count = 0
         self.not_found_count = 0  # Tiles que não existem (404 - água/áreas vazias)
-        self.server_index = 0
+        self.updated_count = 0  # --refresh: tiles que mudaram e foram regravados
+        self.not_modified_count = 0  # --refresh: 304 ou conteúdo idêntico
+        # Espelho por latência EWMA / taxa de erro / 429, com cooldown dos não saudáveis
+        self.mirrors = MirrorScheduler(TILE_SERVERS)
         self.start_time = None
         self.failed_tiles = []  # Lista de tiles que falharam
         self.error_counts = {}  # Contagem de tipos de erro
+        self.queue = None  # fila do run_pipeline, para a métrica de profundidade
+        self.planned_total = 0
+        self._init_metrics()
         
         # Configurar logging
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
         log_file = LOGS_DIR / f'download_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
         self.logger = logging.getLogger('TileDownloader')
         self.logger.setLevel(logging.INFO)
@@ -116,11 +190,30 @@ class TileDownloader:
         self.logger.info(f"Iniciando download de tiles")
         self.logger.info(f"Configuração: MAX_CONCURRENT={MAX_CONCURRENT_DOWNLOADS}, RETRY={RETRY_ATTEMPTS}, TIMEOUT={TIMEOUT}s")
         
-    def get_next_server(self):
-        """Rotacionar entre servidores para distribuir carga"""
-        server = TILE_SERVERS[self.server_index % len(TILE_SERVERS)]
-        self.server_index += 1
-        return server
+    def _init_metrics(self):
+        """Famílias de métricas; os gauges só são lidos na exposição"""
+        self.metrics = MetricsRegistry('tiledl')
+        self.tile_results = self.metrics.counter(
+            'tiles', 'Tiles concluídos por resultado', ('status', 'zoom'))
+        self.request_latency = self.metrics.histogram(
+            'request_duration_seconds', 'Latência de cada requisição ao espelho', ('mirror', 'status', 'zoom'))
+        self.bytes_written = self.metrics.counter(
+            'written_bytes', 'Bytes de tiles gravados (antes da deduplicação)', ('zoom',))
+        self.metrics.gauge('planned_tiles', 'Tiles a processar nesta execução', lambda: self.planned_total)
+        self.metrics.gauge('queue_depth', 'Tiles na fila aguardando um worker',
+                           lambda: self.queue.qsize() if self.queue is not None else 0)
+        self.metrics.gauge('mirror_inflight', 'Requisições em andamento por espelho',
+                           lambda: {(host_of(m.server),): m.inflight for m in self.mirrors.mirrors.values()},
+                           ('mirror',))
+        self.metrics.gauge('mirror_latency_ewma_seconds', 'Latência EWMA usada na escolha do espelho',
+                           lambda: {(host_of(m.server),): m.latency or 0.0 for m in self.mirrors.mirrors.values()},
+                           ('mirror',))
+        self.metrics.gauge('rate_limit_requests_per_second', 'Taxa atual do token bucket (AIMD)',
+                           lambda: {('global',): self.limiter.global_bucket.rate,
+                                    **{(host,): b.rate for host, b in self.limiter.hosts.items()}},
+                           ('bucket',))
+        self.metrics.gauge('dedup_saved_bytes', 'Bytes não gravados graças à deduplicação',
+                           lambda: self.storage.dedup_bytes)
     
     def calculate_eta(self, completed, total, elapsed):
         """Calcular tempo estimado para conclusão"""
@@ -133,12 +226,33 @@ class TileDownloader:
         
         return rate, eta_seconds
         
+    def snapshot(self, total, final=False):
+        """Contadores enviados ao coordenador do modo --shards"""
+        snap = {
+            'total': total,
+            'completed': (self.downloaded_count + self.skipped_count + self.not_found_count
+                          + self.failed_count + self.updated_count + self.not_modified_count),
+            'downloaded': self.downloaded_count,
+            'skipped': self.skipped_count,
+            'not_found': self.not_found_count,
+            'failed': self.failed_count,
+            'rate': self.limiter.rate,
+            'dedup_hits': self.storage.dedup_hits,
+            'dedup_bytes': self.storage.dedup_bytes,
+        }
+        if final:
+            snap['error_counts'] = dict(self.error_counts)
+            snap['failed_tiles'] = self.failed_tiles[:1000]
+            snap['limiter'] = self.limiter.summary()
+            snap['mirrors'] = self.mirrors.summary()
+        return snap
+    
     def tile_exists(self, z, x, y):
-        """Verificar se tile já existe no disco"""
-        tile_file = TILES_DIR / str(z) / str(x) / f"{y}.png"
-        return tile_file.exists()
+        """Verificar se tile já existe no storage (inventário em memória, sem stat)"""
+        return (z, x, y) in self.storage
     
-    def format_time(self, seconds):
+    @staticmethod
+    def format_time(seconds):
         """Formatar tempo em formato legível"""
         if seconds < 60:
             return f"{seconds:.0f}s"
@@ -149,78 +263,126 @@ class TileDownloader:
             mins = int((seconds % 3600) / 60)
             return f"{hours}h{mins:02d}min"
     
-    async def download_tile_with_retry(self, session, z, x, y):
-        """Baixar um tile assíncronamente com retry automático e backoff exponencial"""
-        # Verificar se já existe (verificação rápida no disco)
-        tile_file = TILES_DIR / str(z) / str(x) / f"{y}.png"
-        if tile_file.exists():
+    async def download_tile_with_retry(self, client, z, x, y, refresh=False):
+        """
+        Baixar um tile assíncronamente com retry automático e backoff exponencial.
+        Com refresh=True o tile existente é revalidado com GET condicional.
+        """
+        # Verificar se já existe (inventário em memória, sem stat)
+        if not refresh and self.tile_exists(z, x, y):
             self.skipped_count += 1
             return True, "exists"
         
-        output_path = TILES_DIR / str(z) / str(x)
-        output_path.mkdir(parents=True, exist_ok=True)
+        headers = None
+        # O mtime de um tile derivado é o da derivação: If-Modified-Since daria 304
+        if refresh and self.validators is not None and (z, x, y) not in self.derived:
+            headers = self.validators.conditional_headers(
+                z, x, y, fallback_mtime=self.storage.mtime(z, x, y)
+            )
         
         last_error = None
         last_status = None
         
-        # Tentar com diferentes servidores e backoff exponencial
+        # Melhor espelho a cada tentativa (o retry evita o da tentativa anterior)
+        server_url = None
         for attempt in range(RETRY_ATTEMPTS):
-            server_url = self.get_next_server()
+            server_url = self.mirrors.pick(avoid=server_url)
             url = server_url.format(z=z, x=x, y=y)
+            host = host_of(server_url)
             
             try:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=TIMEOUT, connect=10)) as response:
-                    last_status = response.status
+                response = await self._fetch(client, server_url, url, headers, host, z)
+                last_status = response.status
+                
+                if response.status == 304:
+                    # --refresh: tile não mudou, nada a gravar
+                    self.limiter.on_success(host)
+                    self._record_validators(z, x, y, response, changed=False)
+                    self.not_modified_count += 1
+                    return True, "not_modified"
+                
+                if response.status == 200:
+                    content = response.content
+                    
+                    # Validar conteúdo (mínimo 100 bytes para ser um PNG válido)
+                    if len(content) < 100:
+                        self.logger.warning(f"Tile {z}/{x}/{y}: conteúdo muito pequeno ({len(content)} bytes)")
+                        if attempt == RETRY_ATTEMPTS - 1:
+                            self._record_failure(z, x, y, "content_too_small")
+                            return False, "invalid_content"
+                        await asyncio.sleep(RETRY_DELAY_BASE * (2 ** attempt))
+                        continue
+                    
+                    # Imagem de bloqueio do OSM: reduzir a taxa e tentar de novo
+                    if len(content) == BLOCKED_TILE_SIZE:
+                        self.logger.warning(f"Tile {z}/{x}/{y}: imagem de bloqueio OSM ({host}), reduzindo taxa")
+                        self.limiter.on_throttle(host)
+                        self.mirrors.on_throttle(server_url)
+                        if attempt == RETRY_ATTEMPTS - 1:
+                            self._record_failure(z, x, y, "blocked")
+                            return False, "blocked"
+                        await asyncio.sleep(RETRY_DELAY_BASE * (2 ** (attempt + 2)))
+                        continue
+                    
+                    self.limiter.on_success(host)
                     
-                    if response.status == 200:
-                        content = await response.read()
-                        
-                        # Validar conteúdo (mínimo 100 bytes para ser um PNG válido)
-                        if len(content) < 100:
-                            self.logger.warning(f"Tile {z}/{x}/{y}: conteúdo muito pequeno ({len(content)} bytes)")
-                            if attempt == RETRY_ATTEMPTS - 1:
-                                self._record_failure(z, x, y, "content_too_small")
-                                return False, "invalid_content"
-                            await asyncio.sleep(RETRY_DELAY_BASE * (2 ** attempt))
-                            continue
-                        
-                        # Escrever de forma síncrona (I/O de disco)
-                        await asyncio.to_thread(tile_file.write_bytes, content)
-                        self.downloaded_count += 1
-                        return True, "downloaded"
-                        
-                    elif response.status == 404:
-                        # Tile não existe (água/área vazia) - isso é normal
-                        self.not_found_count += 1
-                        return True, "not_found"
-                        
-                    elif response.status == 429:
-                        # Rate limit - esperar mais tempo
-                        self.logger.warning(f"Rate limit atingido no tile {z}/{x}/{y}, tentativa {attempt+1}/{RETRY_ATTEMPTS}")
-                        if attempt < RETRY_ATTEMPTS - 1:
-                            await asyncio.sleep(RETRY_DELAY_BASE * (2 ** (attempt + 2)))  # Esperar mais em caso de 429
-                            continue
-                        
-                    elif response.status in [500, 502, 503, 504]:
-                        # Erro do servidor - retry com backoff
-                        self.logger.warning(f"Erro servidor {response.status} no tile {z}/{x}/{y}, tentativa {attempt+1}/{RETRY_ATTEMPTS}")
-                        if attempt < RETRY_ATTEMPTS - 1:
-                            await asyncio.sleep(RETRY_DELAY_BASE * (2 ** attempt))
-                            continue
+                    digest = content_hash(content)
+                    if refresh and await self._unchanged(z, x, y, content, digest):
+                        self._record_validators(z, x, y, response, changed=False, sha1=digest)
+                        self.not_modified_count += 1
+                        return True, "not_modified"
                     
-                    elif response.status == 403:
-                        # Proibido - pode ser bloqueio temporário
-                        self.logger.warning(f"Acesso proibido (403) no tile {z}/{x}/{y}")
-                        if attempt < RETRY_ATTEMPTS - 1:
-                            await asyncio.sleep(RETRY_DELAY_BASE * (2 ** (attempt + 1)))
-                            continue
+                    # Escrever de forma síncrona (I/O de disco)
+                    await asyncio.to_thread(self.storage.write, z, x, y, content)
+                    self.bytes_written.inc((z,), len(content))
+                    self._record_validators(z, x, y, response, changed=True, sha1=digest)
+                    if refresh:
+                        self.updated_count += 1
+                        return True, "updated"
+                    self.downloaded_count += 1
+                    self.downloaded_bytes += len(content)
+                    return True, "downloaded"
+                    
+                elif response.status == 404:
+                    # Tile não existe (água/área vazia) - isso é normal
+                    self.limiter.on_success(host)
+                    self.not_found_count += 1
+                    if self.negative_cache is not None and not refresh:
+                        self.negative_cache.add(z, x, y)
+                    return True, "not_found"
+                    
+                elif response.status == 429:
+                    # Rate limit - esperar mais tempo
+                    self.logger.warning(f"Rate limit atingido no tile {z}/{x}/{y}, tentativa {attempt+1}/{RETRY_ATTEMPTS}")
+                    self.limiter.on_throttle(host)
+                    if attempt < RETRY_ATTEMPTS - 1:
+                        await asyncio.sleep(RETRY_DELAY_BASE * (2 ** (attempt + 2)))  # Esperar mais em caso de 429
+                        continue
+                    
+                elif response.status in [500, 502, 503, 504]:
+                    # Erro do servidor - retry com backoff
+                    self.logger.warning(f"Erro servidor {response.status} no tile {z}/{x}/{y}, tentativa {attempt+1}/{RETRY_ATTEMPTS}")
+                    if response.status == 503:
+                        # Servidor sobrecarregado: mesmo sinal de um 429 para o AIMD
+                        self.limiter.on_throttle(host)
+                    if attempt < RETRY_ATTEMPTS - 1:
+                        await asyncio.sleep(RETRY_DELAY_BASE * (2 ** attempt))
+                        continue
+                
+                elif response.status == 403:
+                    # Proibido - pode ser bloqueio temporário
+                    self.logger.warning(f"Acesso proibido (403) no tile {z}/{x}/{y}")
+                    self.limiter.on_throttle(host)
+                    if attempt < RETRY_ATTEMPTS - 1:
+                        await asyncio.sleep(RETRY_DELAY_BASE * (2 ** (attempt + 1)))
+                        continue
+                
+                # Outros erros HTTP
+                if attempt == RETRY_ATTEMPTS - 1:
+                    error_type = f"http_{response.status}"
+                    self._record_failure(z, x, y, error_type)
+                    return False, error_type
                     
-                    # Outros erros HTTP
-                    if attempt == RETRY_ATTEMPTS - 1:
-                        error_type = f"http_{response.status}"
-                        self._record_failure(z, x, y, error_type)
-                        return False, error_type
-                        
             except asyncio.TimeoutError:
                 last_error = "timeout"
                 self.logger.debug(f"Timeout no tile {z}/{x}/{y}, tentativa {attempt+1}/{RETRY_ATTEMPTS}")
@@ -228,8 +390,8 @@ class TileDownloader:
                     await asyncio.sleep(RETRY_DELAY_BASE * (2 ** attempt))
                     continue
                     
-            except aiohttp.ClientError as e:
-                last_error = f"client_error_{type(e).__name__}"
+            except TileClientError as e:
+                last_error = f"client_error_{e.kind}"
                 self.logger.debug(f"Erro cliente no tile {z}/{x}/{y}: {e}, tentativa {attempt+1}/{RETRY_ATTEMPTS}")
                 if attempt < RETRY_ATTEMPTS - 1:
                     await asyncio.sleep(RETRY_DELAY_BASE * (2 ** attempt))
@@ -243,162 +405,610 @@ class TileDownloader:
                     continue
         
         # Se chegou aqui, todas as tentativas falharam
-        error_type = last_error or f"http_{last_status}" or "unknown"
+        if last_error is not None:
+            error_type = last_error
+        elif last_status is not None:
+            error_type = f"http_{last_status}"
+        else:
+            error_type = "unknown"
         self._record_failure(z, x, y, error_type)
         return False, error_type
     
+    async def _fetch(self, client, server_url, url, headers, host, z):
+        """Token do rate limiter + mirrors.fetch(), registrando a latência por espelho/status/zoom"""
+        start = None
+        
+        async def acquire():
+            nonlocal start
+            await self.limiter.acquire(host)
+            start = time.monotonic()  # latência sem a espera pelo token
+        
+        try:
+            response = await self.mirrors.fetch(client, server_url, url, headers=headers, wait=acquire)
+        except asyncio.TimeoutError:
+            if start is not None:
+                self.request_latency.observe((host, 'timeout', z), time.monotonic() - start)
+            raise
+        except Exception:
+            if start is not None:
+                self.request_latency.observe((host, 'error', z), time.monotonic() - start)
+            raise
+        self.request_latency.observe((host, str(response.status), z), time.monotonic() - start)
+        return response
+    
+    async def _unchanged(self, z, x, y, content, digest):
+        """
+        Servidor sem suporte a validadores: o 200 traz o mesmo conteúdo?
+        Compara com o hash do que foi baixado da última vez (o arquivo em disco
+        pode ter sido recomprimido pelo optimize-tiles.py); sem hash gravado ou
+        num tile derivado, com a cópia local.
+        """
+        recorded = None
+        if self.validators is not None and (z, x, y) not in self.derived:
+            recorded = self.validators.downloaded_hash(z, x, y)
+        if recorded is not None:
+            return recorded == digest
+        return await asyncio.to_thread(self.storage.read, z, x, y) == content
+    
+    def _record_validators(self, z, x, y, response, changed, sha1=None):
+        """Guardar ETag/Last-Modified (e o hash do corpo) para o próximo --refresh"""
+        if self.validators is not None:
+            self.validators.record(
+                z, x, y,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                changed=changed,
+                sha1=sha1,
+            )
+    
     def _record_failure(self, z, x, y, error_type):
         """Registrar falha de download"""
         self.failed_count += 1
         self.failed_tiles.append((z, x, y, error_type))
         self.error_counts[error_type] = self.error_counts.get(error_type, 0) + 1
 
-def count_existing_tiles(tiles_to_check):
-    """Contar quantos tiles já existem no disco"""
-    existing = 0
-    for z, x, y in tiles_to_check:
-        tile_file = TILES_DIR / str(z) / str(x) / f"{y}.png"
-        if tile_file.exists():
-            existing += 1
-    return existing
-
-async def download_all_tiles(tiles_to_download, downloader):
-    """Baixar todos os tiles usando async/await com processamento em lotes"""
-    # Configurar conexão HTTP com limites agressivos
-    connector = aiohttp.TCPConnector(
-        limit=MAX_CONCURRENT_DOWNLOADS,
-        limit_per_host=CONNECTION_LIMIT_PER_HOST,
-        ttl_dns_cache=300,
-        force_close=False,
-        enable_cleanup_closed=True
-    )
-    
-    timeout = aiohttp.ClientTimeout(total=TIMEOUT, connect=5)
-    
-    async with aiohttp.ClientSession(
-        connector=connector,
-        headers=HEADERS,
-        timeout=timeout
-    ) as session:
+def priority_areas():
+    """Amazônia + círculos das localidades (centroides.json, se existir)"""
+    layers = []
+    if CENTROIDS_FILE.exists():
+        layers.append(centroid_layer(CENTROIDS_FILE, (MIN_ZOOM, MAX_ZOOM), buffer_m=CENTROID_BUFFER_M))
+    return PriorityAreas([AMAZON_BOUNDS], layers)
+
+def iter_planned_tiles(landmask=None, tiers=None):
+    """
+    Gerar (z, x, y) de MIN_ZOOM a MAX_ZOOM na ordem de prioridade (só a faixa
+    do zoom sendo gerada fica em memória). tiers, se for um dict, recebe as
+    contagens por faixa.
+    """
+    if PLAN_ORDER != 'xy':
+        # Fonte local: a curva percorre metatiles, cada um renderizado uma vez
+        yield from scheduled_tiles(
+            lambda zoom: iter_zoom_tiles(zoom, MIN_ZOOM, landmask),
+            range(MIN_ZOOM, MAX_ZOOM + 1), priority_areas(),
+            block=METATILE if LOCAL_SOURCE else 1, tiers=tiers,
+        )
+        return
+    for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+        # Com máscara, só tiles que tocam terra (oceano volta 404 de qualquer forma)
+        tiles = iter_zoom_tiles(zoom, MIN_ZOOM, landmask)
+        if LOCAL_SOURCE:
+            # Tiles do mesmo metatile em sequência: cada um é renderizado uma vez
+            tiles = metatile_order(tiles)
+        for x, y in tiles:
+            yield zoom, x, y
+
+def open_negative_cache():
+    """
+    Cache de 404 do servidor remoto (compartilhado com download-tiles-essential.py).
+    Com --source um 404 só diz que o dado local não cobre o tile: não vai para o cache.
+    """
+    return None if LOCAL_SOURCE else NegativeCache(NEGATIVE_CACHE_FILE)
+
+def open_validators():
+    """ETag/Last-Modified do servidor remoto; a fonte local não tem validadores"""
+    return None if LOCAL_SOURCE else ValidatorIndex(VALIDATORS_FILE)
+
+def close_all(*resources):
+    """Fechar os índices abertos (os opcionais podem ser None)"""
+    for resource in resources:
+        if resource is not None:
+            resource.close()
+
+def iter_pending_tiles(planned, storage, negative_cache=None):
+    """Filtrar (preguiçosamente) tiles já no storage e 404s recentes"""
+    for tile in planned:
+        if tile in storage:
+            continue
+        if negative_cache is not None and negative_cache.known(*tile):
+            continue
+        yield tile
+
+def metrics_file(suffix=''):
+    """Arquivo JSON Lines dos snapshots de --metrics-json"""
+    return LOGS_DIR / f'metrics_{datetime.now().strftime("%Y%m%d_%H%M%S")}{suffix}.jsonl'
+
+async def download_all_tiles(tiles_to_download, total, downloader, journal=None, refresh=False,
+                             workers=MAX_CONCURRENT_DOWNLOADS, on_progress=None,
+                             metrics_port=METRICS_PORT, metrics_path=None):
+    """
+    Baixar os tiles com um pipeline produtor/consumidor (fila limitada + workers).
+    on_progress(completed), se informado, substitui a barra de progresso (--shards).
+    metrics_port / metrics_path ligam o endpoint /metrics e os snapshots JSON.
+    """
+    downloader.planned_total = total
+    metrics_runner = await serve_metrics(downloader.metrics, metrics_port) if metrics_port else None
+    if metrics_path is None and METRICS_JSON:
+        metrics_path = metrics_file()
+    snapshots = (asyncio.create_task(snapshot_loop(downloader.metrics, metrics_path, METRICS_JSON_EVERY))
+                 if metrics_path else None)
+    try:
+        await _download_all_tiles(tiles_to_download, total, downloader, journal, refresh, workers, on_progress)
+    finally:
+        if snapshots is not None:
+            snapshots.cancel()
+            write_snapshot(downloader.metrics, metrics_path)  # estado final
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+async def _download_all_tiles(tiles_to_download, total, downloader, journal, refresh, workers, on_progress):
+    # Cliente HTTP/1.1 (pool aiohttp), HTTP/2 multiplexado (--http2) ou fonte local (--source)
+    if LOCAL_SOURCE:
+        client_context = open_source(LOCAL_SOURCE, processes=RENDER_PROCESSES)
+    else:
+        client_context = open_client(
+            http2=USE_HTTP2,
+            headers=HEADERS,
+            max_connections=MAX_CONCURRENT_DOWNLOADS,
+            max_per_host=CONNECTION_LIMIT_PER_HOST,
+            timeout=TIMEOUT,
+        )
+    async with client_context as client:
         
         completed = 0
         last_update = time.time()
-        total = len(tiles_to_download)
-        
-        # Processar em lotes para não sobrecarregar memória
-        batch_size = 1000
         
-        for batch_start in range(0, total, batch_size):
-            batch_end = min(batch_start + batch_size, total)
-            batch = tiles_to_download[batch_start:batch_end]
+        def on_done(tile, result):
+            nonlocal completed, last_update
+            completed += 1
+            downloader.tile_results.inc((result[1], tile[0]))
+            if journal is not None:
+                journal.record(*tile, *result)
+            current_time = time.time()
             
-            # Criar tasks para este lote
-            tasks = [
-                downloader.download_tile_with_retry(session, z, x, y)
-                for z, x, y in batch
-            ]
-            
-            # Aguardar conclusão do lote
-            for coro in asyncio.as_completed(tasks):
-                await coro
-                completed += 1
-                current_time = time.time()
+            # Atualizar progresso
+            if completed % PROGRESS_UPDATE_INTERVAL == 0 or (current_time - last_update) >= 2:
+                last_update = current_time
+                if on_progress is not None:
+                    on_progress(completed)
+                    return
                 
-                # Atualizar progresso
-                if completed % PROGRESS_UPDATE_INTERVAL == 0 or (current_time - last_update) >= 2:
-                    elapsed = current_time - downloader.start_time
-                    rate, eta_seconds = downloader.calculate_eta(
-                        completed,
-                        total,
-                        elapsed
-                    )
-                    
-                    percent = (completed / total) * 100
-                    bar_length = 30
-                    filled = int(bar_length * completed / total)
-                    bar = '█' * filled + '░' * (bar_length - filled)
-                    
-                    print(f"\r[{bar}] {percent:.1f}% | "
-                          f"{completed:,}/{total:,} | "
-                          f"⚡ {rate:.1f} tiles/s | "
-                          f"⏱️  ETA: {downloader.format_time(eta_seconds)} | "
-                          f"✓ {downloader.downloaded_count:,} | "
-                          f"⊘ {downloader.skipped_count:,} | "
-                          f"⊙ {downloader.not_found_count:,} | "
-                          f"✗ {downloader.failed_count:,}", end='')
-                    
-                    last_update = current_time
+                elapsed = current_time - downloader.start_time
+                rate, eta_seconds = downloader.calculate_eta(
+                    completed,
+                    total,
+                    elapsed
+                )
+                
+                percent = (completed / total) * 100
+                bar_length = 30
+                filled = int(bar_length * completed / total)
+                bar = '█' * filled + '░' * (bar_length - filled)
+                
+                print(f"\r[{bar}] {percent:.1f}% | "
+                      f"{completed:,}/{total:,} | "
+                      f"⚡ {rate:.1f} tiles/s | "
+                      f"🚦 {downloader.limiter.rate:.0f} req/s | "
+                      f"⏱️  ETA: {downloader.format_time(eta_seconds)} | "
+                      f"✓ {downloader.downloaded_count + downloader.updated_count:,} | "
+                      f"⊘ {downloader.skipped_count + downloader.not_modified_count:,} | "
+                      f"⊙ {downloader.not_found_count:,} | "
+                      f"✗ {downloader.failed_count:,}", end='')
+        
+        # Workers de vida longa: um tile lento não segura os outros
+        await run_pipeline(
+            tiles_to_download,
+            lambda z, x, y: downloader.download_tile_with_retry(client, z, x, y, refresh=refresh),
+            workers=workers,
+            on_done=on_done,
+            on_queue=lambda q: setattr(downloader, 'queue', q),
+        )
         
-        print()  # Nova linha final
+        if on_progress is None:
+            print()  # Nova linha final
+
+def refresh_tiles():
+    """
+    --refresh: revalidar tiles já baixados com GET condicional.
+    Tiles inalterados (304 ou corpo idêntico) não são regravados.
+    """
+    older_than_days = float(arg_value('refresh-older-than', REFRESH_OLDER_THAN_DAYS))
+    order = arg_value('refresh-order', 'age')
+    
+    print("=== Revalidação de Tiles OSM (--refresh) ===")
+    print(f"Zoom levels: {MIN_ZOOM}-{MAX_ZOOM}")
+    print(f"Destino: {MBTILES_FILE if USE_MBTILES else TILES_DIR}")
+    print(f"Só tiles verificados há mais de {older_than_days:g} dias, ordem: {order}")
+    print()
+    
+    print("Verificando tiles já baixados...")
+    storage = open_storage(TILES_DIR, MBTILES_FILE if USE_MBTILES else None)
+    storage.scan(range(MIN_ZOOM, MAX_ZOOM + 1))
+    validators = ValidatorIndex(VALIDATORS_FILE)
+    validators.ensure(t for t in storage.tiles() if MIN_ZOOM <= t[0] <= MAX_ZOOM)
+    due = validators.due(MIN_ZOOM, MAX_ZOOM, int(older_than_days * 86400), order=order)
+    
+    print(f"Tiles a revalidar: {len(due):,}")
+    if not due:
+        print("Nenhum tile precisa de revalidação.")
+        validators.close()
+        storage.close()
+        return
+    
+    response = input("Deseja continuar? (s/N): ")
+    if response.lower() != 's':
+        print("Revalidação cancelada.")
+        validators.close()
+        storage.close()
+        return
+    
+    downloader = TileDownloader(storage=storage, validators=validators)
+    index = getattr(storage, 'index', None)
+    if index is not None:
+        downloader.derived = {(z, x, y) for z, tiles in index.derived_tiles().items() for x, y in tiles}
+    downloader.start_time = time.time()
+    try:
+        asyncio.run(download_all_tiles(due, len(due), downloader, refresh=True))
+    finally:
+        validators.close()
+        storage.close()
+    
+    elapsed = time.time() - downloader.start_time
+    print(f"\n{'='*60}")
+    print(f"✅ Revalidação Completa!")
+    print(f"{'='*60}")
+    print(f"⏱️  Tempo total: {downloader.format_time(elapsed)}")
+    print(f"   ↻ Tiles atualizados:    {downloader.updated_count:,}")
+    print(f"   = Tiles inalterados:    {downloader.not_modified_count:,} (304 / conteúdo idêntico)")
+    print(f"   ⊙ Tiles 404:            {downloader.not_found_count:,} (cópia local mantida)")
+    print(f"   ✗ Tiles com falha:      {downloader.failed_count:,}")
+    downloader.logger.info(f"Revalidação concluída: {downloader.updated_count} atualizados, "
+                           f"{downloader.not_modified_count} inalterados, {downloader.failed_count} falhas")
+
+def repair_tiles():
+    """--repair: sobrescrever os tiles da lista de reparo com uma cópia nova"""
+    repair_file = Path(arg_value('repair', REPAIR_LIST_FILE))
+    if not repair_file.exists():
+        print(f"❌ Lista de reparo não encontrada: {repair_file}")
+        print("   Gere com: python3 scripts/analyze-tiles.py")
+        return
+    tiles = load_repair_list(repair_file)
+    
+    print("=== Reparo de Tiles OSM (--repair) ===")
+    print(f"Lista: {repair_file}")
+    print(f"Tiles a baixar de novo: {len(tiles):,}")
+    if not tiles:
+        return
+    
+    response = input("Deseja continuar? (s/N): ")
+    if response.lower() != 's':
+        print("Reparo cancelado.")
+        return
+    
+    storage = open_storage(TILES_DIR, MBTILES_FILE if USE_MBTILES else None)
+    storage.scan(sorted({t[0] for t in tiles}))
+    downloader = TileDownloader(storage=storage)  # sem GET condicional: a cópia local é a suspeita
+    downloader.start_time = time.time()
+    try:
+        # refresh=True força a sobrescrita de tiles presentes no storage
+        asyncio.run(download_all_tiles(tiles, len(tiles), downloader, refresh=True))
+    finally:
+        storage.close()
+    
+    repaired = downloader.updated_count
+    print(f"\n✅ Reparo concluído: {repaired:,} tiles regravados, "
+          f"{downloader.not_found_count:,} 404, {downloader.failed_count:,} falhas")
+    if downloader.failed_count == 0 and repair_file == REPAIR_LIST_FILE:
+        repair_file.unlink()
+    downloader.logger.info(f"Reparo concluído: {repaired} regravados, {downloader.failed_count} falhas")
+
+def shard_progress_file(shard, shards):
+    """Journal próprio de cada shard (retomada independente)"""
+    return PROGRESS_FILE.with_name(f'.progress.shard{shard}of{shards}.jsonl')
+
+def run_shard(shard, shards, stats_queue):
+    """Processo de um shard: planeja, filtra e baixa só os tiles dos seus quadrantes"""
+    landmask = LandMask() if USE_LANDMASK else None
+    storage = DirectoryStorage(TILES_DIR)
+    negative_cache = open_negative_cache()
+    active_cache = negative_cache if USE_NEGATIVE_CACHE else None
+    
+    progress_file = shard_progress_file(shard, shards)
+    resume = replay(progress_file)
+    if negative_cache is not None:
+        for tile in resume.not_found:
+            negative_cache.add(*tile)
+        negative_cache.flush()
+    
+    def shard_tiles():
+        planned = (t for t in iter_planned_tiles(landmask) if shard_of(*t, shards) == shard)
+        return iter_pending_tiles(planned, storage, active_cache)
+    
+    pending_total = sum(1 for _ in shard_tiles())
+    limiter = AdaptiveRateLimiter(
+        1 / RATE_LIMIT_DELAY / shards,
+        per_host_rate=1 / RATE_LIMIT_DELAY / len(TILE_SERVERS) / shards,
+        hosts=[host_of(s) for s in TILE_SERVERS],
+    )
+    validators = open_validators()
+    downloader = TileDownloader(negative_cache=negative_cache, storage=storage,
+                                limiter=limiter, validators=validators)
+    downloader.start_time = time.time()
+    stats_queue.put(('progress', shard, downloader.snapshot(pending_total)))
+    
+    journal = DownloadJournal(progress_file, before_flush=storage.flush)
+    completed_run = False
+    try:
+        if pending_total:
+            asyncio.run(download_all_tiles(
+                shard_tiles(), pending_total, downloader, journal,
+                workers=max(1, MAX_CONCURRENT_DOWNLOADS // shards),
+                on_progress=lambda completed: stats_queue.put(
+                    ('progress', shard, downloader.snapshot(pending_total))),
+                metrics_port=METRICS_PORT + shard if METRICS_PORT else None,
+                metrics_path=metrics_file(f'_shard{shard}of{shards}') if METRICS_JSON else None,
+            ))
+        completed_run = True
+    finally:
+        journal.close(completed=completed_run)
+        close_all(validators, negative_cache, storage)
+        stats_queue.put(('done' if completed_run else 'error', shard, downloader.snapshot(pending_total, final=True)))
+
+def download_sharded(shards):
+    """Coordenador do modo --shards: inicia os processos e soma as estatísticas"""
+    print("=== Download de Tiles OSM - Modo Shards ===")
+    print(f"Zoom levels: {MIN_ZOOM}-{MAX_ZOOM}")
+    print(f"Destino: {TILES_DIR}")
+    print(f"Processos: {shards} (divisão por prefixo de quadkey)")
+    print(f"Servidores: {', '.join(host_of(s) for s in TILE_SERVERS)}")
+    print(f"Taxa máxima global: ~{1/RATE_LIMIT_DELAY:.0f} req/s ({1/RATE_LIMIT_DELAY/shards:.0f} por shard)")
+    print()
+    
+    response = input("Deseja continuar? (s/N): ")
+    if response.lower() != 's':
+        print("Download cancelado.")
+        return
+    
+    stats_queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_shard, args=(shard, shards, stats_queue), name=f'shard-{shard}')
+        for shard in range(shards)
+    ]
+    for proc in processes:
+        proc.start()
+    
+    start_time = time.time()
+    snapshots = {}
+    finished = {}
+    while len(finished) < shards:
+        try:
+            kind, shard, snap = stats_queue.get(timeout=SHARD_STATS_INTERVAL)
+        except queue.Empty:
+            if not any(proc.is_alive() for proc in processes):
+                break  # algum shard morreu sem reportar
+            continue
+        snapshots[shard] = snap
+        if kind != 'progress':
+            finished[shard] = kind
+        
+        total = sum(s['total'] for s in snapshots.values())
+        completed = sum(s['completed'] for s in snapshots.values())
+        elapsed = time.time() - start_time
+        rate = completed / elapsed if elapsed > 0 else 0
+        percent = completed / total * 100 if total else 100.0
+        print(f"\r[{len(finished)}/{shards} shards] {percent:.1f}% | {completed:,}/{total:,} | "
+              f"⚡ {rate:.1f} tiles/s | "
+              f"🚦 {sum(s['rate'] for s in snapshots.values()):.0f} req/s | "
+              f"✓ {sum(s['downloaded'] for s in snapshots.values()):,} | "
+              f"⊙ {sum(s['not_found'] for s in snapshots.values()):,} | "
+              f"✗ {sum(s['failed'] for s in snapshots.values()):,}", end='', flush=True)
+    
+    for proc in processes:
+        proc.join()
+    print()
+    
+    elapsed = time.time() - start_time
+    totals = {key: sum(s.get(key, 0) for s in snapshots.values())
+              for key in ('total', 'downloaded', 'skipped', 'not_found', 'failed', 'dedup_hits', 'dedup_bytes')}
+    error_counts = {}
+    failed_tiles = []
+    for snap in snapshots.values():
+        for error_type, count in snap.get('error_counts', {}).items():
+            error_counts[error_type] = error_counts.get(error_type, 0) + count
+        failed_tiles.extend(snap.get('failed_tiles', []))
+    
+    crashed = [shard for shard in range(shards) if finished.get(shard) != 'done']
+    print(f"\n{'='*60}")
+    print("✅ Download Completo!" if not crashed else f"⚠️  Shards sem concluir: {crashed} (retomam pelo journal)")
+    print(f"{'='*60}")
+    print(f"⏱️  Tempo total: {TileDownloader.format_time(elapsed)}")
+    print(f"⚡ Taxa média: {(totals['downloaded'] + totals['skipped']) / elapsed if elapsed > 0 else 0:.1f} tiles/s")
+    print(f"")
+    print(f"📊 Estatísticas ({shards} shards):")
+    print(f"   ✓ Tiles baixados:       {totals['downloaded']:,}")
+    print(f"   ⊙ Tiles não existem:    {totals['not_found']:,} (404 - água/áreas vazias)")
+    print(f"   ⊗ Tiles pulados:        {totals['skipped']:,}")
+    print(f"   ✗ Tiles com falha real: {totals['failed']:,}")
+    if totals['dedup_hits'] > 0:
+        print(f"♻️  Tiles deduplicados: {totals['dedup_hits']:,} ({totals['dedup_bytes'] / (1024**2):.1f} MB não gravados)")
+    
+    if failed_tiles:
+        failed_file = LOGS_DIR / f'failed_tiles_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+        with open(failed_file, 'w') as f:
+            json.dump({
+                'total_failed': totals['failed'],
+                'error_counts': error_counts,
+                'failed_tiles': [{'z': z, 'x': x, 'y': y, 'error': err} for z, x, y, err in failed_tiles[:1000]],
+            }, f, indent=2)
+        print(f"\n📄 Lista de tiles falhados salva em: {failed_file}")
+    
+    for shard in sorted(snapshots):
+        print(f"\n🧩 Shard {shard}:")
+        for line in snapshots[shard].get('limiter', [])[:1] + snapshots[shard].get('mirrors', []):
+            print(f"   {line}")
+    print(f"\n{'='*60}")
 
 def main():
+    if USE_HTTP2 and not http2_available():
+        print("❌ --http2 requer httpx com suporte a HTTP/2: pip install 'httpx[http2]'")
+        sys.exit(1)
+    if LOCAL_SOURCE:
+        try:
+            open_source(LOCAL_SOURCE, processes=RENDER_PROCESSES)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    if REPAIR_MODE:
+        repair_tiles()
+        return
+    shards = int(arg_value('shards', 1))
+    if shards > 1 and not REFRESH_MODE:
+        if USE_MBTILES:
+            print("❌ --shards grava com um processo por shard: use o storage em diretório (sem --mbtiles)")
+            sys.exit(1)
+        download_sharded(shards)
+        return
+    if REFRESH_MODE:
+        if LOCAL_SOURCE:
+            print("❌ --refresh revalida contra o servidor (ETag/Last-Modified): não se aplica a --source")
+            sys.exit(1)
+        refresh_tiles()
+        return
+    
     print("=== Download de Tiles OSM - Máxima Eficiência ===")
     print(f"Zoom levels: {MIN_ZOOM}-{MAX_ZOOM}")
-    print(f"Destino: {TILES_DIR}")
+    print(f"Destino: {MBTILES_FILE if USE_MBTILES else TILES_DIR}")
     print(f"Downloads paralelos: {MAX_CONCURRENT_DOWNLOADS}")
-    print(f"Servidores: {len(TILE_SERVERS)} (load balancing)")
-    print(f"Taxa máxima: ~{1/RATE_LIMIT_DELAY:.0f} req/s")
+    if LOCAL_SOURCE:
+        print(f"Fonte local: {LOCAL_SOURCE} (sem rede)")
+    else:
+        print(f"Servidores: {len(TILE_SERVERS)} (load balancing)")
+        print(f"Taxa máxima: ~{1/RATE_LIMIT_DELAY:.0f} req/s")
     print()
     
-    # Coletar todos os tiles necessários
+    # Planejamento preguiçoso: a lista de tiles nunca é materializada,
+    # só contada aqui e percorrida de novo pelo pipeline de download
     print("Calculando tiles necessários...")
-    all_tiles = []
+    landmask = LandMask() if USE_LANDMASK else None
+    rect_total = 0
     for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
-        bounds = get_bounds_for_zoom(zoom)
-        nw_tile = deg2num(bounds['north'], bounds['west'], zoom)
-        se_tile = deg2num(bounds['south'], bounds['east'], zoom)
-        
-        x_range = range(min(nw_tile[0], se_tile[0]), max(nw_tile[0], se_tile[0]) + 1)
-        y_range = range(min(nw_tile[1], se_tile[1]), max(nw_tile[1], se_tile[1]) + 1)
-        
-        for x in x_range:
-            for y in y_range:
-                all_tiles.append((zoom, x, y))
+        rect_total += count_bbox_tiles(get_bounds_for_zoom(zoom, MIN_ZOOM), zoom)
         
         # Informar bounds usados
         if zoom == MIN_ZOOM:
             print(f"  Zoom {zoom}: bounds amplos (inclui oceanos para visão continental)")
         elif zoom == MIN_ZOOM + 1:
-            print(f"  Zoom {zoom}+: bounds restritos (foco em massa terrestre)")
+            if landmask is not None:
+                print(f"  Zoom {zoom}+: bounds restritos + máscara de terra")
+            else:
+                print(f"  Zoom {zoom}+: bounds restritos (foco em massa terrestre)")
     
-    print(f"Total de tiles: {len(all_tiles)}")
-    
-    # Verificar tiles já existentes
+    # Verificar tiles já existentes (uma varredura por diretório, zooms em paralelo)
     print("Verificando tiles já baixados...")
-    existing_tiles = count_existing_tiles(all_tiles)
-    tiles_to_download = [t for t in all_tiles if not (TILES_DIR / str(t[0]) / str(t[1]) / f"{t[2]}.png").exists()]
+    storage = open_storage(TILES_DIR, MBTILES_FILE if USE_MBTILES else None)
+    storage.scan(range(MIN_ZOOM, MAX_ZOOM + 1))
+    
+    # 404s recentes (cache negativo compartilhado com download-tiles-essential.py)
+    negative_cache = open_negative_cache()
+    active_cache = negative_cache if USE_NEGATIVE_CACHE else None
     
+    # Execução anterior interrompida? Reconstruir o estado a partir do journal
+    resume = replay(PROGRESS_FILE)
+    if resume:
+        print(f"Retomando execução interrompida ({PROGRESS_FILE.name}): "
+              f"{len(resume.done):,} concluídos, {len(resume.not_found):,} 404, "
+              f"{len(resume.failed):,} falhas (serão tentadas de novo)")
+        # Os concluídos já estão na varredura acima; só os 404 vão para o cache negativo
+        if negative_cache is not None:
+            for tile in resume.not_found:
+                negative_cache.add(*tile)
+            negative_cache.flush()
+    
+    planned_total = 0
+    existing_tiles = 0
+    known_404 = 0
+    pending_total = 0
+    tiers = {}
+    for tile in iter_planned_tiles(landmask, tiers):
+        planned_total += 1
+        if tile in storage:
+            existing_tiles += 1
+        elif active_cache is not None and active_cache.known(*tile):
+            known_404 += 1
+        else:
+            pending_total += 1
+    
+    print(f"Total de tiles: {planned_total}")
+    if landmask is not None and rect_total > planned_total:
+        skipped = rect_total - planned_total
+        print(f"Tiles de oceano descartados pela máscara: {skipped:,} (-{skipped / rect_total * 100:.1f}%)")
+    if tiers:
+        print(f"Ordem: z{MIN_ZOOM}-{PRIORITY_FULL_ZOOM} inteiros ({tiers.get('full', 0):,}) → "
+              f"Amazônia/localidades ({tiers.get('priority', 0):,}) → resto ({tiers.get('rest', 0):,}), "
+              f"curva de Hilbert em cada zoom")
     print(f"Tiles já existentes: {existing_tiles}")
-    print(f"Tiles a baixar: {len(tiles_to_download)}")
+    if active_cache is not None:
+        print(f"Tiles 404 em cache (pulados): {known_404}")
+    print(f"Tiles a baixar: {pending_total}")
     print()
     print("AVISO: Este processo pode demorar várias horas e baixar vários GB de dados.")
     print("Certifique-se de ter espaço em disco suficiente e uma conexão estável.")
     print("Os tiles já baixados serão preservados.")
     print()
     
-    if len(tiles_to_download) == 0:
+    if pending_total == 0:
         print("Todos os tiles já foram baixados!")
+        close_all(negative_cache, storage)
         return
     
     response = input("Deseja continuar? (s/N): ")
     if response.lower() != 's':
         print("Download cancelado.")
+        close_all(negative_cache, storage)
         return
     
     # Iniciar download assíncrono ULTRA-AGRESSIVO
-    downloader = TileDownloader()
+    # ETag/Last-Modified de cada tile novo, para um --refresh futuro
+    validators = open_validators()
+    downloader = TileDownloader(negative_cache=negative_cache, storage=storage, validators=validators)
     downloader.start_time = time.time()
     start_time = downloader.start_time
     
-    print(f"\n🚀 Iniciando download otimizado de {len(tiles_to_download):,} tiles...")
-    print(f"⚡ {MAX_CONCURRENT_DOWNLOADS} conexões simultâneas (async/await)")
-    print(f"🎯 {len(TILE_SERVERS)} servidores em rotação")
+    print(f"\n🚀 Iniciando download otimizado de {pending_total:,} tiles...")
+    print(f"⚡ {MAX_CONCURRENT_DOWNLOADS} workers simultâneos (fila limitada, async/await)")
+    if LOCAL_SOURCE:
+        print(f"🖨️  Fonte local: {LOCAL_SOURCE} ({RENDER_PROCESSES} processos de render)")
+    else:
+        print(f"🔌 Transporte: {'HTTP/2 multiplexado (2 conexões por servidor)' if USE_HTTP2 else 'HTTP/1.1'}")
+        print(f"🎯 {len(TILE_SERVERS)} servidores em rotação")
     print(f"🔄 {RETRY_ATTEMPTS} tentativas por tile com backoff exponencial")
     print(f"⏱️  Timeout: {TIMEOUT}s por requisição")
-    print(f"📝 Logs salvos em: {LOGS_DIR}\n")
+    print(f"📝 Logs salvos em: {LOGS_DIR}")
+    if METRICS_PORT:
+        print(f"📈 Métricas: http://127.0.0.1:{METRICS_PORT}/metrics")
+    if METRICS_JSON:
+        print(f"📈 Snapshots de métricas a cada {METRICS_JSON_EVERY:g}s em {LOGS_DIR}/metrics_*.jsonl")
+    print()
     
-    # Executar download assíncrono
-    asyncio.run(download_all_tiles(tiles_to_download, downloader))
+    # Executar download assíncrono (journal permite retomar após crash/Ctrl+C)
+    journal = DownloadJournal(PROGRESS_FILE, before_flush=storage.flush)
+    completed_run = False
+    try:
+        tiles_to_download = iter_pending_tiles(iter_planned_tiles(landmask), storage, active_cache)
+        asyncio.run(download_all_tiles(tiles_to_download, pending_total, downloader, journal))
+        completed_run = True
+    finally:
+        journal.close(completed=completed_run)
+        close_all(validators, negative_cache, storage)
     
     elapsed = time.time() - start_time
     avg_rate = (downloader.downloaded_count + downloader.skipped_count) / elapsed if elapsed > 0 else 0
@@ -413,6 +1023,7 @@ def main():
     print(f"   ✓ Tiles baixados:       {downloader.downloaded_count:,}")
     print(f"   ⊘ Tiles já existentes:  {existing_tiles:,}")
     print(f"   ⊙ Tiles não existem:    {downloader.not_found_count:,} (404 - água/áreas vazias)")
+    print(f"   ⊙ 404 em cache:         {known_404:,} (não pedidos de novo)")
     print(f"   ⊗ Tiles pulados:        {downloader.skipped_count:,}")
     print(f"   ✗ Tiles com falha real: {downloader.failed_count:,}")
     print(f"   ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -421,10 +1032,14 @@ def main():
     print(f"")
     
     try:
-        total_size = sum(f.stat().st_size for f in TILES_DIR.rglob('*.png'))
+        total_size = storage.total_size()
         print(f"💾 Tamanho total: {total_size / (1024**3):.2f} GB")
+        if storage.dedup_hits > 0:
+            print(f"♻️  Tiles deduplicados: {storage.dedup_hits:,} ({storage.dedup_bytes / (1024**2):.1f} MB não gravados)")
         if downloader.downloaded_count > 0:
-            avg_size = (total_size - existing_tiles * 20000) / downloader.downloaded_count
+            # Só o que esta execução gravou: o total do índice pode não incluir
+            # tiles antigos ainda não reconciliados
+            avg_size = downloader.downloaded_bytes / downloader.downloaded_count
             print(f"📏 Tamanho médio por tile: {avg_size / 1024:.1f} KB")
     except Exception as e:
         print(f"⚠️  Não foi possível calcular tamanho total")
@@ -444,6 +1059,16 @@ def main():
         for error_type, count in sorted(downloader.error_counts.items(), key=lambda x: x[1], reverse=True):
             print(f"   {error_type}: {count:,}")
     
+    print(f"\n🚦 Taxas finais do rate limiter (AIMD):")
+    for line in downloader.limiter.summary():
+        print(f"   {line}")
+        downloader.logger.info(f"Rate limiter: {line}")
+    
+    print(f"\n🌐 Espelhos:")
+    for line in downloader.mirrors.summary():
+        print(f"   {line}")
+        downloader.logger.info(f"Espelho: {line}")
+    
     downloader.logger.info(f"Download concluído: {downloader.downloaded_count} tiles baixados, {downloader.failed_count} falhas")
     print(f"\n{'='*60}")
 
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Recalcular as coordenadas Fermat de todos os artistas fora do WordPress
+
+Uso:
+  python3 fermat-coords.py EXPORT.tsv [--centroids=centroides.json]
+                           [--csv=SAIDA.csv] [--sql=SAIDA.sql] [--table-prefix=wp_2_]
+                           [--min-separation-m=M]
+
+Mesmo resultado de 05-fermat-coords.php (agrupamento por localidade, ângulo
+dourado, raio sqrt, correção por cos(lat)), mas com todas as espirais numa
+passada NumPy (tilelib/fermat.py) em vez de um update_post_meta por post.
+
+EXPORT.tsv vem do banco (saída de `wp db query`, separada por tab, com cabeçalho):
+
+  wp db query --url=.../cultura/ "
+    SELECT p.ID AS post_id, en.element_id AS en_id,
+           MAX(CASE WHEN pm.meta_key='cidade' THEN pm.meta_value END) AS cidade,
+           MAX(CASE WHEN pm.meta_key='estado' THEN pm.meta_value END) AS estado,
+           MAX(CASE WHEN pm.meta_key='coordenada' THEN pm.meta_value END) AS coordenada
+      FROM wp_2_posts p
+      JOIN wp_2_icl_translations t ON t.element_id = p.ID
+           AND t.element_type = 'post_artistas' AND t.language_code = 'pt-br'
+      LEFT JOIN wp_2_icl_translations en ON en.trid = t.trid AND en.language_code = 'en'
+      LEFT JOIN wp_2_postmeta pm ON pm.post_id = p.ID
+           AND pm.meta_key IN ('cidade', 'estado', 'coordenada')
+     WHERE p.post_type = 'artistas' AND p.post_status = 'publish'
+     GROUP BY p.ID, en.element_id" > export.tsv
+
+Pontos de localidades diferentes a menos de --min-separation-m (padrão 500 m,
+0 desliga) são detectados por um grid hash e as espirais culpadas são giradas
+ou encolhidas até se separarem; o relatório lista os ajustes e o que sobrar
+(ex.: dois centroides idênticos no centroides.json).
+
+Também aceita CSV, e um export só de contagens (colunas locality,count), que
+gera apenas o CSV de pontos.
+
+Saídas (padrão: ao lado do export):
+- CSV: post_id, en_id, locality, index, coord_original, coordenada (backup/revisão)
+- SQL: DELETE + INSERT da meta 'coordenada' em lotes, PT e par EN, numa transação.
+  Aplicar com `wp db query < export.fermat.sql` e depois `wp cache flush`.
+"""
+
+import csv
+import sys
+import time
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from tilelib.fermat import (MIN_SEPARATION_M, format_coord, load_centroids, locality_key,
+                            plan_coordinates, separate_spirals, fermat_spirals)
+
+CENTROIDS_FILE = Path(__file__).parent / 'centroides.json'
+SQL_BATCH = 500  # posts por DELETE/INSERT
+
+
+def arg_value(name, default=None):
+    """Valor de uma opção --nome=valor em sys.argv"""
+    prefix = f'--{name}='
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+
+def read_export(path):
+    """Linhas do export como dicts (TSV do `wp db query` ou CSV)"""
+    with open(path, encoding='utf-8', newline='') as f:
+        header = f.readline()
+        f.seek(0)
+        reader = csv.DictReader(f, delimiter='\t' if '\t' in header else ',')
+        rows = []
+        for row in reader:
+            # `wp db query` escreve NULL literal nas colunas vazias
+            rows.append({k.strip().lower(): ('' if v in (None, 'NULL') else v.strip()) for k, v in row.items()})
+    return rows
+
+
+def row_key(row):
+    """Chave do centroides.json: coluna locality pronta, ou cidade/estado"""
+    if 'locality' in row:
+        return unicodedata.normalize('NFC', row['locality']) or None
+    return locality_key(row.get('cidade'), row.get('estado'))
+
+
+def write_sql(path, plan, en_ids, table_prefix, source):
+    """DELETE + INSERT em lotes: cobre posts sem a meta (update_post_meta também cria)"""
+    table = f'{table_prefix}postmeta'
+    rows = []
+    for post_id, lat, lon in zip(plan['post_id'].tolist(), plan['lat'].tolist(), plan['lon'].tolist()):
+        coord = format_coord(lat, lon)
+        rows.append((post_id, coord))
+        en_id = en_ids.get(post_id)
+        if en_id and en_id != post_id:
+            rows.append((en_id, coord))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"-- fermat-coords.py {datetime.now().isoformat(timespec='seconds')} — {source}\n")
+        f.write(f"-- {len(rows)} metas 'coordenada' ({len(plan['post_id'])} posts PT + pares EN)\n")
+        f.write("START TRANSACTION;\n")
+        for start in range(0, len(rows), SQL_BATCH):
+            batch = rows[start:start + SQL_BATCH]
+            ids = ','.join(str(post_id) for post_id, _ in batch)
+            values = ','.join(f"({post_id},'coordenada','{coord}')" for post_id, coord in batch)
+            f.write(f"DELETE FROM {table} WHERE meta_key = 'coordenada' AND post_id IN ({ids});\n")
+            f.write(f"INSERT INTO {table} (post_id, meta_key, meta_value) VALUES {values};\n")
+        f.write("COMMIT;\n")
+    return len(rows)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    export = Path(args[0])
+    centroids_file = Path(arg_value('centroids', CENTROIDS_FILE))
+    csv_file = Path(arg_value('csv', export.with_suffix('.fermat.csv')))
+    sql_file = Path(arg_value('sql', export.with_suffix('.fermat.sql')))
+    table_prefix = arg_value('table-prefix', 'wp_2_')
+    min_separation = float(arg_value('min-separation-m', MIN_SEPARATION_M))
+
+    centroids = load_centroids(centroids_file)
+    rows = read_export(export)
+    print("=== Coordenadas Fermat por localidade ===")
+    print(f"Export: {export} ({len(rows):,} linhas) | Centroides: {len(centroids):,}")
+
+    if rows and 'count' in rows[0]:
+        # Só contagens: pontos de cada localidade, sem posts para atualizar
+        keys = [row_key(row) for row in rows]
+        known = [(key, int(row['count'])) for key, row in zip(keys, rows) if key in centroids]
+        missing = {key: int(row['count']) for key, row in zip(keys, rows) if key and key not in centroids}
+        start = time.perf_counter()
+        centers = np.array([centroids[key] for key, _ in known], dtype=np.float64).reshape(-1, 3)
+        counts = [count for _, count in known]
+        adjusted, overlaps = {}, []
+        if min_separation:
+            lat, lon, group, index, phase, scale, (i, j, dist) = separate_spirals(
+                centers[:, 0], centers[:, 1], counts, centers[:, 2], min_separation)
+            adjusted = {known[g][0]: (phase[g], scale[g]) for g in np.flatnonzero((phase != 0) | (scale != 1))}
+            overlaps = [(f'{known[group[a]][0]} #{index[a]}', f'{known[group[b]][0]} #{index[b]}', d)
+                        for a, b, d in zip(i.tolist(), j.tolist(), dist.tolist())]
+        else:
+            lat, lon, group, index = fermat_spirals(centers[:, 0], centers[:, 1], counts, centers[:, 2])
+        elapsed = time.perf_counter() - start
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['locality', 'index', 'coordenada'])
+            for g, i, la, lo in zip(group.tolist(), index.tolist(), lat.tolist(), lon.tolist()):
+                writer.writerow([known[g][0], i, format_coord(la, lo)])
+        print(f"⚡ {lat.size:,} pontos em {len(known):,} localidades em {elapsed * 1000:.1f} ms")
+        print(f"📄 CSV: {csv_file}")
+    else:
+        post_ids, keys = [], []
+        en_ids, original = {}, {}
+        no_loc = 0
+        for row in rows:
+            key = row_key(row)
+            if key is None:
+                no_loc += 1
+                continue
+            post_id = int(row['post_id'])
+            post_ids.append(post_id)
+            keys.append(key)
+            if row.get('en_id'):
+                en_ids[post_id] = int(row['en_id'])
+            original[post_id] = row.get('coordenada', '')
+
+        start = time.perf_counter()
+        plan, missing = plan_coordinates(post_ids, keys, centroids, min_separation_m=min_separation)
+        elapsed = time.perf_counter() - start
+        adjusted = plan.get('adjusted', {})
+        overlaps = plan.get('overlaps', [])
+
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['post_id', 'en_id', 'locality', 'index', 'coord_original', 'coordenada'])
+            for post_id, key, i, lat, lon in zip(plan['post_id'].tolist(), plan['key'].tolist(),
+                                                 plan['index'].tolist(), plan['lat'].tolist(), plan['lon'].tolist()):
+                writer.writerow([post_id, en_ids.get(post_id, ''), key, i, original.get(post_id, ''),
+                                 format_coord(lat, lon)])
+        metas = write_sql(sql_file, plan, en_ids, table_prefix, export.name)
+
+        localities = len(set(plan['key'].tolist()))
+        changed = sum(1 for post_id, lat, lon in zip(plan['post_id'].tolist(), plan['lat'].tolist(), plan['lon'].tolist())
+                      if original.get(post_id) != format_coord(lat, lon))
+        print(f"⚡ {len(plan['post_id']):,} posts em {localities:,} localidades em {elapsed * 1000:.1f} ms")
+        print(f"   ↻ Coordenadas que mudam: {changed:,}")
+        print(f"   ∅ Sem cidade/estado:     {no_loc:,}")
+        print(f"📄 CSV (backup + revisão): {csv_file}")
+        print(f"🗄️  SQL ({metas:,} metas, PT + EN): {sql_file}")
+        print(f"   Aplicar: wp db query < {sql_file.name} && wp cache flush")
+
+    if adjusted:
+        print(f"\n🌀 {len(adjusted)} espirais ajustadas para manter {min_separation:g} m entre localidades:")
+        for key, (phase, scale) in sorted(adjusted.items()):
+            print(f"   {key}: giro {phase * 180 / np.pi:.0f}°, raio {scale * 100:.0f}%")
+    if overlaps:
+        print(f"\n⚠️  {len(overlaps)} pares ainda a menos de {min_separation:g} m (centros coincidentes?):")
+        for a, b, dist in overlaps[:20]:
+            print(f"   {a} ↔ {b}: {dist:.0f} m")
+
+    if missing:
+        print(f"\n⚠️  {len(missing)} localidades sem centroide (posts mantêm a coordenada atual):")
+        for key, count in sorted(missing.items(), key=lambda item: -item[1]):
+            print(f"   {key} ({count})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Otimizar o armazenamento de tiles: recompressão PNG em paralelo, sem perda por padrão
+
+Uso:
+  python3 optimize-tiles.py [--quantize[=N]] [--zoom=Z[,Z...]] [--workers=N] [--force]
+
+  --quantize[=N]  tiles com mais de 256 cores viram paleta de N cores (padrão 256, com perda)
+  --zoom=Z,...    só esses zooms
+  --force         ignorar o estado da última passada e reprocessar tudo
+
+Tiles cujo hash não mudou desde a última passada (com as mesmas opções) são
+pulados; o estado fica em tiles/.optimize.sqlite. Cada arquivo regravado tem
+a entrada do índice de dedup (tiles/.dedup.sqlite) trocada para o hash novo, e
+o hash original fica em tiles/.validators.sqlite para o --refresh do
+download-tiles.py reconhecer o tile inalterado no servidor.
+"""
+
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from tilelib.optimize import OPTIMIZE_STATE_FILENAME, OptimizeState, fsync_dirs, optimize_group
+from tilelib.storage import DEDUP_INDEX_FILENAME, TMP_DIRNAME, BlobIndex
+from tilelib.tileindex import TileIndex, INVENTORY_INDEX_FILENAME
+from tilelib.validators import VALIDATORS_FILENAME, ValidatorIndex
+
+TILES_DIR = Path(__file__).parent.parent / 'tiles'
+STATE_FLUSH_EVERY = 5000
+
+
+def arg_value(name, default=None, bare=None):
+    """Valor de --nome=valor; `bare` quando a opção vem sem valor"""
+    for arg in sys.argv[1:]:
+        if arg == f'--{name}':
+            return bare
+        if arg.startswith(f'--{name}='):
+            return arg.split('=', 1)[1]
+    return default
+
+
+QUANTIZE = int(arg_value('quantize', 0, bare=256))
+ZOOMS = [int(z) for z in arg_value('zoom', '').split(',') if z] or None
+WORKERS = int(arg_value('workers', os.cpu_count() or 4))
+FORCE = '--force' in sys.argv
+
+
+def main():
+    if not TILES_DIR.exists():
+        print(f"❌ Diretório de tiles não encontrado: {TILES_DIR}")
+        sys.exit(1)
+
+    profile = f"q{QUANTIZE}"
+    print("=== Otimização de tiles ===")
+    print(f"Destino: {TILES_DIR} | Processos: {WORKERS}")
+    print(f"PNG: {'paleta de %d cores (com perda)' % QUANTIZE if QUANTIZE else 'sem perda'}")
+    print()
+
+    start = time.time()
+    tmp_dir = TILES_DIR / TMP_DIRNAME  # mesmo diretório temporário do storage (limpo na abertura)
+    tmp_dir.mkdir(exist_ok=True)
+    index = TileIndex(TILES_DIR / INVENTORY_INDEX_FILENAME)
+    state = OptimizeState(TILES_DIR / OPTIMIZE_STATE_FILENAME)
+    blobs = BlobIndex(TILES_DIR / DEDUP_INDEX_FILENAME)
+    validators = ValidatorIndex(TILES_DIR / VALIDATORS_FILENAME)
+    per_zoom = defaultdict(lambda: {'inodes': 0, 'optimized': 0, 'skipped': 0, 'errors': 0,
+                                    'before': 0, 'after': 0})
+    try:
+        with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+            print("Atualizando índice de inventário...")
+            index.reconcile(TILES_DIR, map_fn=lambda fn, tasks: pool.map(fn, tasks, chunksize=16))
+            groups = index.inode_groups(ZOOMS)
+            known = {} if FORCE else state.known()
+            print(f"{len(groups):,} arquivos únicos (hardlinks contam uma vez)\n")
+
+            tasks = (
+                ([str(TILES_DIR / str(z) / str(x) / f'{y}.png') for z, x, y in group],
+                 known.get(group[0]), profile, QUANTIZE, str(tmp_dir))
+                for group in groups
+            )
+            pending_state = []
+            pending_hashes = []
+            dirty = []  # tiles regravados com renames ainda sem fsync do diretório
+            done = 0
+            last_update = 0
+            results = pool.map(optimize_group, tasks, chunksize=64)
+            for group, (status, before, after, digest, source) in zip(groups, results):
+                stats = per_zoom[group[0][0]]
+                stats['inodes'] += 1
+                stats['before'] += before
+                stats['after'] += after
+                if status == 'error':
+                    stats['errors'] += 1
+                else:
+                    if status == 'optimized':
+                        stats['optimized'] += 1
+                        # Bytes do disco mudaram: dedup aponta pelo hash novo,
+                        # o original vira o hash "baixado" se ainda não havia um
+                        blobs.rehash(source, digest.rsplit(':', 1)[1], set(group))
+                        pending_hashes.extend((z, x, y, source) for z, x, y in group)
+                        dirty.extend(str(TILES_DIR / str(z) / str(x)) for z, x, y in group)
+                    elif status == 'skipped':
+                        stats['skipped'] += 1
+                    pending_state.extend((z, x, y, digest) for z, x, y in group)
+                if len(pending_state) >= STATE_FLUSH_EVERY:
+                    # Renames duráveis antes de a passada registrá-los
+                    fsync_dirs(dirty)
+                    state.record(pending_state)
+                    validators.backfill_hashes(pending_hashes)
+                    pending_state = []
+                    pending_hashes = []
+                    dirty = []
+
+                done += 1
+                if time.time() - last_update >= 2:
+                    last_update = time.time()
+                    saved = sum(s['before'] - s['after'] for s in per_zoom.values())
+                    print(f"\r  {done:,}/{len(groups):,} ({done / len(groups) * 100:.1f}%) | "
+                          f"♻️  {saved / (1024**2):.1f} MB economizados", end='', flush=True)
+            fsync_dirs(dirty)
+            state.record(pending_state)
+            validators.backfill_hashes(pending_hashes)
+            print()
+    finally:
+        validators.close()
+        blobs.close()
+        state.close()
+        index.close()
+
+    print(f"\n{'='*78}")
+    print("📉 ECONOMIA POR ZOOM (bytes em disco)")
+    print(f"{'='*78}")
+    print(f"{'Zoom':<6} {'Arquivos':>10} {'Otimizados':>11} {'Pulados':>9} {'Antes':>12} {'Depois':>12} {'Economia':>12}")
+    print(f"{'-'*78}")
+    total_before = total_after = 0
+    for z in sorted(per_zoom):
+        s = per_zoom[z]
+        total_before += s['before']
+        total_after += s['after']
+        saved = s['before'] - s['after']
+        print(f"{z:<6} {s['inodes']:>10,} {s['optimized']:>11,} {s['skipped']:>9,} "
+              f"{s['before'] / (1024**2):>9.1f} MB {s['after'] / (1024**2):>9.1f} MB "
+              f"{saved / (1024**2):>6.1f} MB {saved / s['before'] * 100 if s['before'] else 0:>3.0f}%")
+    print(f"{'-'*78}")
+    saved = total_before - total_after
+    print(f"Total: {total_before / (1024**3):.2f} GB → {total_after / (1024**3):.2f} GB "
+          f"({saved / (1024**2):.1f} MB economizados) em {time.time() - start:.1f}s")
+    errors = sum(s['errors'] for s in per_zoom.values())
+    if errors:
+        print(f"⚠️  {errors:,} arquivos não puderam ser lidos/decodificados (rode analyze-tiles.py --crc)")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,42 +4,14 @@ Testar novos bounds sem fazer download - dry run
 Autor: Daniel Cambría + Warp
 """
 
-from math import radians, log, tan, cos
-
-# Bounds configurados
-SOUTH_AMERICA_BOUNDS_WIDE = {
-    'north': 12.5,
-    'south': -56.0,
-    'west': -81.0,
-    'east': -34.0
-}
-
-SOUTH_AMERICA_BOUNDS_LAND = {
-    'north': 12.5,
-    'south': -56.0,
-    'west': -73.0,
-    'east': -35.0
-}
+from tilelib.landmask import LandMask
+from tilelib.region import SOUTH_AMERICA_BOUNDS_WIDE, get_bounds_for_zoom, expected_tiles
+from tilelib.tiling import bbox_tile_range, count_bbox_tiles
 
+# Mesmos zooms de download-tiles.py (bounds em tilelib/region.py)
 MIN_ZOOM = 5
 MAX_ZOOM = 12
 
-def deg2num(lat, lon, zoom):
-    """Converter lat/lon para número de tile"""
-    lat = max(min(lat, 85.0511), -85.0511)
-    n = 2.0 ** zoom
-    xtile = int((lon + 180.0) / 360.0 * n)
-    lat_rad = radians(lat)
-    ytile = int((1.0 - log(tan(lat_rad) + (1.0 / cos(lat_rad))) / 3.14159265359) / 2.0 * n)
-    return (xtile, ytile)
-
-def get_bounds_for_zoom(zoom):
-    """Retorna bounds apropriados para o nível de zoom"""
-    if zoom <= MIN_ZOOM:
-        return SOUTH_AMERICA_BOUNDS_WIDE
-    else:
-        return SOUTH_AMERICA_BOUNDS_LAND
-
 def main():
     print("=" * 70)
     print("🧪 TESTE DE BOUNDS - DRY RUN")
@@ -48,6 +20,8 @@ def main():
     
     total_tiles_old = 0
     total_tiles_new = 0
+    total_tiles_mask = 0
+    landmask = LandMask()
     
     print("📊 Comparação de Tiles por Zoom Level:")
     print("-" * 70)
@@ -56,23 +30,24 @@ def main():
     
     for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
         # Bounds antigos (sempre wide)
-        nw_old = deg2num(SOUTH_AMERICA_BOUNDS_WIDE['north'], SOUTH_AMERICA_BOUNDS_WIDE['west'], zoom)
-        se_old = deg2num(SOUTH_AMERICA_BOUNDS_WIDE['south'], SOUTH_AMERICA_BOUNDS_WIDE['east'], zoom)
-        x_count_old = abs(se_old[0] - nw_old[0]) + 1
-        y_count_old = abs(se_old[1] - nw_old[1]) + 1
-        tiles_old = x_count_old * y_count_old
+        tiles_old = count_bbox_tiles(SOUTH_AMERICA_BOUNDS_WIDE, zoom)
         total_tiles_old += tiles_old
         
         # Bounds novos (dinâmicos)
-        bounds_new = get_bounds_for_zoom(zoom)
+        bounds_new = get_bounds_for_zoom(zoom, MIN_ZOOM)
         bounds_name = "WIDE" if zoom <= MIN_ZOOM else "LAND"
-        nw_new = deg2num(bounds_new['north'], bounds_new['west'], zoom)
-        se_new = deg2num(bounds_new['south'], bounds_new['east'], zoom)
-        x_count_new = abs(se_new[0] - nw_new[0]) + 1
-        y_count_new = abs(se_new[1] - nw_new[1]) + 1
+        x_min, x_max, y_min, y_max = bbox_tile_range(bounds_new, zoom)
+        x_count_new = x_max - x_min + 1
+        y_count_new = y_max - y_min + 1
         tiles_new = x_count_new * y_count_new
         total_tiles_new += tiles_new
         
+        # Máscara de terra (mesma regra de download-tiles.py: só zooms > MIN_ZOOM)
+        tiles_mask = expected_tiles(zoom, MIN_ZOOM, landmask)
+        total_tiles_mask += tiles_mask
+        if zoom == MAX_ZOOM:
+            top_zoom = (tiles_new, tiles_mask)
+        
         reduction = tiles_old - tiles_new
         reduction_pct = (reduction / tiles_old * 100) if tiles_old > 0 else 0
         
@@ -95,6 +70,14 @@ def main():
     print(f"Total tiles (bounds antigos): {total_tiles_old:>20,}")
     print(f"Total tiles (bounds novos):   {total_tiles_new:>20,}")
     print(f"Redução de tentativas:        {total_reduction:>20,} (-{total_reduction_pct:.1f}%)")
+    # A máscara substitui o retângulo LAND: a redução é medida contra ele
+    mask_reduction = total_tiles_new - total_tiles_mask
+    mask_reduction_pct = (mask_reduction / total_tiles_new * 100) if total_tiles_new > 0 else 0
+    print(f"Total tiles (máscara terra):  {total_tiles_mask:>20,}")
+    print(f"Redução com máscara:          {mask_reduction:>20,} (-{mask_reduction_pct:.1f}% vs. bounds novos)")
+    rect_top, mask_top = top_zoom
+    label = f"Máscara em z{MAX_ZOOM}:"
+    print(f"{label:<30}{f'{rect_top:,} → {mask_top:,}':>20} (-{(rect_top - mask_top) / rect_top * 100:.1f}%)")
     print()
     
     # Estimativas baseadas na taxa de 404 observada (62%)
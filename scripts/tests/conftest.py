@@ -0,0 +1,21 @@
+"""
+Testes da tilelib e dos scripts de tiles (pytest, a partir de scripts/).
+
+Os scripts hifenizados não são importáveis como módulo: load_script()
+(tilelib/loader.py, o mesmo do bench-tiles.py) os carrega pelo caminho.
+"""
+
+import sys
+import zlib
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from tilelib.loader import load_script  # noqa: E402,F401
+
+
+def png(seed, size=300):
+    """Bytes com cara de PNG e conteúdo distinto por seed (o storage não decodifica)"""
+    body = (str(seed).encode() * size)[:size]
+    return b'\x89PNG\r\n\x1a\n' + body + zlib.crc32(body).to_bytes(4, 'big')
@@ -0,0 +1,40 @@
+from conftest import load_script, png
+from tilelib.landmask import LandMask
+from tilelib.region import iter_zoom_tiles
+from tilelib.storage import DirectoryStorage
+
+analyze = load_script('analyze-tiles')
+
+
+def test_coverage_counts_only_tiles_in_plan(tmp_path):
+    landmask = LandMask()
+    planned = sorted(iter_zoom_tiles(6, 5, landmask))
+    storage = DirectoryStorage(tmp_path)
+    for x, y in planned[:10]:
+        storage.write(6, x, y, png(x * 100 + y))
+    # Fora do plano: cantos do mundo (Ártico e Antártida), longe do bbox
+    storage.write(6, 0, 0, png(1))
+    storage.write(6, 63, 63, png(2))
+    for x, y in planned:
+        storage.write(6, x, y + 1000, png(3))
+    storage.flush()
+
+    coverage = analyze.plan_coverage(storage.index, landmask, 5, 6)
+    assert coverage[6] == (len(planned), 10)
+    for expected, found in coverage.values():
+        assert found <= expected
+    storage.close()
+
+
+def test_full_download_is_exactly_100_percent(tmp_path):
+    landmask = LandMask()
+    storage = DirectoryStorage(tmp_path)
+    for z in (5, 6):
+        for x, y in iter_zoom_tiles(z, 5, landmask):
+            storage.write(z, x, y, png(z))
+    storage.write(6, 0, 0, png(1))
+    storage.flush()
+
+    coverage = analyze.plan_coverage(storage.index, landmask, 5, 6)
+    assert all(found == expected for expected, found in coverage.values())
+    storage.close()
@@ -0,0 +1,49 @@
+import asyncio
+import socket
+
+import aiohttp
+from aiohttp import web
+
+from conftest import load_script
+from tilelib.pngcheck import PNG_SIGNATURE
+from tilelib.standin import TILE_BYTES, make_app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_standin_serves_tiles_and_404_blocks():
+    async def scenario():
+        runner = web.AppRunner(make_app(not_found=0.5))
+        await runner.setup()
+        port = free_port()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                statuses = {}
+                for x in range(0, 32, 4):
+                    async with session.get(f'http://127.0.0.1:{port}/10/{x}/0.png') as response:
+                        statuses[x] = (response.status, await response.read())
+                async with session.get(f'http://127.0.0.1:{port}/stats') as response:
+                    stats = await response.json()
+        finally:
+            await runner.cleanup()
+        return statuses, stats
+
+    statuses, stats = asyncio.run(scenario())
+    ok = [body for status, body in statuses.values() if status == 200]
+    assert ok and all(body.startswith(PNG_SIGNATURE) and len(body) == TILE_BYTES for body in ok)
+    assert stats['requests'] == 8 and stats['ok'] == len(ok)
+    assert stats['not_found'] == 8 - len(ok) > 0
+
+
+def test_bench_completes_a_short_run():
+    bench = load_script('bench-tiles')
+    tiles = [(10, 340 + i, 500) for i in range(12)]
+    result = bench.bench_one('baseline', 'full', tiles, 100.0, False)
+    assert result['completed'] == len(tiles)
+    assert result['requests'] >= len(tiles) and result['p50_ms'] > 0
+    assert result['server']['ok'] == len(tiles)
@@ -0,0 +1,122 @@
+import json
+
+import numpy as np
+
+from tilelib.clusters import (INDEX_FILENAME, ClusterIndex, load_points, project, tile_size_summary, unproject,
+                              write_cluster_tiles)
+
+
+def sample_points(n=300, seed=3):
+    """Pontos em torno de Belém e Manaus (dois aglomerados bem separados)"""
+    rng = np.random.default_rng(seed)
+    lat = np.concatenate([-1.45 + rng.normal(0, 0.05, n // 2), -3.12 + rng.normal(0, 0.05, n - n // 2)])
+    lon = np.concatenate([-48.5 + rng.normal(0, 0.05, n // 2), -60.02 + rng.normal(0, 0.05, n - n // 2)])
+    return lat, lon
+
+
+def test_project_round_trip():
+    lat, lon = sample_points()
+    back_lat, back_lon = unproject(*project(lat, lon))
+    assert np.allclose(back_lat, lat) and np.allclose(back_lon, lon)
+    x, y = project([90.0, -90.0], [-180.0, 180.0])
+    assert x.tolist() == [0.0, 1.0] and y[0] == 0.0 and y[1] == 1.0
+
+
+def test_load_points_reads_coordenada_or_lat_lon(tmp_path):
+    path = tmp_path / 'export.csv'
+    path.write_text('post_id,en_id,locality,coordenada,lat,lon\n'
+                    '10,,Belém | Pará,"-1.45,-48.5",,\n'
+                    '11,7,,,-3.12,-60.02\n'
+                    '12,,,,,\n', encoding='utf-8')
+    lat, lon, props = load_points(path)
+    assert lat.tolist() == [-1.45, -3.12] and lon.tolist() == [-48.5, -60.02]
+    assert props == [{'post_id': 10, 'locality': 'Belém | Pará'}, {'post_id': 11, 'en_id': 7}]
+
+
+def test_levels_conserve_points():
+    lat, lon = sample_points()
+    index = ClusterIndex(lat, lon, 0, 10)
+    assert index.levels[11].tolist() == list(range(300))
+    for z in range(0, 11):
+        assert index.count[index.levels[z]].sum() == 300
+        # Subir de zoom nunca junta mais entidades
+        assert index.levels[z].size <= index.levels[z + 1].size
+    # Raio de 40 px: ~56° no zoom 0, ~7° no 3 (Belém–Manaus ficam a ~11.5°)
+    assert index.count[index.levels[0]].tolist() == [300]
+    assert index.count[index.levels[3]].tolist() == [150, 150]
+
+
+def test_clusters_open_at_expansion_zoom():
+    lat, lon = sample_points()
+    index = ClusterIndex(lat, lon, 0, 10)
+    for z in range(0, 11):
+        for entity in index.levels[z][index.levels[z] >= index.points].tolist():
+            # Criado no zoom expansion - 1, visível dali para cima até abrir
+            expansion = index.expansion[entity]
+            assert z < expansion
+            assert entity in set(index.levels[expansion - 1].tolist())
+            assert entity not in set(index.levels[expansion].tolist())
+
+
+def test_min_points_keeps_points_apart():
+    lat, lon = sample_points(20)
+    index = ClusterIndex(lat, lon, 0, 4, min_points=50)
+    assert all(index.levels[z].tolist() == list(range(20)) for z in range(0, 6))
+
+
+def test_tiles_partition_each_level():
+    lat, lon = sample_points()
+    index = ClusterIndex(lat, lon, 0, 8)
+    for z in (0, 4, 9):
+        tiles = index.tiles(z)
+        ids = np.concatenate(list(tiles.values()))
+        assert sorted(ids.tolist()) == sorted(index.levels[z].tolist())
+        n = 2 ** z
+        for (x, y), group in tiles.items():
+            assert ((index.x[group] * n).astype(int) == x).all()
+            assert ((index.y[group] * n).astype(int) == y).all()
+
+
+def test_feature_properties():
+    lat, lon = sample_points()
+    props = [{'post_id': i} for i in range(300)]
+    index = ClusterIndex(lat, lon, 0, 6)
+    point = index.feature(5, props)
+    assert point['properties'] == {'post_id': 5}
+    assert np.allclose(point['geometry']['coordinates'], [lon[5], lat[5]], atol=1e-7)
+
+    cluster = int(index.levels[3][0])
+    properties = index.feature(cluster, props)['properties']
+    assert properties['cluster'] is True and properties['cluster_id'] == cluster
+    assert properties['point_count'] == 150
+    assert properties['expansion_zoom'] == index.expansion[cluster]
+
+
+def test_write_cluster_tiles_removes_stale_tiles(tmp_path):
+    out = tmp_path / 'clusters'
+    lat, lon = sample_points()
+    stats, stale = write_cluster_tiles(ClusterIndex(lat, lon, 0, 6), out, meta={'source': 'a.csv'})
+    assert stale == 0
+    assert stats[0] == {'entities': 1, 'clusters': 1, 'tiles': 1,
+                        'bytes': (out / '0/0/0.json').stat().st_size,
+                        'max_bytes': (out / '0/0/0.json').stat().st_size}
+    meta = json.loads((out / INDEX_FILENAME).read_text(encoding='utf-8'))
+    assert meta['source'] == 'a.csv' and meta['points_zoom'] == 7 and meta['points'] == 300
+    assert meta['tiles'] == {str(z): s['tiles'] for z, s in stats.items()}
+    collection = json.loads((out / '0/0/0.json').read_text(encoding='utf-8'))
+    assert sum(f['properties']['point_count'] for f in collection['features']) == 300
+
+    # Sem Manaus: os tiles dele somem, inclusive os diretórios vazios
+    before = set(out.glob('*/*/*.json'))
+    stats, stale = write_cluster_tiles(ClusterIndex(lat[:150], lon[:150], 0, 6), out)
+    after = set(out.glob('*/*/*.json'))
+    assert stale == len(before - after) > 0
+    assert sum(s['tiles'] for s in stats.values()) == len(after)
+    assert all(any(d.iterdir()) for d in out.glob('*/*'))
+    assert not list(out.glob('**/*.tmp'))
+
+
+def test_tile_size_summary():
+    stats = {0: {'tiles': 1, 'bytes': 100, 'max_bytes': 100}, 1: {'tiles': 3, 'bytes': 500, 'max_bytes': 300}}
+    assert tile_size_summary(stats) == (300, 150.0)
+    assert tile_size_summary({}) == (0, 0.0)
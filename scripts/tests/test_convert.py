@@ -0,0 +1,53 @@
+import sqlite3
+
+from conftest import load_script, png
+from tilelib.storage import DirectoryStorage
+
+TILES = [(5, 10, 16), (5, 11, 16), (6, 21, 33), (6, 21, 34)]
+
+
+def convert(monkeypatch, *argv):
+    module = load_script('convert-tiles')
+    monkeypatch.setattr('sys.argv', ['convert-tiles.py', *argv])
+    module.main()
+
+
+def test_directory_mbtiles_directory_round_trip(tmp_path, monkeypatch):
+    source = DirectoryStorage(tmp_path / 'tiles')
+    for i, (z, x, y) in enumerate(TILES):
+        source.write(z, x, y, png(i % 3))  # conteúdo repetido: um blob só no MBTiles
+    source.close()
+
+    mbtiles = tmp_path / 'tiles.mbtiles'
+    convert(monkeypatch, 'to-mbtiles', str(tmp_path / 'tiles'), str(mbtiles))
+    conn = sqlite3.connect(str(mbtiles))
+    rows = set(conn.execute('SELECT zoom_level, tile_column, tile_row FROM tiles'))
+    # TMS: linha 0 no sul
+    assert rows == {(z, x, 2 ** z - 1 - y) for z, x, y in TILES}
+    assert conn.execute('SELECT COUNT(*) FROM images').fetchone()[0] == 3
+    metadata = dict(conn.execute('SELECT name, value FROM metadata'))
+    assert metadata['format'] == 'png' and metadata['version'] == '1.3'
+    assert (metadata['minzoom'], metadata['maxzoom']) == ('5', '6')
+    conn.close()
+
+    convert(monkeypatch, 'to-dir', str(mbtiles), str(tmp_path / 'back'))
+    back = DirectoryStorage(tmp_path / 'back')
+    assert sorted(back.tiles()) == sorted(TILES)
+    for i, (z, x, y) in enumerate(TILES):
+        assert back.read(z, x, y) == png(i % 3)
+    back.close()
+
+
+def test_conversion_is_incremental(tmp_path, monkeypatch, capsys):
+    source = DirectoryStorage(tmp_path / 'tiles')
+    source.write(5, 10, 16, png(1))
+    source.close()
+    mbtiles = tmp_path / 'tiles.mbtiles'
+    convert(monkeypatch, 'to-mbtiles', str(tmp_path / 'tiles'), str(mbtiles))
+
+    source = DirectoryStorage(tmp_path / 'tiles')
+    source.write(5, 11, 16, png(2))
+    source.close()
+    capsys.readouterr()
+    convert(monkeypatch, 'to-mbtiles', str(tmp_path / 'tiles'), str(mbtiles))
+    assert '1 tiles copiados, 1 já existiam' in capsys.readouterr().out
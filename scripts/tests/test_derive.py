@@ -0,0 +1,71 @@
+import io
+
+from PIL import Image
+
+from conftest import load_script
+from tilelib.derive import (TILE_SIZE, WATER_COLOR, build_from_children, crop_from_ancestor,
+                            overzoom_tasks, pyramid_tasks)
+
+RED = (200, 30, 30)
+
+
+def tile_path_in(root):
+    return lambda z, x, y: root / f'{z}-{x}-{y}.png'
+
+
+def save(path, color):
+    Image.new('RGB', (TILE_SIZE, TILE_SIZE), color).save(path)
+
+
+def test_pyramid_needs_every_land_child(tmp_path):
+    tile_path = tile_path_in(tmp_path)
+    land = {(2, 2), (3, 2), (2, 3), (3, 3)}
+    children = {(2, 2), (3, 2), (2, 3)}
+    assert list(pyramid_tasks(5, [(1, 1)], children, tile_path, land)) == []
+
+    children.add((3, 3))
+    (task,) = pyramid_tasks(5, [(1, 1)], children, tile_path, land)
+    assert [q[:2] for q in task[3]] == [(0, 0), (1, 0), (0, 1), (1, 1)]
+
+
+def test_pyramid_paints_only_ocean_children_as_water(tmp_path):
+    tile_path = tile_path_in(tmp_path)
+    land = {(2, 2), (3, 2)}  # metade de baixo é oceano para a máscara
+    children = {(2, 2), (3, 2)}
+    for x, y in children:
+        save(tile_path(6, x, y), RED)
+    (task,) = pyramid_tasks(5, [(1, 1)], children, tile_path, land)
+
+    z, x, y, data, error = build_from_children(task)
+    assert error is None and (z, x, y) == (5, 1, 1)
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    assert image.getpixel((128, 10)) == RED
+    assert image.getpixel((128, 245)) == WATER_COLOR
+
+
+def test_overzoom_crops_the_matching_quadrant(tmp_path):
+    tile_path = tile_path_in(tmp_path)
+    ancestor = Image.new('RGB', (TILE_SIZE, TILE_SIZE), WATER_COLOR)
+    ancestor.paste(RED, (128, 128, 256, 256))
+    ancestor.save(tile_path(5, 1, 1))
+
+    (task,) = overzoom_tasks(6, [(3, 3)], {5: {(1, 1)}, 4: set()}, tile_path)
+    assert task[3] == 5
+    _, _, _, data, error = crop_from_ancestor(task)
+    assert error is None
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    assert image.getpixel((128, 128)) == RED
+
+
+def test_dry_run_opens_no_side_index(tmp_path, monkeypatch, capsys):
+    module = load_script('derive-tiles', ['--dry-run'])
+    for name, value in (('TILES_DIR', tmp_path), ('MIN_ZOOM', 5), ('MAX_ZOOM', 6), ('WORKERS', 1)):
+        monkeypatch.setattr(module, name, value)
+    x, y = next(iter(module.iter_zoom_tiles(6, 5, module.LandMask())))
+    (tmp_path / '5' / str(x // 2)).mkdir(parents=True)
+    save(tmp_path / '5' / str(x // 2) / f'{y // 2}.png', RED)
+    before = sorted(tmp_path.rglob('*'))
+
+    module.main()
+    assert ' 0 por overzoom' not in capsys.readouterr().out
+    assert sorted(tmp_path.rglob('*')) == before
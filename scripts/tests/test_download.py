@@ -0,0 +1,123 @@
+import asyncio
+
+from conftest import load_script, png
+from tilelib.httpclient import TileResponse
+from tilelib.storage import DirectoryStorage, content_hash
+from tilelib.validators import VALIDATORS_FILENAME, ValidatorIndex
+
+
+def test_import_does_not_touch_the_tiles_tree():
+    for name in ('download-tiles', 'download-tiles-essential'):
+        module = load_script(name)
+        if not module.TILES_DIR.exists():
+            assert not module.LOGS_DIR.exists()
+
+
+def test_downloader_creates_its_own_logs_dir(tmp_path):
+    module = load_script('download-tiles')
+    module.LOGS_DIR = tmp_path / 'logs'
+    downloader = module.TileDownloader(storage=module.DirectoryStorage(tmp_path / 'tiles'))
+    assert list(module.LOGS_DIR.glob('download_*.log'))
+    downloader.storage.close()
+
+
+def test_local_source_skips_remote_caches():
+    module = load_script('download-tiles', ['--source=mbtiles:/nao/existe.mbtiles'])
+    assert module.LOCAL_SOURCE
+    assert module.open_negative_cache() is None
+    assert module.open_validators() is None
+
+
+class StaticClient:
+    """Servidor sem ETag/Last-Modified que sempre entrega o mesmo corpo"""
+
+    def __init__(self, content):
+        self.content = content
+        self.requests = []
+
+    async def get(self, url, headers=None):
+        self.requests.append((url, headers))
+        return TileResponse(200, {}, self.content)
+
+
+def refresh_one(downloader, client, tile):
+    return asyncio.run(downloader.download_tile_with_retry(client, *tile, refresh=True))
+
+
+def test_refresh_compares_with_downloaded_hash_not_disk(tmp_path):
+    module = load_script('download-tiles')
+    module.LOGS_DIR = tmp_path / 'logs'
+    served = png(1, size=2000)
+    storage = DirectoryStorage(tmp_path / 'tiles')
+    validators = ValidatorIndex(tmp_path / VALIDATORS_FILENAME)
+    downloader = module.TileDownloader(storage=storage, validators=validators)
+
+    storage.write(8, 1, 1, png(2))  # cópia local recomprimida pelo optimize-tiles.py
+    validators.backfill_hashes([(8, 1, 1, content_hash(served))])
+    assert refresh_one(downloader, StaticClient(served), (8, 1, 1)) == (True, 'not_modified')
+    assert storage.read(8, 1, 1) == png(2)
+
+    # Tile derivado: o hash gravado não vale, a cópia local é substituída
+    downloader.derived = {(8, 1, 1)}
+    client = StaticClient(served)
+    assert refresh_one(downloader, client, (8, 1, 1)) == (True, 'updated')
+    assert storage.read(8, 1, 1) == served
+    assert client.requests[0][1] is None  # sem GET condicional
+    validators.close()
+    storage.close()
+
+
+class FailingClient:
+    async def get(self, url, headers=None):
+        raise asyncio.TimeoutError()
+
+
+def test_failure_type_falls_back_to_unknown(tmp_path, monkeypatch):
+    module = load_script('download-tiles')
+    module.LOGS_DIR = tmp_path / 'logs'
+    monkeypatch.setattr(module, 'RETRY_DELAY_BASE', 0)
+    storage = DirectoryStorage(tmp_path / 'tiles')
+    downloader = module.TileDownloader(storage=storage)
+    assert asyncio.run(downloader.download_tile_with_retry(FailingClient(), 8, 1, 1)) == (False, 'timeout')
+    # Sem nenhuma tentativa não há erro nem status para relatar
+    monkeypatch.setattr(module, 'RETRY_ATTEMPTS', 0)
+    assert asyncio.run(downloader.download_tile_with_retry(FailingClient(), 8, 1, 2)) == (False, 'unknown')
+    storage.close()
+
+
+class StaticSession:
+    """open_client() falso: toda requisição recebe o mesmo tile"""
+
+    def __init__(self, content):
+        self.client = StaticClient(content)
+
+    async def __aenter__(self):
+        return self.client
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_report_averages_only_tiles_written_by_this_run(tmp_path, monkeypatch, capsys):
+    module = load_script('download-tiles')
+    tiles = tmp_path / 'tiles'
+    for name, value in (('TILES_DIR', tiles), ('LOGS_DIR', tiles / 'logs'),
+                        ('PROGRESS_FILE', tiles / '.progress.jsonl'),
+                        ('NEGATIVE_CACHE_FILE', tiles / '.notfound.sqlite'),
+                        ('VALIDATORS_FILE', tiles / VALIDATORS_FILENAME),
+                        ('MIN_ZOOM', 5), ('MAX_ZOOM', 5), ('USE_LANDMASK', False)):
+        monkeypatch.setattr(module, name, value)
+    served = png(1, size=5 * 1024)
+    monkeypatch.setattr(module, 'open_client', lambda **kwargs: StaticSession(served))
+    monkeypatch.setattr('builtins.input', lambda prompt: 's')
+
+    # Árvore antiga gravada fora do storage (sem índice de inventário)
+    old = sorted(module.iter_planned_tiles())[:3]
+    for z, x, y in old:
+        (tiles / f'{z}/{x}').mkdir(parents=True, exist_ok=True)
+        (tiles / f'{z}/{x}/{y}.png').write_bytes(png(f'{x}:{y}'))
+
+    module.main()
+    out = capsys.readouterr().out
+    assert 'Tiles já existentes: 3' in out
+    assert '📏 Tamanho médio por tile: 5.0 KB' in out
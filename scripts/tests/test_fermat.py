@@ -0,0 +1,119 @@
+import json
+import math
+
+import numpy as np
+
+from tilelib.fermat import (GOLDEN_ANGLE, KM_PER_DEGREE, RIM_FACTOR, fermat_spirals, find_overlaps,
+                            format_coord, load_centroids, locality_key, plan_coordinates, separate_spirals)
+
+
+def test_locality_key_normalizes_to_nfc():
+    assert locality_key(' Belém ', 'Pará') == 'Belém | Pará'
+    assert locality_key('', 'Pará') == '(estado) Pará'
+    assert locality_key(None, None) is None
+    # "ã" decomposto (NFD) vira a mesma chave do centroides.json
+    assert locality_key('Sa\u0303o Paulo', 'SP') == 'S\u00e3o Paulo | SP'
+
+
+def test_load_centroids_defaults_radius(tmp_path):
+    path = tmp_path / 'centroides.json'
+    path.write_text(json.dumps({
+        'São Paulo | SP': {'lat': '-23.55', 'lon': '-46.63', 'radius_km': 30},
+        'Belém | Pará': {'lat': -1.45, 'lon': -48.5},
+    }), encoding='utf-8')
+    centroids = load_centroids(path)
+    assert centroids['São Paulo | SP'] == (-23.55, -46.63, 30.0)
+    assert centroids['Belém | Pará'] == (-1.45, -48.5, 12.0)
+
+
+def test_spiral_matches_php_formula():
+    lat, lon, group, index = fermat_spirals([-1.45, -23.55], [-48.5, -46.63], [3, 5], [12, 30])
+    assert group.tolist() == [0, 0, 0, 1, 1, 1, 1, 1]
+    assert index.tolist() == [0, 1, 2, 0, 1, 2, 3, 4]
+    # Ponto 0 no centro; os demais pela fórmula de 05-fermat-coords.php
+    assert (lat[0], lon[0]) == (-1.45, -48.5)
+    i, n = 4, 5
+    r = 30 / KM_PER_DEGREE * RIM_FACTOR * math.sqrt(i / n)
+    theta = i * GOLDEN_ANGLE
+    assert math.isclose(lat[7], -23.55 + r * math.sin(theta), abs_tol=1e-7)
+    assert math.isclose(lon[7], -46.63 + r * math.cos(theta) / math.cos(math.radians(-23.55)), abs_tol=1e-7)
+
+
+def test_disperse_puts_last_point_on_rim():
+    lat, lon, _, _ = fermat_spirals([0.0], [0.0], [4], [11.1], disperse=True)
+    assert (lat[0], lon[0]) == (0.0, 0.0)
+    assert math.isclose(math.hypot(lat[3], lon[3]), 0.1, abs_tol=1e-6)
+
+
+def test_find_overlaps_ignores_same_group():
+    # ~111 m entre cada vizinho em latitude
+    lat = np.array([0.0, 0.001, 0.002, 0.5])
+    lon = np.zeros(4)
+    i, j, dist = find_overlaps(lat, lon, np.array([0, 0, 1, 2]), 500)
+    assert sorted(zip(i.tolist(), j.tolist())) == [(0, 2), (1, 2)]
+    assert (i < j).all() and (dist < 500).all()
+    assert not find_overlaps(lat, lon, np.zeros(4, dtype=int), 500)[0].size
+
+
+def test_find_overlaps_matches_brute_force():
+    rng = np.random.default_rng(7)
+    lat = -1.4 + rng.random(400) * 0.05
+    lon = -48.5 + rng.random(400) * 0.05
+    group = rng.integers(0, 20, 400)
+    i, j, _ = find_overlaps(lat, lon, group, 300)
+    found = set(zip(i.tolist(), j.tolist()))
+
+    expected = set()
+    for a in range(400):
+        for b in range(a + 1, 400):
+            if group[a] == group[b]:
+                continue
+            mean_lat = math.radians((lat[a] + lat[b]) / 2)
+            d = 6371008.8 * math.hypot(math.radians(lon[a] - lon[b]) * math.cos(mean_lat),
+                                       math.radians(lat[a] - lat[b]))
+            if d < 300:
+                expected.add((a, b))
+    assert found == expected
+
+
+def test_separate_spirals_removes_overlaps_of_neighbor_localities():
+    # Ananindeua e Marituba: centros a ~3 km, raios que se cruzam
+    lat, lon = [-1.3656, -1.3436], [-48.3722, -48.3411]
+    counts, radius = [40, 25], [12, 12]
+    before = find_overlaps(*fermat_spirals(lat, lon, counts, radius)[:3], 500)[0].size
+    out_lat, out_lon, group, index, phase, scale, (i, _, _) = separate_spirals(lat, lon, counts, radius, 500)
+    assert before > 0
+    assert i.size < before
+    assert find_overlaps(out_lat, out_lon, group, 500)[0].size == i.size
+    # O centro nunca sai do lugar
+    assert (out_lat[index == 0] == np.array(lat)).all()
+    assert ((scale >= 0.3) & (scale <= 1)).all()
+
+
+def test_separate_spirals_without_overlap_is_plain_spiral():
+    lat, lon, counts, radius = [-1.45, -23.55], [-48.5, -46.63], [10, 10], [12, 12]
+    out = separate_spirals(lat, lon, counts, radius, 500)
+    plain = fermat_spirals(lat, lon, counts, radius)
+    assert all((a == b).all() for a, b in zip(out[:4], plain))
+    assert (out[4] == 0).all() and (out[5] == 1).all()
+
+
+def test_plan_coordinates_groups_sorted_posts():
+    centroids = {'Belém | Pará': (-1.45, -48.5, 12.0), 'Manaus | AM': (-3.12, -60.02, 12.0)}
+    plan, missing = plan_coordinates([9, 3, 7, 5], ['Manaus | AM', 'Belém | Pará', 'Belém | Pará', 'Nowhere'],
+                                     centroids)
+    assert missing == {'Nowhere': 1}
+    assert plan['post_id'].tolist() == [3, 7, 9]
+    assert plan['key'].tolist() == ['Belém | Pará', 'Belém | Pará', 'Manaus | AM']
+    assert plan['index'].tolist() == [0, 1, 0]
+    assert (plan['lat'][0], plan['lon'][0]) == (-1.45, -48.5)
+    assert 'adjusted' not in plan
+
+    plan, _ = plan_coordinates([1, 2], ['Belém | Pará', 'Manaus | AM'], centroids, min_separation_m=500)
+    assert plan['adjusted'] == {} and plan['overlaps'] == []
+
+
+def test_format_coord():
+    assert format_coord(-1.45, -48.5) == '-1.45,-48.5'
+    assert format_coord(-0.00000001, 0.0) == '0,0'
+    assert format_coord(1e-7, 12.123456789) == '0.0000001,12.1234568'
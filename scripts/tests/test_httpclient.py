@@ -0,0 +1,80 @@
+import asyncio
+import socket
+import time
+
+import pytest
+from aiohttp import web
+
+from tilelib.httpclient import HTTP2_CONNECTIONS_PER_HOST, TileClientError, http2_available, open_client
+
+
+async def start_mirror(delay):
+    async def tile(request):
+        await asyncio.sleep(delay)
+        if request.match_info['z'] == '404':
+            return web.Response(status=404)
+        return web.Response(body=b'tile', headers={'ETag': '"v1"'})
+
+    app = web.Application()
+    app.router.add_get('/{z}/{x}/{y}.png', tile)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize('http2', [False, pytest.param(True, marks=pytest.mark.skipif(
+    not http2_available(), reason='httpx[http2] não instalado'))])
+def test_transports_share_the_response_and_error_contract(http2):
+    async def scenario():
+        runner, base = await start_mirror(0)
+        slow_runner, slow = await start_mirror(1)
+        try:
+            async with open_client(http2=http2, timeout=0.3) as client:
+                response = await client.get(f'{base}/1/0/0.png', headers={'If-None-Match': '"v0"'})
+                assert (response.status, response.content) == (200, b'tile')
+                assert response.headers['ETag'] == '"v1"'
+                assert (await client.get(f'{base}/404/0/0.png')).status == 404
+                with pytest.raises(asyncio.TimeoutError):
+                    await client.get(f'{slow}/1/0/0.png')
+                with pytest.raises(TileClientError):
+                    await client.get(f'http://127.0.0.1:{closed_port()}/1/0/0.png')
+        finally:
+            await runner.cleanup()
+            await slow_runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.skipif(not http2_available(), reason='httpx[http2] não instalado')
+def test_http2_pool_limit_is_per_mirror():
+    async def scenario():
+        slow_runner, slow = await start_mirror(0.5)
+        fast_runner, fast = await start_mirror(0)
+        try:
+            async with open_client(http2=True, timeout=5) as client:
+                # Espelho lento ocupa todas as suas conexões (HTTP/1.1 sem TLS)
+                stuck = [asyncio.ensure_future(client.get(f'{slow}/1/0/{y}.png'))
+                         for y in range(HTTP2_CONNECTIONS_PER_HOST * 4)]
+                await asyncio.sleep(0.1)
+                start = time.perf_counter()
+                response = await client.get(f'{fast}/1/0/0.png')
+                elapsed = time.perf_counter() - start
+                assert response.status == 200 and response.content == b'tile'
+                assert len(client.clients) == 2
+                await asyncio.gather(*stuck)
+                return elapsed
+        finally:
+            await slow_runner.cleanup()
+            await fast_runner.cleanup()
+
+    # Com um pool global o espelho rápido esperaria a fila do lento (> 0,4 s)
+    assert asyncio.run(scenario()) < 0.3
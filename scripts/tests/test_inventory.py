@@ -0,0 +1,47 @@
+import os
+
+from tilelib.inventory import TileInventory
+
+
+def make_tiles(root, tiles):
+    for z, x, y in tiles:
+        path = root / str(z) / str(x)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / f'{y}.png').write_bytes(b'png')
+
+
+def test_scan_reads_only_tile_names(tmp_path):
+    make_tiles(tmp_path, [(6, 1, 2), (6, 1, 3), (6, 4, 0), (7, 9, 9)])
+    (tmp_path / '6' / '1' / 'notes.txt').write_text('x')
+    (tmp_path / '6' / '1' / 'abc.png').write_bytes(b'png')
+    (tmp_path / '6' / 'logs').mkdir()
+    stale = tmp_path / '6' / '4' / '.0.png.tmp'
+    stale.write_bytes(b'png')
+    os.utime(stale, (0, 0))
+
+    inventory = TileInventory(tmp_path).scan([6])
+    assert inventory.present[6] == {(1, 2), (1, 3), (4, 0)}
+    assert inventory.x_dirs[6] == {1, 4}
+    assert stale.exists()  # a varredura só lê: limpeza é do DirectoryStorage
+    assert inventory.count(6) == 3 and inventory.count() == 3
+    # Zoom não varrido: varrido na primeira consulta
+    assert (7, 9, 9) in inventory and inventory.count() == 4
+    assert (8, 0, 0) not in inventory and inventory.count(8) == 0
+
+
+def test_missing_and_add(tmp_path):
+    make_tiles(tmp_path, [(6, 1, 2)])
+    inventory = TileInventory(tmp_path).scan([6])
+    wanted = [(6, 1, 2), (6, 1, 3), (6, 2, 2)]
+    assert inventory.missing(wanted) == [(6, 1, 3), (6, 2, 2)]
+    inventory.add(6, 1, 3)
+    assert inventory.missing(wanted) == [(6, 2, 2)]
+
+
+def test_ensure_dir_creates_each_x_once(tmp_path):
+    inventory = TileInventory(tmp_path).scan([6])
+    inventory.ensure_dir(6, 5)
+    assert (tmp_path / '6' / '5').is_dir()
+    (tmp_path / '6' / '5').rmdir()
+    inventory.ensure_dir(6, 5)  # já conhecido: sem mkdir
+    assert not (tmp_path / '6' / '5').exists()
@@ -0,0 +1,65 @@
+import json
+import os
+
+from tilelib.journal import DownloadJournal, replay
+from tilelib.storage import DirectoryStorage
+
+
+def test_replay_missing_file(tmp_path):
+    state = replay(tmp_path / 'none.jsonl')
+    assert not state
+    assert state.done == set()
+
+
+def test_replay_with_truncated_last_line(tmp_path):
+    path = tmp_path / 'progress.jsonl'
+    journal = DownloadJournal(path)
+    journal.record(5, 1, 2, True, 'downloaded')
+    journal.record(5, 1, 3, True, 'not_found')
+    journal.record(5, 1, 4, False, 'timeout')
+    journal.record(5, 1, 5, True, 'exists')  # não muda estado
+    journal.flush()
+    journal.record(5, 1, 4, True, 'downloaded')  # falha da linha anterior resolvida
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"ts": 1, "done": [[5, 9')  # crash no meio da linha
+
+    state = replay(path)
+    assert state.batches == 2
+    assert state.done == {(5, 1, 2), (5, 1, 4)}
+    assert state.not_found == {(5, 1, 3)}
+    assert state.failed == {}
+
+
+def test_close_completed_removes_journal(tmp_path):
+    path = tmp_path / 'progress.jsonl'
+    journal = DownloadJournal(path)
+    journal.record(5, 1, 2, True, 'downloaded')
+    journal.close(completed=True)
+    assert not path.exists()
+
+
+def test_storage_is_flushed_before_each_line(tmp_path, monkeypatch):
+    storage = DirectoryStorage(tmp_path / 'tiles')
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced.append(fd) or real_fsync(fd))
+
+    path = tmp_path / 'progress.jsonl'
+    lines_at_flush = []
+    def before_flush():
+        lines_at_flush.append(path.read_text().count('\n'))
+        storage.flush()
+
+    journal = DownloadJournal(path, before_flush=before_flush)
+    storage.write(5, 1, 2, b'\x89PNG' + b'a' * 200)
+    journal.record(5, 1, 2, True, 'downloaded')
+    assert storage.dirty_dirs
+    journal.close()
+    storage.close()
+
+    assert lines_at_flush == [0]
+    assert not storage.dirty_dirs
+    # arquivo do tile + diretórios x e z + linha do journal
+    assert len(synced) >= 4
+    assert json.loads(path.read_text())['done'] == [[5, 1, 2]]
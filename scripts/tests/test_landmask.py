@@ -0,0 +1,39 @@
+from tilelib.landmask import LandMask
+from tilelib.region import SOUTH_AMERICA_BOUNDS_LAND, expected_tiles
+from tilelib.tiling import count_bbox_tiles, deg2num
+
+MIN_ZOOM = 5
+
+
+def test_counts_per_zoom():
+    landmask = LandMask()
+    assert expected_tiles(6, MIN_ZOOM, landmask) == 73
+    assert expected_tiles(8, MIN_ZOOM, landmask) == 931
+    assert expected_tiles(10, MIN_ZOOM, landmask) == 13877
+
+
+def test_min_zoom_keeps_the_rectangle():
+    assert expected_tiles(MIN_ZOOM, MIN_ZOOM, LandMask()) == expected_tiles(MIN_ZOOM, MIN_ZOOM)
+
+
+def test_mask_is_subset_of_land_rectangle():
+    landmask = LandMask()
+    for zoom in (6, 8, 10):
+        tiles = list(landmask.tiles_for_zoom(zoom))
+        assert len(tiles) == len(set(tiles))
+        assert len(tiles) < count_bbox_tiles(SOUTH_AMERICA_BOUNDS_LAND, zoom)
+
+
+def test_buffer_only_adds_tiles():
+    tight = set(LandMask(buffer_deg=0.0).tiles_for_zoom(10))
+    loose = set(LandMask().tiles_for_zoom(10))
+    assert tight <= loose
+
+
+def test_land_in_ocean_out():
+    tiles = set(LandMask().tiles_for_zoom(10))
+    assert deg2num(-3.1, -60.0, 10) in tiles     # Manaus
+    assert deg2num(-23.55, -46.63, 10) in tiles  # São Paulo
+    assert deg2num(-8.05, -34.9, 10) in tiles    # Recife (litoral)
+    assert deg2num(-20.0, -30.0, 10) not in tiles  # Atlântico Sul
+    assert deg2num(-30.0, -85.0, 10) not in tiles  # Pacífico
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import socket
+
+import aiohttp
+
+from tilelib.metrics import (OPENMETRICS_CONTENT_TYPE, PROMETHEUS_CONTENT_TYPE, MetricsRegistry, serve_metrics,
+                             write_snapshot)
+
+
+def registry():
+    metrics = MetricsRegistry('tiles')
+    downloaded = metrics.counter('downloaded', 'Tiles baixados', ('zoom',))
+    downloaded.inc(('10',), 3)
+    latency = metrics.histogram('latency_seconds', 'Latência', ('host',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(('a"b',), value)
+    metrics.gauge('queue_depth', 'Fila', lambda: 7)
+    return metrics, latency
+
+
+def test_prometheus_text_names_counters_with_total():
+    metrics, _ = registry()
+    assert metrics.render() == (
+        '# HELP tiles_downloaded_total Tiles baixados\n'
+        '# TYPE tiles_downloaded_total counter\n'
+        'tiles_downloaded_total{zoom="10"} 3\n'
+        '# HELP tiles_latency_seconds Latência\n'
+        '# TYPE tiles_latency_seconds histogram\n'
+        'tiles_latency_seconds_bucket{host="a\\"b",le="0.1"} 1\n'
+        'tiles_latency_seconds_bucket{host="a\\"b",le="1.0"} 3\n'
+        'tiles_latency_seconds_bucket{host="a\\"b",le="+Inf"} 4\n'
+        'tiles_latency_seconds_count{host="a\\"b"} 4\n'
+        'tiles_latency_seconds_sum{host="a\\"b"} 4.25\n'
+        '# HELP tiles_queue_depth Fila\n'
+        '# TYPE tiles_queue_depth gauge\n'
+        'tiles_queue_depth 7\n'
+    )
+
+
+def test_openmetrics_uses_family_name_and_ends_with_eof():
+    metrics, _ = registry()
+    lines = metrics.render(openmetrics=True).splitlines()
+    assert lines[:3] == ['# HELP tiles_downloaded Tiles baixados', '# TYPE tiles_downloaded counter',
+                         'tiles_downloaded_total{zoom="10"} 3']
+    assert lines[-1] == '# EOF'
+    assert lines.count('# EOF') == 1
+
+
+def test_quantile_and_snapshot():
+    metrics, latency = registry()
+    series = latency.series[('a"b',)]
+    assert latency.quantile(series, 0.5) == 1.0
+    assert latency.quantile(series, 0.99) == float('inf')
+    assert latency.quantile([0] * 4, 0.5) is None
+
+    (entry,) = metrics.snapshot()['metrics']['tiles_latency_seconds']
+    assert entry['p50'] == 1.0 and entry['p99'] is None
+    assert entry['buckets'] == [1, 2] and entry['overflow'] == 1 and entry['count'] == 4
+    empty = MetricsRegistry('x')
+    empty.histogram('h', 'h')
+    assert empty.snapshot()['metrics']['x_h'] == []
+
+
+def test_write_snapshot_appends_json_lines(tmp_path):
+    metrics, _ = registry()
+    path = tmp_path / 'metrics.jsonl'
+    write_snapshot(metrics, path)
+    write_snapshot(metrics, path)
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 2
+    snapshot = json.loads(lines[0])
+    assert snapshot['metrics']['tiles_queue_depth'] == [{'labels': {}, 'value': 7}]
+    assert snapshot['metrics']['tiles_downloaded'] == [{'labels': {'zoom': '10'}, 'value': 3}]
+
+
+def test_endpoint_negotiates_the_format():
+    metrics, _ = registry()
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+
+    async def scenario():
+        runner = await serve_metrics(metrics, port)
+        try:
+            async with aiohttp.ClientSession() as session:
+                url = f'http://127.0.0.1:{port}/metrics'
+                async with session.get(url) as response:
+                    plain = (response.headers['Content-Type'], await response.text())
+                async with session.get(url, headers={'Accept': 'application/openmetrics-text'}) as response:
+                    open_metrics = (response.headers['Content-Type'], await response.text())
+        finally:
+            await runner.cleanup()
+        return plain, open_metrics
+
+    plain, open_metrics = asyncio.run(scenario())
+    assert plain == (PROMETHEUS_CONTENT_TYPE, metrics.render())
+    assert open_metrics == (OPENMETRICS_CONTENT_TYPE, metrics.render(openmetrics=True))
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tilelib import mirrors as mirrors_module
+from tilelib.httpclient import TileResponse
+from tilelib.mirrors import COOLDOWN_BASE, ERRORS_BEFORE_COOLDOWN, MirrorScheduler
+
+SERVERS = ['https://a.tile/{z}/{x}/{y}.png', 'https://b.tile/{z}/{x}/{y}.png']
+
+
+class FakeClient:
+    def __init__(self, status=200):
+        self.status = status
+
+    async def get(self, url, headers=None):
+        return TileResponse(self.status, {}, b'tile')
+
+
+class SlowClient:
+    """Resposta depois de `latency` segundos do relógio falso"""
+
+    def __init__(self, clock, latency, error=None):
+        self.clock = clock
+        self.latency = latency
+        self.error = error
+
+    async def get(self, url, headers=None):
+        self.clock.now += self.latency
+        if self.error is not None:
+            raise self.error
+        return TileResponse(200, {}, b'tile')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(mirrors_module, 'time', SimpleNamespace(monotonic=lambda: fake.now))
+    return fake
+
+
+def request(mirrors, client, avoid=None):
+    server = mirrors.pick(avoid)
+    asyncio.run(mirrors.fetch(client, server, 'u'))
+    return server
+
+
+def test_fast_mirror_gets_the_traffic(clock):
+    mirrors = MirrorScheduler(SERVERS)
+    request(mirrors, SlowClient(clock, 0.8))
+    request(mirrors, SlowClient(clock, 0.05))
+    assert mirrors.pick() == SERVERS[1]
+    assert mirrors.pick(avoid=SERVERS[1]) == SERVERS[0]
+
+
+def test_consecutive_errors_cool_the_mirror_down(clock):
+    mirrors = MirrorScheduler(SERVERS)
+    for _ in range(ERRORS_BEFORE_COOLDOWN):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(mirrors.fetch(SlowClient(clock, 0, asyncio.TimeoutError()), SERVERS[0], 'u'))
+    stats = mirrors.mirrors[SERVERS[0]]
+    assert stats.errors == ERRORS_BEFORE_COOLDOWN and stats.cooldowns == 1
+    assert all(mirrors.pick() == SERVERS[1] for _ in range(3))
+
+    clock.now += COOLDOWN_BASE * 2 ** (ERRORS_BEFORE_COOLDOWN - 1) + 1
+    assert mirrors.pick(avoid=SERVERS[1]) == SERVERS[0]
+
+
+def test_all_down_picks_the_first_to_return(clock):
+    mirrors = MirrorScheduler(SERVERS)
+    mirrors.on_throttle(SERVERS[1])
+    clock.now += 1
+    mirrors.on_throttle(SERVERS[0])
+    assert mirrors.pick() == SERVERS[1]
+    assert '1 429/403, 1 afastamentos' in mirrors.summary()[0]
+
+
+def test_inflight_is_released_when_wait_fails():
+    mirrors = MirrorScheduler(SERVERS)
+    server = mirrors.pick()
+
+    async def failing_wait():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(mirrors.fetch(FakeClient(), server, 'https://a.tile/1/0/0.png', wait=failing_wait))
+    assert all(m.inflight == 0 for m in mirrors.mirrors.values())
+    # Espera cancelada não é falha do espelho
+    assert mirrors.mirrors[server].errors == 0
+
+
+def test_inflight_counts_the_wait_and_steers_pick():
+    mirrors = MirrorScheduler(SERVERS)
+
+    async def scenario():
+        gate = asyncio.Event()
+        server = mirrors.pick()
+        task = asyncio.ensure_future(mirrors.fetch(FakeClient(), server, 'u', wait=gate.wait))
+        await asyncio.sleep(0)
+        assert mirrors.mirrors[server].inflight == 1
+        other = mirrors.pick()
+        gate.set()
+        await task
+        return server, other
+
+    server, other = asyncio.run(scenario())
+    assert other != server
+    assert all(m.inflight == 0 for m in mirrors.mirrors.values())
+
+
+def test_throttled_mirror_leaves_rotation():
+    mirrors = MirrorScheduler(SERVERS)
+    asyncio.run(mirrors.fetch(FakeClient(429), SERVERS[0], 'u'))
+    assert [mirrors.pick() for _ in range(3)] == [SERVERS[1]] * 3
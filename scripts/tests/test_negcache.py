@@ -0,0 +1,62 @@
+import multiprocessing
+import threading
+import time
+
+from tilelib import negcache
+from tilelib.negcache import NegativeCache
+from tilelib.sqlitedb import connect
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = 1_700_000_000
+    monkeypatch.setattr(negcache.time, 'time', lambda: now)
+    cache = NegativeCache(tmp_path / 'nf.sqlite', ttl_days=30)
+    cache.add(8, 1, 2)
+    cache.flush()
+    assert (8, 1, 2) in cache and cache.known(8, 1, 2)
+    assert cache.filter([(8, 1, 2), (8, 1, 3)]) == [(8, 1, 3)]
+
+    now += 31 * 86400
+    fresh = NegativeCache(tmp_path / 'nf.sqlite', ttl_days=30)
+    assert (8, 1, 2) not in fresh
+    assert not fresh.known(8, 1, 2)
+    assert fresh.purge_expired() == 1
+    cache.close()
+    fresh.close()
+
+
+def test_commit_waits_for_another_writer(tmp_path):
+    path = tmp_path / 'nf.sqlite'
+    cache = NegativeCache(path)
+    other = connect(path, check_same_thread=False)
+    other.execute('BEGIN IMMEDIATE')
+    other.execute('INSERT INTO notfound (z, x, y, ts) VALUES (1, 1, 1, ?)', (int(time.time()),))
+    threading.Timer(0.3, other.commit).start()
+
+    cache.add(2, 2, 2)
+    cache.flush()  # espera o commit do outro em vez de "database is locked"
+    assert (1, 1, 1) in cache and (2, 2, 2) in cache
+    cache.close()
+    other.close()
+
+
+def _shard_writer(path, shard):
+    cache = NegativeCache(path)
+    for i in range(negcache.FLUSH_EVERY * 4):
+        cache.add(12, shard, i)
+    cache.close()
+
+
+def test_shards_share_the_cache_file(tmp_path):
+    path = tmp_path / 'nf.sqlite'
+    NegativeCache(path).close()
+    ctx = multiprocessing.get_context('fork')
+    workers = [ctx.Process(target=_shard_writer, args=(path, shard)) for shard in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    assert [p.exitcode for p in workers] == [0] * 4
+    cache = NegativeCache(path)
+    assert len(cache.load_zoom(12)) == negcache.FLUSH_EVERY * 4 * 4
+    cache.close()
@@ -0,0 +1,100 @@
+import io
+import os
+
+from PIL import Image
+
+from conftest import load_script
+from tilelib.optimize import OPTIMIZE_STATE_FILENAME, OptimizeState, optimize_group
+from tilelib.storage import DirectoryStorage, content_hash
+from tilelib.validators import VALIDATORS_FILENAME, ValidatorIndex
+
+
+def raw_png(color):
+    """PNG RGB sem compressão e com poucas cores: a otimização sempre ganha"""
+    image = Image.new('RGB', (256, 256), (170, 211, 223))
+    image.paste(color, (0, 0, 128, 128))
+    buf = io.BytesIO()
+    image.save(buf, 'PNG', compress_level=0)
+    return buf.getvalue()
+
+
+def pixels(data):
+    with Image.open(io.BytesIO(data)) as image:
+        return image.convert('RGB').tobytes()
+
+
+def run_optimize(tiles_dir, monkeypatch):
+    module = load_script('optimize-tiles', ['--workers=1'])
+    monkeypatch.setattr(module, 'TILES_DIR', tiles_dir)
+    module.main()
+
+
+def test_optimize_group_is_lossless_and_keeps_hardlinks(tmp_path, monkeypatch):
+    storage = DirectoryStorage(tmp_path)
+    original = raw_png((200, 30, 30))
+    storage.write(8, 1, 1, original)
+    storage.write(8, 2, 2, original)
+    storage.close()
+    paths = [str(tmp_path / '8' / '1' / '1.png'), str(tmp_path / '8' / '2' / '2.png')]
+    tmp_dir = tmp_path / '.tmp'
+    renames = []
+    replace = os.replace
+    monkeypatch.setattr(os, 'replace', lambda src, dst: renames.append(src) or replace(src, dst))
+
+    status, before, after, digest, source = optimize_group((paths, None, 'p', 0, str(tmp_dir)))
+    assert status == 'optimized' and after < before
+    assert source == content_hash(original)
+    optimized = open(paths[0], 'rb').read()
+    assert digest == f'p:{content_hash(optimized)}'
+    assert pixels(optimized) == pixels(original)
+    assert (tmp_path / '8' / '1' / '1.png').stat().st_ino == (tmp_path / '8' / '2' / '2.png').stat().st_ino
+    # Temporários no tiles/.tmp/ do storage, nunca no diretório do tile
+    assert len(renames) == 2 and all(os.path.dirname(src) == str(tmp_dir) for src in renames)
+    assert not list(tmp_dir.iterdir()) and sorted(os.listdir(tmp_path / '8' / '1')) == ['1.png']
+
+    # Segunda passada com o mesmo perfil: nada a fazer
+    assert optimize_group((paths, digest, 'p', 0, str(tmp_dir)))[0] == 'skipped'
+
+
+def test_dedup_index_follows_optimized_bytes(tmp_path, monkeypatch):
+    original = raw_png((200, 30, 30))
+    storage = DirectoryStorage(tmp_path)
+    storage.write(8, 1, 1, original)
+    storage.write(8, 2, 2, original)
+    storage.close()
+
+    run_optimize(tmp_path, monkeypatch)
+    storage = DirectoryStorage(tmp_path)
+    optimized = storage.read(8, 1, 1)
+    assert optimized != original
+    assert storage.blobs.lookup(content_hash(optimized)) == (8, 1, 1)
+    assert storage.blobs.lookup(content_hash(original)) is None
+
+    # --refresh troca o canônico: a entrada do conteúdo otimizado sai junto
+    storage.write(8, 1, 1, raw_png((30, 200, 30)))
+    assert storage.blobs.lookup(content_hash(optimized)) is None
+    assert storage.read(8, 2, 2) == optimized
+    # Download novo com o conteúdo original não pode virar link para o tile trocado
+    storage.write(8, 3, 3, original)
+    assert storage.read(8, 3, 3) == original
+    storage.close()
+
+
+def test_refresh_hash_survives_optimization(tmp_path, monkeypatch):
+    original = raw_png((200, 30, 30))
+    storage = DirectoryStorage(tmp_path)
+    storage.write(8, 1, 1, original)
+    storage.close()
+
+    run_optimize(tmp_path, monkeypatch)
+    validators = ValidatorIndex(tmp_path / VALIDATORS_FILENAME)
+    # O servidor ainda entrega os bytes originais: o --refresh os reconhece
+    assert validators.downloaded_hash(8, 1, 1) == content_hash(original)
+    validators.record(8, 1, 1, sha1='novo')
+    validators.backfill_hashes([(8, 1, 1, 'outro')])
+    assert validators.downloaded_hash(8, 1, 1) == 'novo'
+    validators.close()
+
+    state = OptimizeState(tmp_path / OPTIMIZE_STATE_FILENAME)
+    assert (8, 1, 1) in state.known()
+    state.close()
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import struct
+import zlib
+
+from PIL import Image
+
+from tilelib.pngcheck import (BLOCKED_TILE_SIZE, check_file, check_png_crc, load_repair_list, scan_x_dir,
+                              write_repair_list)
+
+
+def real_png():
+    buf = io.BytesIO()
+    Image.new('RGB', (256, 256), (170, 211, 223)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def check(tmp_path, data, verify_crc=False):
+    path = tmp_path / 'tile.png'
+    path.write_bytes(data)
+    return check_file(path, len(data), verify_crc)[0]
+
+
+def test_detects_each_problem(tmp_path):
+    good = real_png()
+    assert check(tmp_path, good) is None
+    assert check(tmp_path, b'') == 'empty'
+    assert check(tmp_path, b'  <html><body>Too Many Requests</body></html>' + b' ' * 60) == 'html'
+    assert check(tmp_path, b'GIF89a' + good[6:]) == 'bad_signature'
+    assert check(tmp_path, good[:-20]) == 'truncated'
+    assert check(tmp_path, good[:12] + b'JUNK' + good[16:]) == 'bad_ihdr'
+
+
+def test_crc_only_with_verify(tmp_path):
+    good = bytearray(real_png())
+    good[40] ^= 0xFF  # corrompe o IDAT, estrutura intacta
+    assert check(tmp_path, bytes(good)) is None
+    assert check(tmp_path, bytes(good), verify_crc=True) == 'bad_crc'
+    assert check_png_crc(real_png()) is None
+
+
+def test_blocked_image_is_flagged(tmp_path):
+    good = real_png()
+    # PNG estruturalmente válido com o tamanho exato da imagem de bloqueio
+    padding = BLOCKED_TILE_SIZE - len(good)
+    chunk = padding - 12
+    body = b'\x00' * chunk
+    text = struct.pack('>I', chunk) + b'tEXt' + body + struct.pack('>I', zlib.crc32(b'tEXt' + body))
+    blocked = good[:33] + text + good[33:]
+    assert len(blocked) == BLOCKED_TILE_SIZE
+    assert check(tmp_path, blocked) == 'blocked'
+
+
+def test_scan_x_dir_rows(tmp_path):
+    x_dir = tmp_path / '8' / '3'
+    x_dir.mkdir(parents=True)
+    (x_dir / '1.png').write_bytes(real_png())
+    (x_dir / '2.png').write_bytes(b'')
+    (x_dir / 'notes.txt').write_text('x')
+    z, x, mtime_ns, rows = scan_x_dir((str(x_dir), 8, 3, True))
+    assert (z, x, mtime_ns) == (8, 3, os.stat(x_dir).st_mtime_ns)
+    by_y = {row[0]: row for row in rows}
+    assert set(by_y) == {1, 2}
+    assert by_y[1][5] is not None and by_y[1][6] is None
+    assert by_y[2][6] == 'empty'
+
+
+def test_repair_list_round_trip(tmp_path):
+    path = tmp_path / 'repair.json'
+    write_repair_list(path, [(8, 1, 2, 'truncated'), (9, 3, 4, 'html')])
+    assert load_repair_list(path) == [(8, 1, 2), (9, 3, 4)]
+    # failed_tiles_*.json do download-tiles.py também serve
+    path.write_text(json.dumps({'failed_tiles': [{'z': 5, 'x': 6, 'y': 7, 'error': 'timeout'}]}))
+    assert load_repair_list(path) == [(5, 6, 7)]
@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+
+from conftest import load_script
+from tilelib.poiplan import EARTH_RADIUS_M, PointLayer, circle_tiles, csv_layer, plan_poi_tiles
+from tilelib.tiling import deg2num, num2deg_array
+
+ZOOM = 10
+X, Y = 512, 512  # tile logo abaixo do equador: ~39 km de lado
+TILE_M = 2 * math.pi * EARTH_RADIUS_M / 2 ** ZOOM
+
+
+def tile_center(x, y, z=ZOOM):
+    lat, lon = num2deg_array(np.array([x + 0.5]), np.array([y + 0.5]), z)
+    return float(lat[0]), float(lon[0])
+
+
+def as_set(xy):
+    return {tuple(t) for t in xy.tolist()}
+
+
+def test_radius_touches_only_the_tiles_the_circle_reaches():
+    lat, lon = tile_center(X, Y)
+    xy, pairs = circle_tiles([lat], [lon], [1.0], ZOOM)
+    assert as_set(xy) == {(X, Y)} and pairs == 1
+
+    # 0.6 lado: alcança os 4 vizinhos de borda (0.5) mas não as diagonais (0.71)
+    xy, _ = circle_tiles([lat], [lon], [0.6 * TILE_M], ZOOM)
+    assert as_set(xy) == {(X, Y), (X - 1, Y), (X + 1, Y), (X, Y - 1), (X, Y + 1)}
+
+    xy, _ = circle_tiles([lat], [lon], [1.2 * TILE_M], ZOOM)
+    assert as_set(xy) == {(X + dx, Y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)}
+
+
+def test_overlapping_points_are_merged():
+    (lat_a, lon_a), (lat_b, lon_b) = tile_center(X, Y), tile_center(X + 1, Y)
+    xy, pairs = circle_tiles([lat_a, lat_b], [lon_a, lon_b], [0.6 * TILE_M] * 2, ZOOM)
+    assert pairs == 10
+    assert len(xy) == len(as_set(xy)) == 8
+
+    layers = [PointLayer('a', [lat_a], [lon_a], 0.6 * TILE_M, (ZOOM, ZOOM)),
+              PointLayer('b', [lat_b], [lon_b], 0.6 * TILE_M, range(3, ZOOM + 1))]
+    plan, stats = plan_poi_tiles(layers)
+    # z ≤ WORLD_MAX_ZOOM já está na camada mundial
+    assert sorted(plan) == list(range(5, ZOOM + 1))
+    assert stats[ZOOM] == {'points': 2, 'pairs': 10, 'merged': 8, 'excluded': 0, 'tiles': 8}
+    assert stats[ZOOM - 1]['points'] == 1
+
+    plan, stats = plan_poi_tiles(layers, exclude=lambda z: {(X, Y)} if z == ZOOM else set())
+    assert (X, Y) not in plan[ZOOM] and stats[ZOOM]['excluded'] == 1 and stats[ZOOM]['tiles'] == 7
+
+
+def test_csv_layer_reads_coordenada_or_lat_lon(tmp_path):
+    path = tmp_path / 'artistas.csv'
+    path.write_text('coordenada,lat,lon\n"-1.45,-48.5",,\n,-3.12,-60.02\n,,\n', encoding='utf-8')
+    layer = csv_layer(path, (5, 12), 2000)
+    assert layer.name == 'artistas' and len(layer) == 2
+    assert layer.lat.tolist() == [-1.45, -3.12] and layer.radius_m.tolist() == [2000, 2000]
+    assert list(layer.zooms) == list(range(5, 13))
+
+
+def test_skip_region_drops_tiles_of_the_regional_plan(monkeypatch):
+    essential = load_script('download-tiles-essential')
+    layers = [PointLayer('x', [-3.12, 52.52], [-60.02, 13.40], 20_000, (6, 6))]
+    monkeypatch.setattr('sys.argv', ['download-tiles-essential'])
+    tiles, stats = essential.collect_essential_tiles(layers)
+    assert stats[6]['excluded'] == 0
+    assert (6, *deg2num(-3.12, -60.02, 6)) in tiles
+
+    monkeypatch.setattr('sys.argv', ['download-tiles-essential', '--skip-region'])
+    tiles, stats = essential.collect_essential_tiles(layers)
+    # Manaus já está no plano do download-tiles.py; Berlim não
+    assert stats[6]['excluded'] > 0 and stats[6]['tiles'] > 0
+    assert (6, *deg2num(-3.12, -60.02, 6)) not in tiles
+    assert (6, *deg2num(52.52, 13.40, 6)) in tiles
+    assert len([t for t in tiles if t[0] <= 4]) == 341
+
+
+def test_tedx_3x3_restores_the_old_neighbourhood(monkeypatch):
+    essential = load_script('download-tiles-essential')
+    monkeypatch.setattr('sys.argv', ['download-tiles-essential'])
+    radius = {t for t in essential.collect_essential_tiles(essential.poi_layers())[0] if t[0] > 4}
+    monkeypatch.setattr('sys.argv', ['download-tiles-essential', '--tedx-3x3'])
+    layers = essential.poi_layers()
+    assert layers == []
+    grid = {t for t in essential.collect_essential_tiles(layers)[0] if t[0] > 4}
+    # 9 cidades × 3 zooms × 3x3 = 243, menos os vizinhos compartilhados entre cidades próximas
+    assert len(grid) == 213 and len(radius) == 84
+    for z in (5, 6, 7):
+        cx, cy = deg2num(52.3676, 4.9041, z)  # Amsterdã
+        assert {(z, cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)} <= grid
@@ -0,0 +1,143 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import load_script, png
+from tilelib import ratelimit
+from tilelib.httpclient import TileResponse
+from tilelib.ratelimit import (ADDITIVE_INCREASE, DECREASE_HOLDOFF, MIN_RATE, MULTIPLICATIVE_DECREASE,
+                               AdaptiveRateLimiter, TokenBucket, host_of)
+from tilelib.storage import DirectoryStorage
+
+
+class FakeClock:
+    """time.monotonic() e asyncio.sleep() do módulo: dormir só avança o relógio"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        # Como no relógio real, dormir sempre avança um pouco: sem isso o resto
+        # de arredondamento de tokens (0.999...) viraria um laço de sleeps nulos
+        self.now += max(seconds, 1e-9)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit, 'time', SimpleNamespace(monotonic=fake.monotonic))
+    monkeypatch.setattr(ratelimit, 'asyncio', SimpleNamespace(Lock=asyncio.Lock, sleep=fake.sleep))
+    return fake
+
+
+def test_additive_increase_up_to_the_ceiling(clock):
+    bucket = TokenBucket(4.0)
+    bucket.rate = 2.0
+    bucket.increase()
+    assert bucket.rate == pytest.approx(2.0 + ADDITIVE_INCREASE / 2.0)
+    for _ in range(1000):
+        bucket.increase()
+    assert bucket.rate == 4.0
+
+
+def test_multiplicative_decrease_once_per_burst(clock):
+    bucket = TokenBucket(4.0)
+    bucket.decrease()
+    assert bucket.rate == 4.0 * MULTIPLICATIVE_DECREASE
+    assert bucket.tokens == 0.0 and bucket.throttle_count == 1
+    # Outros 429 da mesma rajada não cortam de novo
+    clock.now += DECREASE_HOLDOFF / 2
+    bucket.decrease()
+    assert bucket.rate == 4.0 * MULTIPLICATIVE_DECREASE and bucket.throttle_count == 1
+    for _ in range(20):
+        clock.now += DECREASE_HOLDOFF
+        bucket.decrease()
+    assert bucket.rate == MIN_RATE
+
+
+def test_acquire_paces_at_the_current_rate(clock):
+    bucket = TokenBucket(2.0, burst=1)
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    start = clock.now
+    asyncio.run(take(5))
+    # Primeiro token da rajada, os outros 4 a 2 req/s
+    assert clock.now - start == pytest.approx(2.0)
+    bucket.decrease()
+    start = clock.now
+    asyncio.run(take(2))
+    assert clock.now - start == pytest.approx(2.0)  # 1 req/s depois do corte
+
+
+def test_limiter_feeds_host_and_global_buckets(clock):
+    limiter = AdaptiveRateLimiter(8.0, per_host_rate=2.0,
+                                  hosts=[host_of(f'https://{s}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png')
+                                         for s in 'abcd'])
+    assert sorted(limiter.hosts) == [f'{s}.tile.openstreetmap.org' for s in 'abcd']
+    assert limiter.rate == 8.0
+
+    limiter.on_throttle('a.tile.openstreetmap.org')
+    assert limiter.hosts['a.tile.openstreetmap.org'].rate == 1.0
+    assert limiter.global_bucket.rate == 4.0
+    assert limiter.rate == 4.0  # o global limita a soma dos hosts (7 req/s)
+
+    limiter.on_success('b.tile.openstreetmap.org')
+    assert limiter.hosts['b.tile.openstreetmap.org'].rate == 2.0  # já no teto
+    assert limiter.global_bucket.rate == pytest.approx(4.0 + ADDITIVE_INCREASE / 4.0)
+    assert 'global: 4.0 req/s (teto 8.0, 1 cortes)' in limiter.summary()
+
+
+class SequenceClient:
+    """Responde com os status da lista, depois 200 com um PNG"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+
+    async def get(self, url, headers=None):
+        status = self.statuses.pop(0) if self.statuses else 200
+        return TileResponse(status, {}, png(1, size=2000) if status == 200 else b'')
+
+
+@pytest.mark.parametrize('status,throttled', [(429, True), (503, True), (500, False)])
+def test_downloader_halves_the_rate_on_429_and_503(clock, tmp_path, monkeypatch, status, throttled):
+    module = load_script('download-tiles')
+    monkeypatch.setattr(module, 'LOGS_DIR', tmp_path / 'logs')
+    monkeypatch.setattr(module, 'RETRY_DELAY_BASE', 0)
+    storage = DirectoryStorage(tmp_path / 'tiles')
+    downloader = module.TileDownloader(storage=storage)
+    global_rate = downloader.limiter.global_bucket.rate
+
+    result = asyncio.run(downloader.download_tile_with_retry(SequenceClient(status), 8, 1, 1))
+    assert result == (True, 'downloaded')
+    cut = [bucket for bucket in downloader.limiter.hosts.values() if bucket.throttle_count]
+    assert downloader.limiter.global_bucket.throttle_count == int(throttled)
+    assert len(cut) == int(throttled)
+    if throttled:
+        half = global_rate * MULTIPLICATIVE_DECREASE
+        # Corte pela metade, depois um passo aditivo pelo 200 da nova tentativa
+        assert downloader.limiter.global_bucket.rate == pytest.approx(half + ADDITIVE_INCREASE / half)
+    storage.close()
+
+
+@pytest.mark.parametrize('script', ['download-tiles', 'download-tiles-essential'])
+def test_downloaders_split_the_global_rate_across_servers(tmp_path, monkeypatch, script):
+    module = load_script(script)
+    monkeypatch.setattr(module, 'LOGS_DIR', tmp_path / 'logs')
+    storage = DirectoryStorage(tmp_path / 'tiles')
+    downloader = (module.TileDownloader if script == 'download-tiles' else module.EssentialDownloader)(
+        storage=storage)
+    limiter = downloader.limiter
+    assert limiter.global_bucket.max_rate == pytest.approx(1 / module.RATE_LIMIT_DELAY)
+    assert sorted(limiter.hosts) == sorted(host_of(s) for s in module.TILE_SERVERS)
+    for bucket in limiter.hosts.values():
+        assert bucket.max_rate == pytest.approx(1 / module.RATE_LIMIT_DELAY / len(module.TILE_SERVERS))
+    storage.close()
@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import png
+from tilelib.httpclient import TileClientError
+from tilelib import render
+from tilelib.render import (LOCAL_TILE_URL, MERCATOR_HALF, MBTilesSource, MetatileRenderer, metatile_extent,
+                            metatile_order, mercator_bbox, open_source, parse_tile_url)
+from tilelib.storage import MBTilesStorage
+
+
+def local_url(z, x, y):
+    return LOCAL_TILE_URL.format(z=z, x=x, y=y)
+
+
+def fetch_all(path, tiles):
+    async def scenario():
+        async with open_source(f'mbtiles:{path}') as source:
+            return [await source.get(local_url(*t)) for t in tiles]
+    return asyncio.run(scenario())
+
+
+def test_parse_tile_url():
+    assert parse_tile_url(local_url(12, 1365, 2083)) == (12, 1365, 2083)
+    assert parse_tile_url('https://tile.openstreetmap.de/3/5/2.png') == (3, 5, 2)
+    with pytest.raises(TileClientError):
+        parse_tile_url('https://tile.openstreetmap.de/3/5/2.webp')
+
+
+def test_mbtiles_source_flips_tms_rows(tmp_path):
+    path = tmp_path / 'src.mbtiles'
+    storage = MBTilesStorage(path)
+    storage.write(3, 5, 1, png(1))
+    storage.write(3, 5, 6, png(2))
+    storage.close()
+    # A linha TMS gravada é 2^z - 1 - y
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute('SELECT tile_row FROM tiles ORDER BY tile_row').fetchall()
+    assert rows == [(1,), (6,)]
+
+    first, second, missing = fetch_all(path, [(3, 5, 1), (3, 5, 6), (3, 4, 1)])
+    assert (first.status, first.content) == (200, png(1))
+    assert (second.status, second.content) == (200, png(2))
+    assert (missing.status, missing.content) == (404, b'')
+
+
+def test_mbtiles_source_rejects_vector_tiles(tmp_path):
+    path = tmp_path / 'vector.mbtiles'
+    MBTilesStorage(path).close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT OR REPLACE INTO metadata (name, value) VALUES ('format', 'pbf')")
+    with pytest.raises(ValueError, match='vetorial'):
+        fetch_all(path, [])
+    with pytest.raises(FileNotFoundError):
+        MBTilesSource(tmp_path / 'nope.mbtiles')
+    with pytest.raises(ValueError):
+        open_source(f'pmtiles:{path}')
+
+
+def test_failed_metatile_is_not_rendered_again(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'mapnik', types.ModuleType('mapnik'))
+    calls = []
+
+    def failing_render(args):
+        calls.append(args)
+        raise RuntimeError('datasource indisponível')
+
+    monkeypatch.setattr(render, 'render_metatile', failing_render)
+    renderer = MetatileRenderer(tmp_path / 'style.xml')
+
+    async def scenario():
+        renderer.pool = ThreadPoolExecutor(1)
+        errors = []
+        for x in range(8):  # todos no metatile (10, 0, 0)
+            with pytest.raises(TileClientError) as error:
+                await renderer.get(local_url(10, x, 3))
+            errors.append(error.value)
+        await renderer.close()
+        return errors
+
+    errors = asyncio.run(scenario())
+    assert calls == [(10, 0, 0, 8)]
+    assert renderer.rendered == 0
+    assert all(e.kind == 'render_error' for e in errors)
+
+
+def test_metatile_order_groups_blocks():
+    tiles = [(x, y) for x in range(0, 16) for y in range(0, 16)]
+    ordered = list(metatile_order(tiles))
+    assert sorted(ordered) == tiles
+    blocks = [(x // 8, y // 8) for x, y in ordered]
+    # Cada metatile sai inteiro, em sequência
+    assert blocks == sorted(blocks) and all(blocks.count(b) == 64 for b in set(blocks))
+    assert list(metatile_order([])) == []
+
+
+def test_metatile_extent_clips_at_world_edges():
+    assert metatile_extent(10, 3, 5) == (24, 40, 8, 8)
+    # z2: o mundo tem só 4×4 tiles
+    assert metatile_extent(2, 0, 0) == (0, 0, 4, 4)
+    assert metatile_extent(0, 0, 0) == (0, 0, 1, 1)
+    # Último metatile de z4 (16 tiles) com metatile 6: sobram 4 colunas/linhas
+    assert metatile_extent(4, 2, 2, metatile=6) == (12, 12, 4, 4)
+
+
+def test_mercator_bbox_at_world_edges():
+    assert mercator_bbox(0, 0, 0, 1, 1) == pytest.approx((-MERCATOR_HALF, -MERCATOR_HALF,
+                                                          MERCATOR_HALF, MERCATOR_HALF))
+    # z1 (0, 0) é o quadrante noroeste; (1, 1) o sudeste
+    assert mercator_bbox(1, 0, 0, 1, 1) == pytest.approx((-MERCATOR_HALF, 0, 0, MERCATOR_HALF))
+    assert mercator_bbox(1, 1, 1, 1, 1) == pytest.approx((0, -MERCATOR_HALF, MERCATOR_HALF, 0))
+    minx, miny, maxx, maxy = mercator_bbox(2, *metatile_extent(2, 0, 0))
+    assert (minx, maxx) == pytest.approx((-MERCATOR_HALF, MERCATOR_HALF))
+    assert (miny, maxy) == pytest.approx((-MERCATOR_HALF, MERCATOR_HALF))
@@ -0,0 +1,74 @@
+from itertools import islice
+
+import numpy as np
+
+from tilelib import schedule
+from tilelib.poiplan import PointLayer
+from tilelib.schedule import PriorityAreas, hilbert_sort, scheduled_tiles
+from tilelib.tiling import num2deg_array
+
+# Mesmo quadrado de 16×16 tiles em todos os zooms
+BASE = 32
+
+
+def square(z):
+    return [(BASE + x, BASE + y) for x in range(16) for y in range(16)]
+
+
+def test_hilbert_sort_walks_blocks_together():
+    xy = np.array(square(8), dtype=np.int64)
+    ordered = hilbert_sort(xy, 8)
+    assert sorted(map(tuple, ordered.tolist())) == sorted(square(8))
+    assert (np.abs(np.diff(ordered, axis=0)).sum(axis=1) == 1).all()
+
+    blocks = [tuple(b) for b in (hilbert_sort(xy, 8, block=8) // 8).tolist()]
+    # Cada bloco 8×8 sai inteiro antes do próximo
+    assert all(blocks[i * 64:(i + 1) * 64] == [blocks[i * 64]] * 64 for i in range(4))
+
+
+def test_tiers_full_then_rest_without_areas():
+    tiers = {}
+    order = list(scheduled_tiles(square, range(6, 11), PriorityAreas(), full_zoom=7, tiers=tiers))
+    assert len(order) == len(set(order)) == 5 * 256
+    assert tiers == {'full': 512, 'priority': 0, 'rest': 768}
+    assert [z for z, _, _ in order] == [6] * 256 + [7] * 256 + [8] * 256 + [9] * 256 + [10] * 256
+
+
+def test_priority_areas_come_before_the_rest():
+    lat, lon = num2deg_array(np.array([BASE + 3.5]), np.array([BASE + 5.5]), 10)
+    point = PointLayer('p', lat, lon, 1.0, (10, 10))
+    # Bbox dentro dos tiles z9 (BASE, BASE) e (BASE, BASE + 1), longe das bordas
+    (north, south), (west, east) = num2deg_array(np.array([BASE + 0.25, BASE + 0.75]),
+                                                 np.array([BASE + 0.25, BASE + 1.75]), 9)
+    areas = PriorityAreas(bounds=[{'north': north, 'south': south, 'west': west, 'east': east}], layers=[point])
+    tiers = {}
+    order = list(scheduled_tiles(square, range(8, 11), areas, full_zoom=8, tiers=tiers))
+    assert sorted(order) == sorted((z, x, y) for z in range(8, 11) for x, y in square(z))
+    # z9: os 2 tiles do bbox (em z10 ele cai fora do quadrado); z10: o tile do ponto
+    assert tiers['full'] == 256 and tiers['priority'] == 2 + 1
+    assert tiers['rest'] == 768 - 256 - 3
+    assert order[256:258] == [(9, BASE, BASE), (9, BASE, BASE + 1)]
+    assert order[258] == (10, BASE + 3, BASE + 5)
+    assert [z for z, _, _ in order[259:]] == [9] * 254 + [10] * 255
+
+
+def test_rest_tier_is_listed_only_after_every_priority_tier(monkeypatch):
+    lat, lon = num2deg_array(np.array([BASE + 3.5]), np.array([BASE + 5.5]), 10)
+    areas = PriorityAreas(layers=[PointLayer('p', lat, lon, 1.0, (10, 10))])
+    expected = list(scheduled_tiles(square, range(8, 11), areas, full_zoom=8))
+
+    monkeypatch.setattr(schedule, 'SPLIT_BATCH', 100)  # vários lotes por zoom
+    calls = []
+
+    def zoom_tiles(z):
+        calls.append(z)
+        return iter(square(z))
+
+    tiers = {}
+    plan = scheduled_tiles(zoom_tiles, range(8, 11), areas, full_zoom=8, tiers=tiers)
+    head = list(islice(plan, 257))  # z8 inteiro + o tile do ponto em z10
+    assert head[-1] == (10, BASE + 3, BASE + 5)
+    assert calls == [8, 9, 10]  # faixa 3 ainda não listada
+    assert head + list(plan) == expected
+    assert calls == [8, 9, 10, 9, 10]
+    assert tiers == {'full': 256, 'priority': 1, 'rest': 511}
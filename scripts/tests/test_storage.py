@@ -0,0 +1,122 @@
+import os
+import threading
+
+from conftest import png
+from tilelib.storage import DirectoryStorage, MBTilesStorage, content_hash
+
+
+def test_write_read_and_inventory(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(6, 10, 20, png(1))
+    assert (6, 10, 20) in storage
+    assert storage.read(6, 10, 20) == png(1)
+    assert storage.read(6, 10, 21) is None
+    assert list(storage.tiles()) == [(6, 10, 20)]
+    assert not list((tmp_path / '6' / '10').glob('*.tmp'))
+    storage.close()
+
+
+def test_startup_removes_only_stale_tmp_files(tmp_path):
+    (tmp_path / '.tmp').mkdir()
+    stale, fresh = tmp_path / '.tmp' / '6-1-1.aaaa.tmp', tmp_path / '.tmp' / '6-1-2.bbbb.tmp'
+    stale.write_bytes(b'x')
+    fresh.write_bytes(b'x')
+    os.utime(stale, (0, 0))
+    DirectoryStorage(tmp_path).close()
+    assert not stale.exists() and fresh.exists()  # a recente pode ser de outro shard
+
+
+def test_identical_payloads_are_hardlinked(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(6, 1, 1, png(1))
+    storage.write(6, 2, 2, png(1))
+    assert storage.dedup_hits == 1
+    assert storage.tile_path(6, 1, 1).stat().st_ino == storage.tile_path(6, 2, 2).stat().st_ino
+    storage.close()
+
+
+def test_overwrite_canonical_does_not_corrupt_duplicates(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(6, 1, 1, png(1))
+    storage.write(6, 2, 2, png(1))
+    storage.write(6, 1, 1, png(2))  # --refresh trocou o canônico
+    assert storage.read(6, 2, 2) == png(1)
+    storage.write(6, 3, 3, png(1))  # novo duplicado do conteúdo antigo
+    assert storage.read(6, 3, 3) == png(1)
+    assert storage.read(6, 1, 1) == png(2)
+    assert storage.blobs.lookup(content_hash(png(1))) != (6, 1, 1)
+    storage.close()
+
+
+def test_dedup_survives_reopen(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(6, 1, 1, png(1))
+    storage.close()
+    storage = DirectoryStorage(tmp_path)
+    storage.write(6, 4, 4, png(1))
+    assert storage.dedup_hits == 1
+    storage.close()
+
+
+def test_concurrent_writers_of_the_same_content_share_one_copy(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    for seed in range(20):
+        barrier = threading.Barrier(8)
+
+        def write(i, seed=seed, barrier=barrier):
+            barrier.wait()
+            storage.write(10, seed, i, png(f'{seed}:', size=20_000))
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        inodes = {storage.tile_path(10, seed, i).stat().st_ino for i in range(8)}
+        assert len(inodes) == 1
+        canonical = storage.blobs.lookup(content_hash(png(f'{seed}:', size=20_000)))
+        assert storage.tile_path(*canonical).stat().st_ino in inodes
+    assert storage.dedup_hits == 20 * 7
+    assert not list((tmp_path / '.tmp').iterdir())
+    storage.close()
+
+
+def test_refresh_racing_a_duplicate_never_links_stale_bytes(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(10, 1, 1, png(1))
+    barrier = threading.Barrier(2)
+
+    def refresh():
+        barrier.wait()
+        storage.write(10, 1, 1, png(2))
+
+    def duplicate():
+        barrier.wait()
+        storage.write(10, 2, 2, png(1))
+
+    for _ in range(20):
+        threads = [threading.Thread(target=refresh), threading.Thread(target=duplicate)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert storage.read(10, 1, 1) == png(2)
+        assert storage.read(10, 2, 2) == png(1)
+        # O índice nunca aponta para um tile cujo conteúdo já mudou
+        for h in (content_hash(png(1)), content_hash(png(2))):
+            canonical = storage.blobs.lookup(h)
+            assert canonical is None or content_hash(storage.read(*canonical)) == h
+        storage.write(10, 1, 1, png(1))
+    storage.close()
+
+
+def test_mbtiles_round_trip(tmp_path):
+    storage = MBTilesStorage(tmp_path / 'tiles.mbtiles')
+    storage.write(6, 1, 2, png(1))
+    storage.write(6, 1, 3, png(1))
+    storage.close()
+    storage = MBTilesStorage(tmp_path / 'tiles.mbtiles').scan([6])
+    assert storage.read(6, 1, 2) == png(1)
+    assert sorted(storage.tiles()) == [(6, 1, 2), (6, 1, 3)]
+    assert storage.conn.execute('SELECT COUNT(*) FROM images').fetchone()[0] == 1
+    storage.close()
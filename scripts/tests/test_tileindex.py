@@ -0,0 +1,109 @@
+import io
+import os
+
+from PIL import Image
+
+from conftest import png
+from tilelib.storage import DirectoryStorage, content_hash
+from tilelib.tileindex import INVENTORY_INDEX_FILENAME, TileIndex
+
+
+def hashes(index, z):
+    return {(x, y): h for x, y, h in index.conn.execute('SELECT x, y, hash FROM tiles WHERE z = ?', (z,))}
+
+
+def test_own_writes_do_not_make_dirs_stale(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    for y in range(5):
+        storage.write(8, 1, y, png(y))
+    storage.write(8, 2, 0, png(9))
+    storage.flush()
+
+    assert storage.index.stale_dirs(tmp_path) == ([], [])
+    assert storage.index.reconcile(tmp_path) == 0
+    assert hashes(storage.index, 8)[(1, 3)] == content_hash(png(3))
+    storage.close()
+
+
+def test_reconcile_keeps_hashes_of_unchanged_files(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    for y in range(3):
+        storage.write(8, 1, y, png(y))
+    storage.close()
+
+    # Arquivo gravado por fora do storage: o diretório tem de ser relido
+    (tmp_path / '8' / '1' / '7.png').write_bytes(png(7))
+    index = TileIndex(tmp_path / INVENTORY_INDEX_FILENAME)
+    assert index.reconcile(tmp_path) == 1
+    known = hashes(index, 8)
+    assert known[(1, 7)] is None  # sem verify_crc não há hash novo
+    assert [known[(1, y)] for y in range(3)] == [content_hash(png(y)) for y in range(3)]
+
+    # Conteúdo trocado por fora: o hash antigo não pode sobreviver
+    os.unlink(tmp_path / '8' / '1' / '0.png')
+    (tmp_path / '8' / '1' / '0.png').write_bytes(png(100, size=500))
+    assert index.reconcile(tmp_path) == 1
+    assert hashes(index, 8)[(1, 0)] is None
+    index.close()
+
+
+def test_existing_unindexed_dir_is_still_read(tmp_path):
+    (tmp_path / '8' / '1').mkdir(parents=True)
+    (tmp_path / '8' / '1' / '5.png').write_bytes(png(5))
+    storage = DirectoryStorage(tmp_path)
+    storage.write(8, 1, 6, png(6))
+    storage.flush()
+    assert storage.index.reconcile(tmp_path) == 1
+    assert set(hashes(storage.index, 8)) == {(1, 5), (1, 6)}
+    storage.close()
+
+
+def test_total_size_does_not_reconcile(tmp_path, monkeypatch):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(8, 1, 0, png(0))
+    storage.write(8, 1, 1, png(0))  # hardlink: conta uma vez
+    monkeypatch.setattr(TileIndex, 'reconcile', lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    assert storage.total_size() == len(png(0))
+    storage.close()
+    assert storage.total_size() == len(png(0))
+
+
+def test_aggregates_count_hardlinks_once(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(8, 1, 0, png(0))
+    storage.write(8, 1, 1, png(0))  # hardlink do anterior
+    storage.write(9, 2, 0, png(1, size=500))
+    storage.flush()
+    index = storage.index
+    assert index.zoom_stats() == {8: (2, 2 * len(png(0)), len(png(0)), len(png(0))),
+                                  9: (1, len(png(1, size=500)), len(png(1, size=500)), len(png(1, size=500)))}
+    count, logical, unique, shared = index.totals()
+    assert (count, shared) == (3, 1)
+    assert logical - unique == len(png(0))
+    storage.close()
+
+
+def real_png():
+    buf = io.BytesIO()
+    Image.new('RGB', (256, 256), (170, 211, 223)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def test_reconcile_records_integrity_problems(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    storage.write(8, 1, 0, real_png())
+    storage.close()
+    (tmp_path / '8' / '1' / '1.png').write_bytes(b'<html>Too Many Requests</html>' + b' ' * 100)
+    (tmp_path / '8' / '2').mkdir()
+    (tmp_path / '8' / '2' / '0.png').write_bytes(b'')
+
+    storage = DirectoryStorage(tmp_path)
+    assert storage.index.reconcile(tmp_path) == 2
+    assert [row[:4] for row in storage.index.problems()] == [(8, 2, 0, 'empty'), (8, 1, 1, 'html')]
+    # Diretório removido some do índice
+    for path in (tmp_path / '8' / '2').iterdir():
+        path.unlink()
+    (tmp_path / '8' / '2').rmdir()
+    storage.index.reconcile(tmp_path)
+    assert [row[:4] for row in storage.index.problems()] == [(8, 1, 1, 'html')]
+    storage.close()
@@ -0,0 +1,89 @@
+import numpy as np
+
+from tilelib.landmask import LandMask
+from tilelib.region import SOUTH_AMERICA_BOUNDS_LAND, expected_tiles
+from tilelib.tiling import (bbox_tile_range, bbox_tiles, count_bbox_tiles, count_polygon_tiles, deg2num,
+                            deg2num_array, hilbert_codes, morton_codes, num2deg_array, quadkey, quadkey_prefix,
+                            quadkey_to_tile, shard_of, tile_bbox)
+
+
+def test_deg2num_known_tiles():
+    assert deg2num(0.0, 0.0, 1) == (1, 1)
+    assert deg2num(85.0511287798066, -180.0, 3) == (0, 0)
+    assert deg2num(-90.0, 180.0, 3) == (7, 7)  # fora do Mercator: preso na borda
+    assert deg2num(-3.1190, -60.0217, 12) == (1365, 2083)  # Manaus
+
+
+def test_num2deg_is_inverse_of_deg2num_at_tile_corners():
+    x = np.arange(0, 4096, 37)
+    y = np.arange(0, 4096, 41)[:x.size]
+    lat, lon = num2deg_array(x, y, 12)
+    # Um pouco para dentro do tile, longe do arredondamento da borda
+    xs, ys = deg2num_array(lat - 1e-6, lon + 1e-6, 12)
+    assert (xs == x).all() and (ys == y).all()
+
+
+def test_tile_bbox_contains_its_points():
+    west, south, east, north = tile_bbox(12, 1365, 2083)
+    assert west <= -60.0217 <= east and south <= -3.1190 <= north
+
+
+def test_bbox_counts_are_exact():
+    for zoom in (5, 8, 10):
+        tiles = bbox_tiles(SOUTH_AMERICA_BOUNDS_LAND, zoom)
+        assert len(tiles) == count_bbox_tiles(SOUTH_AMERICA_BOUNDS_LAND, zoom)
+        x_min, x_max, y_min, y_max = bbox_tile_range(SOUTH_AMERICA_BOUNDS_LAND, zoom)
+        assert tiles[:, 0].min() == x_min and tiles[:, 1].max() == y_max
+        assert len({tuple(t) for t in tiles.tolist()}) == len(tiles)
+
+
+def test_quadkey_round_trip_and_morton_prefix():
+    for z, x, y in [(1, 1, 0), (3, 5, 2), (12, 1365, 2083)]:
+        key = quadkey(z, x, y)
+        assert len(key) == z and quadkey_to_tile(key) == (z, x, y)
+        assert int(morton_codes(x, y)) == int(key, 4)
+        if z >= 2:
+            assert quadkey_prefix(z, x, y, 2) == int(key[:2], 4)
+    # Acima do nível: o quadrante do canto noroeste
+    assert quadkey_prefix(1, 1, 0, 2) == int(quadkey(2, 2, 0), 4)
+
+
+def test_polygon_count_matches_the_plan():
+    landmask = LandMask()
+    for zoom in (6, 8):
+        assert count_polygon_tiles(landmask, zoom, SOUTH_AMERICA_BOUNDS_LAND) == expected_tiles(zoom, 5, landmask)
+    assert count_polygon_tiles(landmask, 6) >= count_polygon_tiles(landmask, 6, SOUTH_AMERICA_BOUNDS_LAND)
+
+
+def test_shards_keep_quadrants_together_and_cover_every_tile():
+    shards = 4
+    seen = set()
+    for x in range(0, 64):
+        for y in range(0, 64):
+            shard = shard_of(12, 1344 + x, 2048 + y, shards)
+            assert 0 <= shard < shards
+            # 16×16 tiles em z12 = um prefixo de nível 8
+            assert shard == shard_of(12, (1344 + x) & ~15, (2048 + y) & ~15, shards)
+            seen.add(shard)
+    assert seen == set(range(shards))
+
+
+def test_shards_split_the_plan_into_disjoint_parts():
+    plan = {(z, int(x), int(y)) for z in range(6, 11) for x, y in bbox_tiles(SOUTH_AMERICA_BOUNDS_LAND, z)}
+    shards = 3
+    parts = [{t for t in plan if shard_of(*t, shards) == shard} for shard in range(shards)]
+    assert sum(len(part) for part in parts) == len(plan)
+    assert set().union(*parts) == plan
+    # Equilíbrio grosseiro: nenhum shard com mais que o dobro da média
+    assert all(0 < len(part) < 2 * len(plan) / shards for part in parts)
+
+
+def test_hilbert_visits_each_cell_once_with_unit_steps():
+    order = 4
+    n = 1 << order
+    xs, ys = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    codes = hilbert_codes(xs.ravel(), ys.ravel(), order)
+    assert sorted(codes.tolist()) == list(range(n * n))
+    path = np.column_stack((xs.ravel(), ys.ravel()))[np.argsort(codes)]
+    steps = np.abs(np.diff(path, axis=0)).sum(axis=1)
+    assert (steps == 1).all()
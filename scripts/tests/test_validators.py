@@ -0,0 +1,46 @@
+from tilelib import validators
+from tilelib.validators import ValidatorIndex
+
+
+def test_conditional_headers_fall_back_to_mtime(tmp_path):
+    index = ValidatorIndex(tmp_path / 'v.sqlite')
+    assert index.conditional_headers(8, 1, 1) == {}
+    assert index.conditional_headers(8, 1, 1, fallback_mtime=0) == {
+        'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'}
+
+    index.record(8, 1, 1, etag='"abc"', last_modified='Tue, 05 May 2026 10:00:00 GMT')
+    index.flush()
+    assert index.conditional_headers(8, 1, 1, fallback_mtime=0) == {
+        'If-None-Match': '"abc"', 'If-Modified-Since': 'Tue, 05 May 2026 10:00:00 GMT'}
+    index.close()
+
+
+def test_304_keeps_validators_and_changed_at(tmp_path, monkeypatch):
+    now = 1_700_000_000
+    monkeypatch.setattr(validators.time, 'time', lambda: now)
+    index = ValidatorIndex(tmp_path / 'v.sqlite')
+    index.record(8, 1, 1, etag='"abc"')
+    index.flush()
+    now += 100
+    index.record(8, 1, 1, changed=False)  # 304 sem headers
+    index.flush()
+    assert index.get(8, 1, 1) == ('"abc"', None)
+    row = index.conn.execute('SELECT checked_at, changed_at FROM validators').fetchone()
+    assert row == (1_700_000_100, 1_700_000_000)
+    index.close()
+
+
+def test_due_orders_by_age_or_zoom(tmp_path, monkeypatch):
+    now = 1_700_000_000
+    monkeypatch.setattr(validators.time, 'time', lambda: now)
+    index = ValidatorIndex(tmp_path / 'v.sqlite')
+    index.record(9, 0, 0)
+    now += 10
+    index.record(8, 0, 0)
+    index.ensure([(10, 0, 0), (8, 0, 0)])  # (8, 0, 0) já conhecido: fica como está
+    now += 3600
+
+    assert index.due(8, 10, 60) == [(10, 0, 0), (9, 0, 0), (8, 0, 0)]
+    assert index.due(8, 10, 60, order='zoom') == [(8, 0, 0), (9, 0, 0), (10, 0, 0)]
+    assert index.due(8, 9, 3605) == [(9, 0, 0)]
+    index.close()
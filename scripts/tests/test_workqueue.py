@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from tilelib.workqueue import run_pipeline
+
+
+def tiles(n, produced=None):
+    for i in range(n):
+        if produced is not None:
+            produced.append(i)
+        yield 8, i, 0
+
+
+def test_every_tile_handled_once_with_bounded_concurrency():
+    active = []
+    peak = []
+    done = {}
+
+    async def handle(z, x, y):
+        active.append(x)
+        peak.append(len(active))
+        await asyncio.sleep(0)
+        active.remove(x)
+        return True, 'downloaded'
+
+    asyncio.run(run_pipeline(tiles(200), handle, workers=5, on_done=done.__setitem__))
+    assert sorted(done) == [(8, i, 0) for i in range(200)]
+    assert set(done.values()) == {(True, 'downloaded')}
+    assert max(peak) == 5
+
+
+def test_producer_waits_for_the_workers():
+    produced = []
+    gate = asyncio.Event()
+
+    async def handle(z, x, y):
+        await gate.wait()
+        return True, 'downloaded'
+
+    async def scenario():
+        task = asyncio.ensure_future(run_pipeline(tiles(10_000, produced), handle, workers=3, queue_size=6))
+        for _ in range(50):
+            await asyncio.sleep(0)
+        # 3 tiles nos workers + 6 na fila + 1 esperando o put: o gerador não corre na frente
+        assert len(produced) <= 3 + 6 + 1
+        gate.set()
+        await task
+
+    asyncio.run(scenario())
+    assert len(produced) == 10_000
+
+
+def test_should_stop_drains_without_handling_the_rest():
+    handled = []
+
+    async def handle(z, x, y):
+        handled.append(x)
+        await asyncio.sleep(0)
+        return True, 'downloaded'
+
+    asyncio.run(asyncio.wait_for(
+        run_pipeline(tiles(10_000), handle, workers=4, should_stop=lambda: len(handled) >= 20), timeout=5))
+    assert 20 <= len(handled) < 40
+
+
+def test_failing_handle_becomes_an_error_result():
+    done = {}
+
+    async def handle(z, x, y):
+        if x % 3 == 0:
+            raise ValueError('tile ruim')
+        return True, 'downloaded'
+
+    asyncio.run(run_pipeline(tiles(30), handle, workers=4, on_done=done.__setitem__))
+    assert len(done) == 30
+    assert done[(8, 3, 0)] == (False, 'error_ValueError')
+    assert done[(8, 4, 0)] == (True, 'downloaded')
+
+
+def test_failing_on_done_stops_the_pipeline_and_propagates():
+    produced = []
+
+    async def handle(z, x, y):
+        await asyncio.sleep(0)
+        return True, 'downloaded'
+
+    def on_done(tile, result):
+        if tile[1] == 5:
+            raise OSError('disco cheio')
+
+    async def scenario():
+        with pytest.raises(OSError, match='disco cheio'):
+            await asyncio.wait_for(run_pipeline(tiles(10_000, produced), handle, workers=2, on_done=on_done,
+                                                queue_size=4), timeout=5)
+        # Produtor e workers cancelados: só a tarefa do teste continua viva
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(scenario())
+    assert len(produced) < 20
+
+
+def test_failing_tile_source_cancels_the_workers():
+    def broken_tiles():
+        yield from tiles(3)
+        raise RuntimeError('plano inválido')
+
+    async def handle(z, x, y):
+        await asyncio.sleep(10)
+        return True, 'downloaded'
+
+    async def scenario():
+        with pytest.raises(RuntimeError, match='plano inválido'):
+            await asyncio.wait_for(run_pipeline(broken_tiles(), handle, workers=3), timeout=5)
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_the_pipeline_shuts_the_workers_down():
+    started = []
+
+    async def handle(z, x, y):
+        started.append(x)
+        await asyncio.sleep(10)
+        return True, 'downloaded'
+
+    async def scenario():
+        task = asyncio.ensure_future(run_pipeline(tiles(100), handle, workers=4))
+        for _ in range(20):
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(scenario())
+    assert sorted(started) == [0, 1, 2, 3]
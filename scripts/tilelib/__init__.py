@@ -0,0 +1,6 @@
+"""
+Biblioteca compartilhada pelos scripts de tiles (download-tiles*.py, analyze-tiles.py).
+
+Os scripts ficam em scripts/ com nomes hifenizados e não são importáveis;
+tudo o que precisa ser reutilizado entre eles mora aqui.
+"""
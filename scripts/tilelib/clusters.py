@@ -0,0 +1,265 @@
+"""
+Índice de clusters de marcadores por zoom, pré-calculado e servido em tiles.
+
+O mapa dos artistas pede o conjunto inteiro de pontos ao WordPress e agrupa
+no navegador a cada movimento. Aqui o agrupamento é feito uma vez, offline,
+no mesmo esquema do supercluster:
+
+1. pontos projetados em Web Mercator normalizado ([0, 1] × [0, 1])
+2. do zoom máximo para o mínimo, cada ponto ainda livre junta os vizinhos
+   livres a menos de radius_px pixels (no zoom do nível) num cluster com o
+   centroide ponderado pela contagem; o resultado de um nível é a entrada
+   do nível de cima
+3. cada entidade de cada nível cai em exatamente um tile z/x/y, e cada tile
+   vira um GeoJSON estático ao lado dos tiles raster (tiles/clusters/)
+
+A busca de vizinhos usa o mesmo grid hash de fermat.find_overlaps (células do
+tamanho do raio, 9 células vizinhas via searchsorted), vetorizada por nível;
+só a passada gulosa que decide quem entra em cada cluster é sequencial.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from tilelib.fermat import COORD_DECIMALS
+from tilelib.tiling import MAX_LATITUDE
+
+CLUSTER_MIN_ZOOM = 0
+CLUSTER_MAX_ZOOM = 14     # último zoom agrupado; em +1 todos os pontos saem soltos
+CLUSTER_RADIUS_PX = 40    # raio de agrupamento em pixels de tela
+CLUSTER_MIN_POINTS = 2
+TILE_SIZE = 256
+INDEX_FILENAME = 'index.json'
+_CELL_SHIFT = 2 ** 32     # chave da célula = cx · 2³² + cy
+
+
+def project(lat, lon):
+    """Lat/lon (graus) → (x, y) em Web Mercator normalizado, origem no noroeste"""
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    x = np.asarray(lon, dtype=np.float64) / 360.0 + 0.5
+    y = 0.5 - np.arcsinh(np.tan(lat)) / (2 * np.pi)
+    return np.clip(x, 0.0, 1.0), np.clip(y, 0.0, 1.0)
+
+
+def unproject(x, y):
+    """Inverso de project(): (x, y) normalizados → (lat, lon) em graus"""
+    lon = (np.asarray(x, dtype=np.float64) - 0.5) * 360.0
+    lat = np.degrees(np.arctan(np.sinh((0.5 - np.asarray(y, dtype=np.float64)) * 2 * np.pi)))
+    return lat, lon
+
+
+def load_points(path):
+    """
+    Pontos de um CSV: coluna 'coordenada' ("lat,lon", saída do
+    fermat-coords.py) ou colunas lat/lon. Retorna (lat, lon, propriedades por
+    ponto) com post_id/en_id/locality quando o CSV os tem.
+    """
+    lat, lon, props = [], [], []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('coordenada'):
+                a, b = row['coordenada'].split(',')
+            elif row.get('lat') and row.get('lon'):
+                a, b = row['lat'], row['lon']
+            else:
+                continue
+            lat.append(float(a))
+            lon.append(float(b))
+            prop = {}
+            for name in ('post_id', 'en_id'):
+                if row.get(name):
+                    prop[name] = int(row[name])
+            if row.get('locality'):
+                prop['locality'] = row['locality']
+            props.append(prop)
+    return np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64), props
+
+
+def _neighbors(x, y, radius):
+    """
+    Vizinhos a menos de radius de cada ponto (sem ele mesmo), em CSR:
+    os vizinhos de i são indices[indptr[i]:indptr[i + 1]], em ordem crescente
+    """
+    n = x.size
+    cx = np.floor(x / radius).astype(np.int64)
+    cy = np.floor(y / radius).astype(np.int64)
+    key = cx * _CELL_SHIFT + cy
+    order = np.argsort(key, kind='stable')
+    sorted_keys = key[order]
+    points = np.arange(n)
+
+    pairs_i, pairs_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbor = key + dx * _CELL_SHIFT + dy
+            lo = np.searchsorted(sorted_keys, neighbor, 'left')
+            hi = np.searchsorted(sorted_keys, neighbor, 'right')
+            counts = hi - lo
+            if not counts.any():
+                continue
+            i = np.repeat(points, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            j = order[np.repeat(lo, counts) + offsets]
+            keep = (i != j) & ((x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 <= radius * radius)
+            pairs_i.append(i[keep])
+            pairs_j.append(j[keep])
+    i = np.concatenate(pairs_i) if pairs_i else np.empty(0, np.int64)
+    j = np.concatenate(pairs_j) if pairs_j else np.empty(0, np.int64)
+    by_point = np.lexsort((j, i))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(i, minlength=n), out=indptr[1:])
+    return indptr, j[by_point]
+
+
+class ClusterIndex:
+    """
+    Hierarquia de clusters de min_zoom a max_zoom (+ pontos soltos em
+    max_zoom + 1). Entidades 0..N-1 são os pontos de entrada; as seguintes
+    são clusters. levels[z] → array com as entidades visíveis no zoom z.
+    """
+
+    def __init__(self, lat, lon, min_zoom=CLUSTER_MIN_ZOOM, max_zoom=CLUSTER_MAX_ZOOM,
+                 radius_px=CLUSTER_RADIUS_PX, min_points=CLUSTER_MIN_POINTS):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.radius_px = radius_px
+        self.min_points = min_points
+        self.points = np.asarray(lat).size
+
+        px, py = project(lat, lon)
+        xs, ys = list(px.tolist()), list(py.tolist())
+        weights = [1] * self.points
+        self.expansion = [None] * self.points  # zoom em que o cluster se abre (None nos pontos)
+
+        ids = np.arange(self.points)
+        self.levels = {max_zoom + 1: ids}
+        for z in range(max_zoom, min_zoom - 1, -1):
+            ids = self._cluster_level(ids, z, xs, ys, weights)
+            self.levels[z] = ids
+
+        self.x = np.array(xs, dtype=np.float64)
+        self.y = np.array(ys, dtype=np.float64)
+        self.count = np.array(weights, dtype=np.int64)
+
+    def _cluster_level(self, ids, z, xs, ys, weights):
+        """Entidades do zoom z a partir das do zoom z + 1 (passada gulosa)"""
+        x = np.array([xs[e] for e in ids.tolist()], dtype=np.float64)
+        y = np.array([ys[e] for e in ids.tolist()], dtype=np.float64)
+        w = np.array([weights[e] for e in ids.tolist()], dtype=np.int64)
+        indptr, neighbors = _neighbors(x, y, self.radius_px / (TILE_SIZE * 2 ** z))
+
+        visited = np.zeros(ids.size, dtype=bool)
+        out = []
+        for i in range(ids.size):
+            if visited[i]:
+                continue
+            visited[i] = True
+            near = neighbors[indptr[i]:indptr[i + 1]]
+            near = near[~visited[near]]
+            total = int(w[i] + w[near].sum())
+            if not near.size or total < self.min_points:
+                out.append(int(ids[i]))
+                continue
+            visited[near] = True
+            members = np.append(i, near)
+            xs.append(float((x[members] * w[members]).sum() / total))
+            ys.append(float((y[members] * w[members]).sum() / total))
+            weights.append(total)
+            self.expansion.append(z + 1)
+            out.append(len(weights) - 1)
+        return np.array(out, dtype=np.int64)
+
+    def tiles(self, z):
+        """{(x, y): array de entidades} com as entidades do zoom z por tile"""
+        ids = self.levels[z]
+        n = 2 ** z
+        tx = np.minimum((self.x[ids] * n).astype(np.int64), n - 1)
+        ty = np.minimum((self.y[ids] * n).astype(np.int64), n - 1)
+        key = (tx << 32) | ty
+        order = np.argsort(key, kind='stable')
+        keys, starts = np.unique(key[order], return_index=True)
+        groups = np.split(ids[order], starts[1:])
+        return {(int(k >> 32), int(k & 0xFFFFFFFF)): group for k, group in zip(keys.tolist(), groups)}
+
+    def feature(self, entity, props=None):
+        """Feature GeoJSON de uma entidade: ponto com as propriedades do CSV ou cluster"""
+        lat, lon = unproject(self.x[entity], self.y[entity])
+        coordinates = [round(float(lon), COORD_DECIMALS), round(float(lat), COORD_DECIMALS)]
+        if entity < self.points:
+            properties = dict(props[entity]) if props else {}
+        else:
+            properties = {
+                'cluster': True,
+                'cluster_id': int(entity),
+                'point_count': int(self.count[entity]),
+                'expansion_zoom': self.expansion[entity],
+            }
+        return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': coordinates},
+                'properties': properties}
+
+
+def _write_json(path, data):
+    """Escrita atômica: o nginx nunca serve um JSON pela metade"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def write_cluster_tiles(index, out_dir, props=None, meta=None):
+    """
+    Gravar out_dir/{z}/{x}/{y}.json (FeatureCollection) para cada tile com
+    alguma entidade, de min_zoom a max_zoom + 1, e out_dir/index.json com os
+    parâmetros. JSONs de tiles que ficaram vazios desde a última execução são
+    removidos. Retorna ({z: {'entities', 'clusters', 'tiles', 'bytes',
+    'max_bytes'}}, nº de JSONs antigos removidos).
+    """
+    out_dir = Path(out_dir)
+    written = set()
+    stats = {}
+    for z in range(index.min_zoom, index.max_zoom + 2):
+        ids = index.levels[z]
+        sizes = []
+        for (x, y), group in index.tiles(z).items():
+            path = out_dir / str(z) / str(x) / f'{y}.json'
+            sizes.append(_write_json(path, {
+                'type': 'FeatureCollection',
+                'features': [index.feature(e, props) for e in group.tolist()],
+            }))
+            written.add(path)
+        stats[z] = {'entities': int(ids.size), 'clusters': int((ids >= index.points).sum()),
+                    'tiles': len(sizes), 'bytes': sum(sizes), 'max_bytes': max(sizes, default=0)}
+
+    stale = 0
+    for path in out_dir.glob('*/*/*.json'):
+        if path not in written and path.parts[-3].isdigit():
+            path.unlink()
+            stale += 1
+            for parent in (path.parent, path.parent.parent):
+                if any(parent.iterdir()):
+                    break
+                parent.rmdir()
+
+    _write_json(out_dir / INDEX_FILENAME, {
+        **(meta or {}),
+        'min_zoom': index.min_zoom,
+        'max_zoom': index.max_zoom,
+        'points_zoom': index.max_zoom + 1,
+        'radius_px': index.radius_px,
+        'tile_size': TILE_SIZE,
+        'points': index.points,
+        'tiles': {str(z): s['tiles'] for z, s in stats.items()},
+    })
+    return stats, stale
+
+
+def tile_size_summary(stats):
+    """(bytes do maior tile, bytes médio por tile) em todos os zooms"""
+    tiles = sum(s['tiles'] for s in stats.values())
+    total = sum(s['bytes'] for s in stats.values())
+    return max((s['max_bytes'] for s in stats.values()), default=0), (total / tiles if tiles else 0.0)
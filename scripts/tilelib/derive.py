@@ -0,0 +1,100 @@
+"""
+Derivação local de tiles ausentes a partir dos zooms vizinhos (Pillow).
+
+O download-tiles-essential.py só baixa z5-7 em volta das cidades e z8-12 vêm
+de um dump antigo, então há buracos em vários zooms. Em vez de pedir esses
+tiles à rede:
+- pirâmide (underzoom): o tile z é montado com os 4 filhos em z+1 e reduzido
+  2×; só quando todos os filhos em terra existem. Quadrante cujo filho a
+  máscara de terra descarta (oceano) fica com a cor de água do OSM Carto;
+  filho em terra que falta (ainda não baixado) adia o tile
+- overzoom: o tile z é recortado do ancestral existente mais próximo (até
+  MAX_OVERZOOM níveis acima) e ampliado
+Os workers do pool só leem PNGs e devolvem bytes; quem grava é o processo
+principal (DirectoryStorage, com dedup) e marca os tiles na tabela derived do
+TileIndex. Tiles já ampliados não servem de origem (ampliar ou reduzir de novo
+só acumula borrão).
+"""
+
+import io
+
+from PIL import Image
+
+TILE_SIZE = 256
+WATER_COLOR = (170, 211, 223)  # #aad3df — água do OSM Carto
+MAX_OVERZOOM = 4               # 256 px → recorte de 16 px no limite
+
+PYRAMID = 'pyramid'
+OVERZOOM = 'overzoom'
+
+
+def _load(path):
+    with Image.open(path) as image:
+        return image.convert('RGB')
+
+
+def _encode(image):
+    buf = io.BytesIO()
+    image.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def build_from_children(task):
+    """
+    Worker do pool: (z, x, y, [(dx, dy, caminho do filho)]) →
+    (z, x, y, bytes PNG ou None, erro ou None)
+    """
+    z, x, y, children = task
+    canvas = Image.new('RGB', (2 * TILE_SIZE, 2 * TILE_SIZE), WATER_COLOR)
+    try:
+        for dx, dy, path in children:
+            canvas.paste(_load(path), (dx * TILE_SIZE, dy * TILE_SIZE))
+    except (OSError, ValueError) as e:
+        return z, x, y, None, str(e)
+    return z, x, y, _encode(canvas.resize((TILE_SIZE, TILE_SIZE), Image.Resampling.LANCZOS)), None
+
+
+def crop_from_ancestor(task):
+    """
+    Worker do pool: (z, x, y, zoom do ancestral, caminho do ancestral) →
+    (z, x, y, bytes PNG ou None, erro ou None)
+    """
+    z, x, y, source_z, path = task
+    levels = z - source_z
+    span = TILE_SIZE >> levels
+    left = (x - ((x >> levels) << levels)) * span
+    top = (y - ((y >> levels) << levels)) * span
+    try:
+        image = _load(path)
+    except (OSError, ValueError) as e:
+        return z, x, y, None, str(e)
+    image = image.crop((left, top, left + span, top + span))
+    return z, x, y, _encode(image.resize((TILE_SIZE, TILE_SIZE), Image.Resampling.BICUBIC)), None
+
+
+def pyramid_tasks(z, wanted, children, tile_path, land_children):
+    """
+    Tarefas de pirâmide para os (x, y) ausentes em z cujos 4 filhos estão em
+    children ({(x, y)} utilizáveis em z+1) ou fora de land_children (tiles de
+    z+1 que a máscara de terra mantém: o que fica fora é água)
+    """
+    for x, y in wanted:
+        quadrants = [(dx, dy, (2 * x + dx, 2 * y + dy)) for dy in (0, 1) for dx in (0, 1)]
+        if any(child not in children and child in land_children for _, _, child in quadrants):
+            continue  # terra ainda sem tile: pintar de água mentiria
+        found = [(dx, dy, str(tile_path(z + 1, *child))) for dx, dy, child in quadrants if child in children]
+        if found:
+            yield z, x, y, found
+
+
+def overzoom_tasks(z, wanted, sources, tile_path, max_levels=MAX_OVERZOOM):
+    """
+    Tarefas de overzoom para os (x, y) ausentes em z, a partir do ancestral
+    mais próximo em sources ({zoom: {(x, y)}} utilizáveis)
+    """
+    for x, y in wanted:
+        for levels in range(1, min(max_levels, z) + 1):
+            ancestor = (x >> levels, y >> levels)
+            if ancestor in sources.get(z - levels, ()):
+                yield z, x, y, z - levels, str(tile_path(z - levels, *ancestor))
+                break
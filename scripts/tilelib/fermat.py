@@ -0,0 +1,269 @@
+"""
+Espiral de Fermat vetorizada para as coordenadas dos artistas do Atlas.
+
+05-fermat-coords.php e disperse_duplicate_coords.php calculam a espiral ponto
+a ponto dentro do WordPress, agrupando um post por vez. Aqui todas as
+localidades saem de uma única passada NumPy: os pontos de todos os grupos
+ficam em arrays planos (grupo de cada ponto + índice dentro do grupo) e
+ângulo, raio e correção de longitude são operações sobre o array inteiro.
+
+Mesmas fórmulas dos scripts PHP:
+- ângulo dourado: θ = i · π(3 − √5)
+- raio sqrt: r = r_max · √(i / n), com r_max = raio_km / 111 · 0.98
+- longitude corrigida por cos(lat) do centro
+A variante disperse=True reproduz disperse_duplicate_coords.php (r = √(i / (n − 1)),
+sem o fator 0.98, cos(lat) ≥ 0.01): o ponto 0 fica no centro e o último na borda.
+
+Cada espiral é gerada isolada, então localidades vizinhas (Ananindeua e
+Marituba a 3 km, aliases com o mesmo centroide) podem sobrepor pontos.
+find_overlaps() acha os pares de localidades diferentes mais próximos que a
+separação mínima com um grid hash (células do tamanho da separação, chaves
+ordenadas + searchsorted nas 9 células vizinhas: O(n log n), sem comparar
+todos os pares), e separate_spirals() gira ou encolhe as espirais culpadas
+até não sobrar sobreposição.
+"""
+
+import json
+import math
+import unicodedata
+
+import numpy as np
+
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+KM_PER_DEGREE = 111.0
+RIM_FACTOR = 0.98        # 05-fermat-coords.php: margem para não encostar no raio
+DEFAULT_RADIUS_KM = 12   # centroide sem radius_km
+COORD_DECIMALS = 7
+
+EARTH_RADIUS_M = 6371008.8
+MIN_SEPARATION_M = 500      # entre pontos de localidades diferentes
+ROTATIONS = 8               # giros testados por rodada: k · 45°
+ROTATION_STEP = 2 * math.pi / ROTATIONS
+SHRINK_FACTOR = 0.85
+MIN_SCALE = 0.3             # não encolher abaixo de 30% do raio do centroide
+MAX_ROUNDS = 30
+_CELL_SHIFT = 2 ** 32       # chave da célula = cx · 2³² + cy
+
+
+def locality_key(cidade, estado):
+    """Chave do centroides.json: 'Cidade | Estado' ou '(estado) Estado' (NFC)"""
+    cidade = (cidade or '').strip()
+    estado = (estado or '').strip()
+    if not cidade and not estado:
+        return None
+    key = f'{cidade} | {estado}' if cidade else f'(estado) {estado}'
+    # O banco pode ter "ã" decomposto (NFD)
+    return unicodedata.normalize('NFC', key)
+
+
+def load_centroids(path):
+    """{chave NFC: (lat, lon, raio_km)}"""
+    with open(path, encoding='utf-8') as f:
+        raw = json.load(f)
+    return {
+        unicodedata.normalize('NFC', key): (float(info['lat']), float(info['lon']),
+                                            float(info.get('radius_km', DEFAULT_RADIUS_KM)))
+        for key, info in raw.items()
+    }
+
+
+def fermat_spirals(lat, lon, counts, radius_km, disperse=False, phase=None, scale=None):
+    """
+    Todas as espirais de uma vez. lat/lon/radius_km: centro e raio de cada
+    grupo; counts: pontos por grupo; phase (rad) e scale (fração do raio)
+    opcionais por grupo, usados por separate_spirals(). Retorna
+    (lat, lon, grupo, índice) por ponto, grupos em ordem e pontos de cada
+    grupo consecutivos.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    radius_km = np.asarray(radius_km, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+
+    group = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    index = np.arange(group.size) - starts[group]
+    n = counts[group]
+    center_lat = lat[group]
+
+    cos_lat = np.cos(np.radians(center_lat))
+    if disperse:
+        r = np.sqrt(index / np.maximum(1, n - 1)) * (radius_km[group] / KM_PER_DEGREE)
+        cos_lat = np.maximum(0.01, cos_lat)
+    else:
+        r = (radius_km[group] / KM_PER_DEGREE * RIM_FACTOR) * np.sqrt(index / n)
+        cos_lat = np.where(cos_lat == 0, 0.001, cos_lat)  # `?: 0.001` do PHP
+    theta = index * GOLDEN_ANGLE
+    if phase is not None:
+        theta = theta + np.asarray(phase, dtype=np.float64)[group]
+    if scale is not None:
+        r = r * np.asarray(scale, dtype=np.float64)[group]
+    out_lat = np.round(center_lat + r * np.sin(theta), COORD_DECIMALS)
+    out_lon = np.round(lon[group] + r * np.cos(theta) / cos_lat, COORD_DECIMALS)
+    return out_lat, out_lon, group, index
+
+
+def _planar(lat, lon):
+    """Equirretangular local em metros (distâncias de poucos km)"""
+    lat_rad = np.radians(lat)
+    return np.radians(lon) * EARTH_RADIUS_M * np.cos(lat_rad), lat_rad * EARTH_RADIUS_M
+
+
+def find_overlaps(lat, lon, group, min_separation_m=MIN_SEPARATION_M):
+    """
+    Pares de pontos de grupos diferentes a menos de min_separation_m.
+    Retorna (i, j, distância em m) com i < j, índices nos arrays de entrada.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    group = np.asarray(group)
+    x, y = _planar(lat, lon)
+    cx = np.floor(x / min_separation_m).astype(np.int64)
+    cy = np.floor(y / min_separation_m).astype(np.int64)
+    key = cx * _CELL_SHIFT + cy
+    order = np.argsort(key, kind='stable')
+    sorted_keys = key[order]
+    points = np.arange(key.size)
+
+    pairs_i, pairs_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbor = key + dx * _CELL_SHIFT + dy
+            lo = np.searchsorted(sorted_keys, neighbor, 'left')
+            hi = np.searchsorted(sorted_keys, neighbor, 'right')
+            counts = hi - lo
+            if not counts.any():
+                continue
+            i = np.repeat(points, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            j = order[np.repeat(lo, counts) + offsets]
+            keep = (i < j) & (group[i] != group[j])
+            pairs_i.append(i[keep])
+            pairs_j.append(j[keep])
+    if not pairs_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    # Distância com cos da latitude média do par (x acima usa a de cada ponto)
+    mean_lat = np.radians((lat[i] + lat[j]) / 2)
+    dist = EARTH_RADIUS_M * np.hypot(np.radians(lon[i] - lon[j]) * np.cos(mean_lat),
+                                     np.radians(lat[i] - lat[j]))
+    close = dist < min_separation_m
+    return i[close], j[close], dist[close]
+
+
+def _overlap_counts(lat, lon, counts, radius_km, phase, scale, min_separation_m):
+    out_lat, out_lon, group, index = fermat_spirals(lat, lon, counts, radius_km, phase=phase, scale=scale)
+    i, j, dist = find_overlaps(out_lat, out_lon, group, min_separation_m)
+    per_group = np.bincount(group[i], minlength=len(counts)) + np.bincount(group[j], minlength=len(counts))
+    return (out_lat, out_lon, group, index), (i, j, dist), per_group
+
+
+def separate_spirals(lat, lon, counts, radius_km, min_separation_m=MIN_SEPARATION_M, max_rounds=MAX_ROUNDS):
+    """
+    fermat_spirals() + correção das sobreposições entre localidades.
+    A cada rodada, de cada par sobreposto sai uma espiral culpada: a que pode
+    mover o ponto (índice > 0; o centro nunca sai do lugar), de preferência a
+    com menos pontos. Cada culpada testa os giros de ROTATION_STEP e os mesmos
+    giros com o raio × SHRINK_FACTOR (até MIN_SCALE), e fica com o que deixa
+    menos sobreposições nela — só se melhorar. Para quando nenhuma melhora.
+    Retorna (lat, lon, grupo, índice, phase, scale, sobreposições restantes
+    (i, j, distância)) do melhor estado visto; sem sobreposição, o resultado
+    é o do fermat_spirals().
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    phase = np.zeros(len(counts))
+    scale = np.ones(len(counts))
+    points, overlaps, per_group = _overlap_counts(lat, lon, counts, radius_km, phase, scale, min_separation_m)
+    candidates = [(k * ROTATION_STEP, factor) for factor in (1.0, SHRINK_FACTOR)
+                  for k in range(ROTATIONS) if (k, factor) != (0, 1.0)]
+    for _ in range(max_rounds):
+        i, j, _dist = overlaps
+        if not i.size:
+            break
+        group, index = points[2], points[3]
+        gi, gj = group[i], group[j]
+        movable_i = index[i] > 0
+        movable_j = index[j] > 0
+        pick_i = movable_i & (~movable_j | (counts[gi] < counts[gj]) | ((counts[gi] == counts[gj]) & (gi > gj)))
+        culprits = np.unique(np.where(pick_i, gi, gj)[movable_i | movable_j])
+        if not culprits.size:
+            break  # só centros colidindo (centroides repetidos): nada a girar ou encolher
+
+        # Todas as culpadas testam o mesmo candidato juntas (uma passada por candidato)
+        best = per_group[culprits].copy()
+        best_phase = phase[culprits].copy()
+        best_scale = scale[culprits].copy()
+        for delta, factor in candidates:
+            trial_phase = phase.copy()
+            trial_scale = scale.copy()
+            trial_phase[culprits] += delta
+            trial_scale[culprits] = np.maximum(MIN_SCALE, scale[culprits] * factor)
+            _, _, trial = _overlap_counts(lat, lon, counts, radius_km, trial_phase, trial_scale, min_separation_m)
+            better = trial[culprits] < best
+            best[better] = trial[culprits][better]
+            best_phase[better] = trial_phase[culprits][better]
+            best_scale[better] = trial_scale[culprits][better]
+
+        next_phase = phase.copy()
+        next_scale = scale.copy()
+        next_phase[culprits] = best_phase
+        next_scale[culprits] = best_scale
+        next_points, next_overlaps, next_per_group = _overlap_counts(
+            lat, lon, counts, radius_km, next_phase, next_scale, min_separation_m)
+        if next_overlaps[0].size >= overlaps[0].size:
+            break  # as escolhas de cada culpada se atrapalharam: fica o melhor estado
+        phase, scale = next_phase, next_scale
+        points, overlaps, per_group = next_points, next_overlaps, next_per_group
+    return (*points, phase % (2 * math.pi), scale, overlaps)
+
+
+def plan_coordinates(post_ids, keys, centroids, min_separation_m=None):
+    """
+    Agrupar posts por localidade e calcular a coordenada de cada um.
+    post_ids ordenados dentro do grupo (determinismo, como o sort() do PHP).
+    Retorna (plano, localidades sem centroide {chave: posts}); o plano é um
+    dict de arrays alinhados: post_id, key, index, lat, lon. Com
+    min_separation_m as espirais passam por separate_spirals() e o plano
+    ganha 'adjusted' ({chave: (giro em rad, escala)}) e 'overlaps' (pares
+    restantes [(post_id, post_id, distância em m)]).
+    """
+    post_ids = np.asarray(post_ids, dtype=np.int64)
+    keys = np.asarray(keys, dtype=object)
+    missing = {}
+    known = np.array([k in centroids for k in keys], dtype=bool)
+    for key in keys[~known]:
+        missing[key] = missing.get(key, 0) + 1
+
+    post_ids = post_ids[known]
+    keys = keys[known]
+    names, codes = np.unique(keys.astype(str), return_inverse=True)
+    order = np.lexsort((post_ids, codes))
+    counts = np.bincount(codes, minlength=len(names))
+    centers = np.array([centroids[name] for name in names], dtype=np.float64).reshape(-1, 3)
+    if min_separation_m:
+        lat, lon, group, index, phase, scale, (i, j, dist) = separate_spirals(
+            centers[:, 0], centers[:, 1], counts, centers[:, 2], min_separation_m)
+    else:
+        lat, lon, group, index = fermat_spirals(centers[:, 0], centers[:, 1], counts, centers[:, 2])
+    plan = {
+        'post_id': post_ids[order],
+        'key': names[group],
+        'index': index,
+        'lat': lat,
+        'lon': lon,
+    }
+    if min_separation_m:
+        changed = np.flatnonzero((phase != 0) | (scale != 1))
+        plan['adjusted'] = {str(names[g]): (float(phase[g]), float(scale[g])) for g in changed}
+        ids = plan['post_id']
+        plan['overlaps'] = list(zip(ids[i].tolist(), ids[j].tolist(), dist.tolist()))
+    return plan, missing
+
+
+def format_coord(lat, lon):
+    """'lat,lon' com até 7 casas, sem notação científica (meta 'coordenada')"""
+    def fmt(value):
+        text = f'{value:.{COORD_DECIMALS}f}'.rstrip('0').rstrip('.')
+        return '0' if text in ('', '-0') else text
+    return f'{fmt(lat)},{fmt(lon)}'
@@ -0,0 +1,155 @@
+"""
+Interface plugável de cliente HTTP para os downloaders.
+
+Os downloaders só precisam de `await client.get(url, headers)` → TileResponse
+(status, headers, content). Dois transportes:
+- AiohttpTileClient: o pool HTTP/1.1 de sempre (uma conexão por requisição em
+  voo — 50 sockets simultâneos no download-tiles.py, o que nos rendeu bloqueio)
+- Http2TileClient (--http2, requer `pip install 'httpx[http2]'`): multiplexa
+  todas as requisições em HTTP2_CONNECTIONS_PER_HOST conexões por espelho
+  (um httpx.AsyncClient por espelho: o limite do pool do httpx é global, e
+  um espelho lento não pode ficar com as conexões dos outros)
+Erros de transporte saem como asyncio.TimeoutError ou TileClientError nos dois,
+então o código de retry não depende do transporte. Como o cliente recebe URLs
+prontas, dá para apontá-lo para um servidor de tiles local nos testes.
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+import aiohttp
+
+HTTP2_CONNECTIONS_PER_HOST = 2
+CONNECT_TIMEOUT = 10
+
+
+class TileClientError(Exception):
+    """Falha de transporte (conexão recusada, reset, protocolo...)"""
+
+    def __init__(self, kind, message=''):
+        super().__init__(message or kind)
+        self.kind = kind  # nome da exceção original, usado nas estatísticas de erro
+
+
+class TileResponse:
+    """Resposta já lida: o corpo de um tile é pequeno"""
+
+    __slots__ = ('status', 'headers', 'content')
+
+    def __init__(self, status, headers, content):
+        self.status = status
+        self.headers = headers
+        self.content = content
+
+
+class AiohttpTileClient:
+    """HTTP/1.1 com pool de conexões do aiohttp"""
+
+    protocol = 'HTTP/1.1'
+
+    def __init__(self, headers=None, max_connections=50, max_per_host=0, timeout=30):
+        self.headers = headers
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=CONNECT_TIMEOUT)
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_per_host,
+            ttl_dns_cache=300,
+            force_close=False,
+            enable_cleanup_closed=True
+        )
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def get(self, url, headers=None):
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                content = await response.read()
+                return TileResponse(response.status, response.headers, content)
+        except aiohttp.ClientError as e:
+            raise TileClientError(type(e).__name__, str(e)) from e
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class Http2TileClient:
+    """HTTP/2 via httpx: muitas requisições multiplexadas em poucas conexões por espelho"""
+
+    protocol = 'HTTP/2'
+
+    def __init__(self, headers=None, connections_per_host=HTTP2_CONNECTIONS_PER_HOST, timeout=30):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("--http2 requer httpx com suporte a HTTP/2: pip install 'httpx[http2]'") from e
+        self.httpx = httpx
+        self.headers = headers
+        self.connections_per_host = connections_per_host
+        self.timeout = httpx.Timeout(timeout, connect=CONNECT_TIMEOUT)
+        self.clients = {}  # (scheme, host:porta) -> httpx.AsyncClient
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _client_for(self, url):
+        """Cliente do espelho da URL, criado na primeira requisição"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        client = self.clients.get(key)
+        if client is None:
+            httpx = self.httpx
+            client = httpx.AsyncClient(
+                http2=True,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.connections_per_host,
+                                    max_keepalive_connections=self.connections_per_host),
+            )
+            self.clients[key] = client
+        return client
+
+    async def get(self, url, headers=None):
+        try:
+            response = await self._client_for(url).get(url, headers=headers)
+        except self.httpx.TimeoutException as e:
+            raise asyncio.TimeoutError() from e
+        except self.httpx.HTTPError as e:
+            raise TileClientError(type(e).__name__, str(e)) from e
+        return TileResponse(response.status_code, response.headers, response.content)
+
+    async def close(self):
+        clients = list(self.clients.values())
+        self.clients = {}
+        for client in clients:
+            await client.aclose()
+
+
+def http2_available():
+    """httpx e h2 instalados?"""
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def open_client(http2=False, headers=None, max_connections=50, max_per_host=0, timeout=30):
+    """Escolher o transporte (usar com `async with`)"""
+    if http2:
+        return Http2TileClient(headers=headers, timeout=timeout)
+    return AiohttpTileClient(headers=headers, max_connections=max_connections,
+                             max_per_host=max_per_host, timeout=timeout)
@@ -0,0 +1,95 @@
+"""
+Inventário em memória dos tiles presentes no disco.
+
+Antes, cada tile era verificado com Path.exists() até três vezes (contagem,
+filtro da fila e de novo no download) — milhões de stat() em z=5-12 antes do
+primeiro byte. Aqui cada diretório tiles/{z}/{x}/ é lido uma única vez com
+os.scandir (zooms em paralelo) e todas as consultas de existência saem do
+conjunto em memória.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+def _scan_zoom(tiles_dir, z):
+    """Ler tiles/{z}/*/ e retornar (conjunto de (x, y), conjunto de x com diretório)"""
+    present = set()
+    x_dirs = set()
+    zoom_dir = os.path.join(tiles_dir, str(z))
+    try:
+        x_entries = os.scandir(zoom_dir)
+    except FileNotFoundError:
+        return present, x_dirs
+
+    with x_entries:
+        for x_entry in x_entries:
+            if not x_entry.name.isdigit() or not x_entry.is_dir(follow_symlinks=False):
+                continue
+            x = int(x_entry.name)
+            x_dirs.add(x)
+            with os.scandir(x_entry.path) as y_entries:
+                for y_entry in y_entries:
+                    name = y_entry.name
+                    if name.endswith('.png') and name[:-4].isdigit():
+                        present.add((x, int(name[:-4])))
+    return present, x_dirs
+
+
+class TileInventory:
+    """Tiles presentes por zoom, montado com uma varredura única por diretório"""
+
+    def __init__(self, tiles_dir):
+        self.tiles_dir = str(tiles_dir)
+        self.present = {}  # z -> {(x, y)}
+        self.x_dirs = {}   # z -> {x} com diretório já criado
+
+    def scan(self, zooms):
+        """Varrer os zooms informados (um thread por zoom)"""
+        zooms = [z for z in zooms if z not in self.present]
+        if not zooms:
+            return self
+        with ThreadPoolExecutor(max_workers=min(len(zooms), os.cpu_count() or 4)) as pool:
+            results = pool.map(lambda z: (z, _scan_zoom(self.tiles_dir, z)), zooms)
+            for z, (present, x_dirs) in results:
+                self.present[z] = present
+                self.x_dirs[z] = x_dirs
+        return self
+
+    def __contains__(self, tile):
+        z, x, y = tile
+        zoom = self.present.get(z)
+        if zoom is None:
+            self.scan([z])
+            zoom = self.present[z]
+        return (x, y) in zoom
+
+    def count(self, z=None):
+        if z is None:
+            return sum(len(p) for p in self.present.values())
+        return len(self.present.get(z, ()))
+
+    def add(self, z, x, y):
+        """Registrar um tile recém-gravado"""
+        self.present.setdefault(z, set()).add((x, y))
+
+    def ensure_dir(self, z, x):
+        """
+        Criar tiles/{z}/{x}/ só na primeira vez que o x aparece.
+        Retorna True se o diretório foi criado agora (começou vazio).
+        """
+        known = self.x_dirs.setdefault(z, set())
+        if x in known:
+            return False
+        zoom_dir = os.path.join(self.tiles_dir, str(z))
+        os.makedirs(zoom_dir, exist_ok=True)
+        try:
+            os.mkdir(os.path.join(zoom_dir, str(x)))
+            created = True
+        except FileExistsError:
+            created = False
+        known.add(x)
+        return created
+
+    def missing(self, tiles):
+        """Filtrar uma lista de (z, x, y) mantendo só os ausentes"""
+        return [t for t in tiles if t not in self]
@@ -0,0 +1,117 @@
+"""
+Journal de progresso append-only para retomar downloads após crash.
+
+Cada lote é uma linha JSON (JSON Lines) com os tiles concluídos, 404 e falhas:
+    {"ts": 1760000000, "done": [[z, x, y], ...], "404": [...], "failed": [[z, x, y, "erro"], ...]}
+A linha só é gravada depois de storage.flush(), então todo tile em "done" já
+está durável no storage (fsync do arquivo e do diretório, tilelib/storage.py).
+Na retomada, replay() reconstrói o estado lendo o arquivo uma vez (O(journal));
+uma última linha truncada pelo crash é ignorada. Os tiles concluídos já
+aparecem na varredura do storage; do journal saem os 404 (para o cache
+negativo) e as falhas.
+Ao fim de uma execução completa o journal é apagado.
+"""
+
+import json
+import os
+import time
+
+JOURNAL_BATCH = 200          # registros por linha
+JOURNAL_FLUSH_INTERVAL = 5.0 # s — grava mesmo com lote incompleto
+
+
+class ResumeState:
+    """Estado reconstruído de um journal de execução interrompida"""
+
+    def __init__(self):
+        self.done = set()
+        self.not_found = set()
+        self.failed = {}  # (z, x, y) -> erro
+        self.batches = 0
+
+    def __bool__(self):
+        return self.batches > 0
+
+
+def replay(path):
+    """Ler o journal (se existir) e retornar um ResumeState"""
+    state = ResumeState()
+    try:
+        f = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return state
+
+    with f:
+        for line in f:
+            try:
+                batch = json.loads(line)
+            except ValueError:
+                continue  # linha truncada pelo crash
+            state.batches += 1
+            for z, x, y in batch.get('done', ()):
+                state.done.add((z, x, y))
+                state.failed.pop((z, x, y), None)
+            for z, x, y in batch.get('404', ()):
+                state.not_found.add((z, x, y))
+                state.failed.pop((z, x, y), None)
+            for z, x, y, err in batch.get('failed', ()):
+                state.failed[(z, x, y)] = err
+    return state
+
+
+class DownloadJournal:
+    """Acumula resultados e grava em lotes (fsync por linha)"""
+
+    def __init__(self, path, before_flush=None):
+        self.path = path
+        self.before_flush = before_flush  # ex.: storage.flush — durabilidade antes do registro
+        self.done = []
+        self.not_found = []
+        self.failed = []
+        self.last_flush = time.monotonic()
+        self.f = open(path, 'a', encoding='utf-8')
+
+    def _pending(self):
+        return len(self.done) + len(self.not_found) + len(self.failed)
+
+    def record(self, z, x, y, ok, status):
+        """Registrar o resultado de download_tile_with_retry()"""
+        if status == 'downloaded':
+            self.done.append((z, x, y))
+        elif status == 'not_found':
+            self.not_found.append((z, x, y))
+        elif not ok:
+            self.failed.append((z, x, y, status))
+        else:
+            return  # 'exists' etc. não mudam estado
+
+        if self._pending() >= JOURNAL_BATCH or time.monotonic() - self.last_flush >= JOURNAL_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self._pending():
+            return
+        if self.before_flush is not None:
+            self.before_flush()
+        batch = {'ts': int(time.time())}
+        if self.done:
+            batch['done'] = self.done
+        if self.not_found:
+            batch['404'] = self.not_found
+        if self.failed:
+            batch['failed'] = self.failed
+        self.f.write(json.dumps(batch, separators=(',', ':')) + '\n')
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.done, self.not_found, self.failed = [], [], []
+
+    def close(self, completed=False):
+        """Gravar o que falta; com completed=True o journal é removido"""
+        self.flush()
+        self.f.close()
+        if completed:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
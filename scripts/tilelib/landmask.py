@@ -0,0 +1,149 @@
+"""
+Máscara de terra para o planejamento de tiles.
+
+Com bounds retangulares, ~62% das requisições em z=5-12 voltavam 404 (oceano,
+ver scripts/BOUNDS-OPTIMIZATION.md). Aqui a grade de cada zoom é cruzada com um
+contorno simplificado da América do Sul (data/south-america-land.geojson) antes
+de qualquer requisição: só entram na fila tiles que tocam terra.
+
+A rasterização desce a quadtree a partir de z=0 levando junto apenas as arestas
+do polígono que cruzam o tile pai:
+- tile sem arestas e com centro fora do polígono → descartado com todos os filhos
+- tile sem arestas e com centro dentro → todos os descendentes entram sem teste
+- tile com arestas → desce para os 4 filhos
+O custo fica proporcional ao litoral, não à área.
+"""
+
+import json
+from pathlib import Path
+
+from tilelib.tiling import tile_bbox
+
+LAND_GEOJSON = Path(__file__).parent / 'data' / 'south-america-land.geojson'
+
+# Folga em graus aplicada em volta de cada tile. O contorno é simplificado à mão
+# (~100 vértices), então a folga garante que tiles de litoral nunca fiquem de fora.
+LANDMASK_BUFFER_DEG = 0.5
+
+
+def load_rings(path=LAND_GEOJSON):
+    """Ler anéis (lista de (lon, lat)) de Polygon/MultiPolygon de um GeoJSON"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('type') == 'FeatureCollection':
+        geometries = [feat['geometry'] for feat in data['features']]
+    elif data.get('type') == 'Feature':
+        geometries = [data['geometry']]
+    else:
+        geometries = [data]
+
+    rings = []
+    for geom in geometries:
+        if geom['type'] == 'Polygon':
+            polygons = [geom['coordinates']]
+        elif geom['type'] == 'MultiPolygon':
+            polygons = geom['coordinates']
+        else:
+            continue
+        for polygon in polygons:
+            for ring in polygon:
+                rings.append([(float(lon), float(lat)) for lon, lat in ring])
+    return rings
+
+
+def _segment_hits_rect(edge, west, south, east, north):
+    """Liang-Barsky: o segmento toca o retângulo?"""
+    x1, y1, x2, y2 = edge
+    if max(x1, x2) < west or min(x1, x2) > east or max(y1, y2) < south or min(y1, y2) > north:
+        return False
+
+    dx = x2 - x1
+    dy = y2 - y1
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x1 - west), (dx, east - x1), (-dy, y1 - south), (dy, north - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return False
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return False
+            t1 = min(t1, t)
+    return t0 <= t1
+
+
+class LandMask:
+    """Seleciona os tiles de um zoom que intersectam o contorno de terra"""
+
+    def __init__(self, path=LAND_GEOJSON, buffer_deg=LANDMASK_BUFFER_DEG):
+        self.buffer_deg = buffer_deg
+        self.edges = []
+        for ring in load_rings(path):
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+                self.edges.append((x1, y1, x2, y2))
+
+    def contains(self, lon, lat):
+        """Ponto dentro do contorno (regra par-ímpar sobre todos os anéis)"""
+        inside = False
+        for x1, y1, x2, y2 in self.edges:
+            if (y1 > lat) != (y2 > lat):
+                if lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                    inside = not inside
+        return inside
+
+    def _buffered_bbox(self, z, x, y):
+        west, south, east, north = tile_bbox(z, x, y)
+        b = self.buffer_deg
+        return west - b, south - b, east + b, north + b
+
+    def tiles_for_zoom(self, zoom, x_range=None, y_range=None):
+        """
+        Gerar (x, y) do zoom que tocam terra, opcionalmente restritos a x_range/y_range
+        (os mesmos ranges que main() calcula a partir dos bounds).
+        """
+        n = 2 ** zoom
+        x_range = x_range if x_range is not None else range(n)
+        y_range = y_range if y_range is not None else range(n)
+        if not x_range or not y_range:
+            return
+
+        x_lo, x_hi = x_range[0], x_range[-1]
+        y_lo, y_hi = y_range[0], y_range[-1]
+
+        stack = [(0, 0, 0, self.edges)]
+        while stack:
+            z, x, y, edges = stack.pop()
+            d = zoom - z
+
+            # Faixa de descendentes no zoom alvo — podar o que cai fora dos bounds
+            cx_lo, cx_hi = x << d, ((x + 1) << d) - 1
+            cy_lo, cy_hi = y << d, ((y + 1) << d) - 1
+            if cx_hi < x_lo or cx_lo > x_hi or cy_hi < y_lo or cy_lo > y_hi:
+                continue
+
+            bbox = self._buffered_bbox(z, x, y)
+            local = [e for e in edges if _segment_hits_rect(e, *bbox)]
+
+            if not local:
+                west, south, east, north = bbox
+                if not self.contains((west + east) / 2, (south + north) / 2):
+                    continue
+                # Totalmente em terra: todos os descendentes entram
+                for tx in range(max(cx_lo, x_lo), min(cx_hi, x_hi) + 1):
+                    for ty in range(max(cy_lo, y_lo), min(cy_hi, y_hi) + 1):
+                        yield tx, ty
+                continue
+
+            if d == 0:
+                yield x, y
+                continue
+
+            for dx in (1, 0):
+                for dy in (1, 0):
+                    stack.append((z + 1, 2 * x + dx, 2 * y + dy, local))
@@ -0,0 +1,26 @@
+"""
+Importar os scripts hifenizados de scripts/ (download-tiles.py...) como módulo.
+
+Usado pelo bench-tiles.py, que roda os downloaders no processo medido, e
+pelos testes. Os scripts leem as opções de sys.argv na importação: aqui elas
+são só as informadas, não as de quem importa.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_script(name, argv=()):
+    """Importar scripts/<name>.py com sys.argv = [name, *argv] durante a importação"""
+    saved = sys.argv
+    sys.argv = [name, *argv]
+    try:
+        spec = importlib.util.spec_from_file_location(name.replace('-', '_'), SCRIPTS_DIR / f'{name}.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = saved
+    return module
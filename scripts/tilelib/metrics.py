@@ -0,0 +1,250 @@
+"""
+Métricas estruturadas dos downloaders: contadores, histogramas e gauges.
+
+A barra de progresso com \\r não serve para acompanhar uma execução de horas
+de fora do terminal. Aqui cada família de métricas tem rótulos fixos e as
+séries ficam num dict indexado pela tupla de valores dos rótulos, então
+registrar um tile custa uma busca em dict e uma soma (sem lock: tudo roda no
+event loop). Os gauges são funções avaliadas só na leitura (profundidade da
+fila, taxa do rate limiter...), sem custo por tile.
+
+Duas saídas:
+- serve_metrics(): endpoint HTTP local /metrics no formato texto do
+  Prometheus, ou OpenMetrics quando o Accept pede application/openmetrics-text
+- snapshot_loop(): uma linha JSON por intervalo (JSON Lines), para comparar
+  execuções ou ver a taxa caindo depois
+"""
+
+import asyncio
+import json
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+# s — da resposta local (ms) ao timeout do download-tiles.py (30 s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_JSON_INTERVAL = 30.0  # s entre snapshots JSON
+METRICS_HOST = '127.0.0.1'     # só local: as métricas não vão para a rede
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico; inc(chave, n) com chave = tupla dos valores dos rótulos"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, key=(), amount=1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def exposition(self, openmetrics):
+        for key, value in self.values.items():
+            yield f'{self.name}_total{_labels(self.labels, key)} {_number(value)}'
+
+    def snapshot(self):
+        return [{'labels': dict(zip(self.labels, key)), 'value': value}
+                for key, value in self.values.items()]
+
+
+class Histogram:
+    """
+    Histograma de buckets fixos. Cada série é uma lista
+    [contagem por bucket..., acima do último bucket, soma]; a forma cumulativa
+    do Prometheus só é montada na leitura.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, key, value):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _cumulative(self, series):
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+            running += count
+            yield bound, running
+
+    def quantile(self, series, q):
+        """Limite superior do bucket que contém o quantil q (None sem amostras)"""
+        counts = series[:-1]
+        target = q * sum(counts)
+        if not target:
+            return None
+        for bound, running in self._cumulative(series):
+            if running >= target:
+                return bound
+
+    def exposition(self, openmetrics):
+        for key, series in self.series.items():
+            count = 0
+            for bound, count in self._cumulative(series):
+                le = 'le="%s"' % _number(float(bound))
+                yield f'{self.name}_bucket{_labels(self.labels, key, le)} {count}'
+            yield f'{self.name}_count{_labels(self.labels, key)} {count}'
+            yield f'{self.name}_sum{_labels(self.labels, key)} {_number(float(series[-1]))}'
+
+    def snapshot(self):
+        out = []
+        for key, series in self.series.items():
+            count = sum(series[:-1])
+            p99 = self.quantile(series, 0.99)
+            out.append({
+                'labels': dict(zip(self.labels, key)),
+                'count': count,
+                'sum': round(series[-1], 6),
+                'p50': self.quantile(series, 0.5),
+                'p99': None if p99 == float('inf') else p99,  # JSON não tem infinito
+                'buckets': series[:-2],
+                'overflow': series[-2],
+            })
+        return out
+
+
+class Gauge:
+    """
+    Valor instantâneo lido de fn() na hora da exposição: um número, ou
+    {chave: número} para gauges com rótulos
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def _values(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            return list(value.items())
+        return [((), value)]
+
+    def exposition(self, openmetrics):
+        for key, value in self._values():
+            yield f'{self.name}{_labels(self.labels, key)} {_number(value)}'
+
+    def snapshot(self):
+        return [{'labels': dict(zip(self.labels, key)), 'value': value} for key, value in self._values()]
+
+
+class MetricsRegistry:
+    """Famílias de métricas de um processo (prefixo comum nos nomes)"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.families = []
+        self.started = time.time()
+
+    def _add(self, family):
+        family.name = f'{self.prefix}_{family.name}'
+        self.families.append(family)
+        return family
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self._add(Gauge(name, help, fn, labels))
+
+    def render(self, openmetrics=False):
+        """Texto de exposição (Prometheus 0.0.4 ou OpenMetrics 1.0)"""
+        lines = []
+        for family in self.families:
+            # No Prometheus 0.0.4 HELP/TYPE de um contador usam o nome da série (_total)
+            name = family.name + '_total' if family.kind == 'counter' and not openmetrics else family.name
+            lines.append(f'# HELP {name} {family.help}')
+            lines.append(f'# TYPE {name} {family.kind}')
+            lines.extend(family.exposition(openmetrics))
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Estado atual como dict serializável em JSON"""
+        return {
+            'ts': round(time.time(), 3),
+            'uptime': round(time.time() - self.started, 3),
+            'metrics': {family.name: family.snapshot() for family in self.families},
+        }
+
+
+async def serve_metrics(registry, port, host=METRICS_HOST):
+    """
+    Iniciar o endpoint /metrics no event loop atual.
+    Retorna o web.AppRunner (chamar `await runner.cleanup()` ao terminar).
+    """
+    async def metrics(request):
+        openmetrics = 'application/openmetrics-text' in request.headers.get('Accept', '')
+        return web.Response(
+            body=registry.render(openmetrics).encode(),
+            headers={'Content-Type': OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE},
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def _append_line(path, line):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+
+def write_snapshot(registry, path):
+    """Acrescentar um snapshot JSON (uma linha) ao arquivo"""
+    _append_line(path, json.dumps(registry.snapshot(), separators=(',', ':')) + '\n')
+
+
+async def snapshot_loop(registry, path, interval=METRICS_JSON_INTERVAL):
+    """Tarefa de fundo: um snapshot a cada `interval` s até ser cancelada"""
+    while True:
+        await asyncio.sleep(interval)
+        # Serializar no event loop (os dicts só mudam nele); só o disco vai para a thread
+        line = json.dumps(registry.snapshot(), separators=(',', ':')) + '\n'
+        await asyncio.to_thread(_append_line, path, line)
@@ -0,0 +1,142 @@
+"""
+Escolha de espelho (a/b/c.tile...) por latência e saúde, no lugar do round-robin.
+
+Com rotação cega um espelho lento ou limitando (429) recebia a mesma fatia do
+tráfego que um saudável, e o retry podia cair de novo no mesmo host. Aqui cada
+espelho tem:
+- latência EWMA e taxa de erro EWMA
+- requisições em andamento (inclui a espera pelo token do rate limiter)
+- contagem de 429/403/bloqueio
+A requisição nova vai para o espelho de menor custo (latência × fila ×
+penalidade de erro), evitando o host da tentativa anterior. 429/403 ou erros
+seguidos tiram o host de rotação por um cooldown exponencial.
+"""
+
+import time
+
+from tilelib.ratelimit import host_of
+
+EWMA_ALPHA = 0.2
+COOLDOWN_BASE = 10.0       # s — primeiro afastamento
+COOLDOWN_MAX = 300.0       # s
+ERRORS_BEFORE_COOLDOWN = 3 # erros seguidos (timeout, 5xx, conexão)
+INITIAL_LATENCY = 0.1      # s — palpite otimista até a primeira resposta
+
+
+class MirrorStats:
+    """Estado de um espelho"""
+
+    def __init__(self, server):
+        self.server = server
+        self.latency = None  # s (EWMA); None até a primeira resposta
+        self.error_rate = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.cooldowns = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def cost(self):
+        # Palpite otimista sem amostras: todo espelho novo é sondado logo no início
+        latency = self.latency if self.latency is not None else INITIAL_LATENCY
+        return latency * (1 + self.inflight) / (1.0 - min(self.error_rate, 0.9))
+
+    def observe(self, latency, failed):
+        self.requests += 1
+        if latency is not None:
+            self.latency = latency if self.latency is None else (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency)
+        self.error_rate = EWMA_ALPHA * (1.0 if failed else 0.0) + (1 - EWMA_ALPHA) * self.error_rate
+
+    def cool_down(self, now):
+        self.cooldowns += 1
+        self.down_until = now + min(COOLDOWN_MAX, COOLDOWN_BASE * 2 ** (self.consecutive_failures - 1))
+
+
+class MirrorScheduler:
+    """Seleciona o espelho para cada requisição e mede o resultado"""
+
+    def __init__(self, servers):
+        self.mirrors = {server: MirrorStats(server) for server in servers}
+
+    def pick(self, avoid=None):
+        """
+        Melhor espelho saudável (diferente de avoid, se houver outro).
+        Se todos estão em cooldown, o que volta primeiro.
+        """
+        now = time.monotonic()
+        healthy = [m for m in self.mirrors.values() if m.healthy(now)]
+        candidates = [m for m in healthy if m.server != avoid] or healthy
+        if candidates:
+            best = min(candidates, key=MirrorStats.cost)
+        else:
+            best = min(self.mirrors.values(), key=lambda m: m.down_until)
+        return best.server
+
+    async def fetch(self, client, server, url, headers=None, wait=None):
+        """
+        client.get() medindo latência e status para o espelho escolhido por
+        pick(). wait (ex.: lambda: limiter.acquire(host)) é aguardado antes da
+        requisição já contando como em andamento no espelho, e fora da latência;
+        a contagem volta no mesmo finally mesmo se a espera falhar ou for cancelada.
+        """
+        mirror = self.mirrors[server]
+        try:
+            mirror.inflight += 1
+            if wait is not None:
+                await wait()
+            start = time.monotonic()
+            try:
+                response = await client.get(url, headers=headers)
+            except Exception:
+                self.on_error(server)
+                raise
+        finally:
+            mirror.inflight -= 1
+        elapsed = time.monotonic() - start
+        if response.status in (429, 403):
+            mirror.observe(elapsed, failed=True)
+            self.on_throttle(server, observed=True)
+        elif response.status >= 500:
+            mirror.observe(elapsed, failed=True)
+            self._failure(mirror)
+        else:
+            mirror.observe(elapsed, failed=False)
+            mirror.consecutive_failures = 0
+        return response
+
+    def on_error(self, server):
+        """Timeout / erro de conexão: latência desconhecida, conta como falha"""
+        mirror = self.mirrors[server]
+        mirror.observe(None, failed=True)
+        self._failure(mirror)
+
+    def on_throttle(self, server, observed=False):
+        """429/403 ou imagem de bloqueio: fora de rotação imediatamente"""
+        mirror = self.mirrors[server]
+        if not observed:
+            mirror.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * mirror.error_rate
+        mirror.throttled += 1
+        mirror.consecutive_failures += 1
+        mirror.cool_down(time.monotonic())
+
+    def _failure(self, mirror):
+        mirror.errors += 1
+        mirror.consecutive_failures += 1
+        if mirror.consecutive_failures >= ERRORS_BEFORE_COOLDOWN:
+            mirror.cool_down(time.monotonic())
+
+    def summary(self):
+        """Linhas legíveis com as estatísticas de cada espelho"""
+        lines = []
+        for m in self.mirrors.values():
+            latency = f"{m.latency * 1000:.0f} ms" if m.latency is not None else "n/a"
+            lines.append(f"{host_of(m.server)}: {m.requests:,} req, latência {latency}, "
+                         f"erro {m.error_rate * 100:.1f}%, {m.errors:,} erros, "
+                         f"{m.throttled:,} 429/403, {m.cooldowns} afastamentos")
+        return lines
@@ -0,0 +1,89 @@
+"""
+Cache negativo persistente de tiles 404.
+
+Tiles de oceano/áreas vazias voltam 404 e, sem memória, cada nova execução (e
+cada passada de filtro) pedia os mesmos ~400k tiles de novo. Os 404 ficam numa
+tabela sqlite (z, x, y, ts) com TTL; o planejador consulta antes de montar a
+fila e os dois downloaders (download-tiles.py e download-tiles-essential.py)
+gravam nela.
+"""
+
+import time
+
+from tilelib.sqlitedb import connect
+
+NEGATIVE_CACHE_FILENAME = '.notfound.sqlite'
+NEGATIVE_CACHE_TTL_DAYS = 30  # depois disso o tile volta a ser tentado
+FLUSH_EVERY = 500  # 404s acumulados em memória antes de gravar
+
+
+class NegativeCache:
+    """Tabela (z, x, y) → timestamp do último 404"""
+
+    def __init__(self, path, ttl_days=NEGATIVE_CACHE_TTL_DAYS):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.pending = []
+        self.loaded = {}  # z -> {(x, y)} carregado sob demanda por known()
+        self.conn = connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS notfound ('
+            ' z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,'
+            ' ts INTEGER NOT NULL,'
+            ' PRIMARY KEY (z, x, y)) WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def _cutoff(self):
+        return int(time.time()) - self.ttl_seconds
+
+    def load_zoom(self, z):
+        """Conjunto de (x, y) ainda válidos (dentro do TTL) para o zoom"""
+        rows = self.conn.execute(
+            'SELECT x, y FROM notfound WHERE z = ? AND ts >= ?', (z, self._cutoff())
+        )
+        return {(x, y) for x, y in rows}
+
+    def __contains__(self, tile):
+        z, x, y = tile
+        row = self.conn.execute(
+            'SELECT 1 FROM notfound WHERE z = ? AND x = ? AND y = ? AND ts >= ?',
+            (z, x, y, self._cutoff())
+        ).fetchone()
+        return row is not None
+
+    def add(self, z, x, y):
+        """Registrar um 404 (gravado em lote a cada FLUSH_EVERY)"""
+        self.pending.append((z, x, y, int(time.time())))
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO notfound (z, x, y, ts) VALUES (?, ?, ?, ?)', self.pending
+        )
+        self.conn.commit()
+        self.pending = []
+
+    def purge_expired(self):
+        """Remover entradas vencidas; retorna quantas saíram"""
+        cur = self.conn.execute('DELETE FROM notfound WHERE ts < ?', (self._cutoff(),))
+        self.conn.commit()
+        return cur.rowcount
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def known(self, z, x, y):
+        """404 recente? (uma carga em lote por zoom, depois só memória)"""
+        zoom = self.loaded.get(z)
+        if zoom is None:
+            zoom = self.loaded[z] = self.load_zoom(z)
+        return (x, y) in zoom
+
+    def filter(self, tiles):
+        """Remover de uma lista de (z, x, y) os tiles com 404 recente"""
+        return [t for t in tiles if not self.known(*t)]
@@ -0,0 +1,162 @@
+"""
+Recompressão de tiles PNG em lote (Pillow), sem perda por padrão.
+
+Os tiles ficam gravados exatamente como o servidor os entregou (e os
+derivados do derive-tiles.py saem em RGB), e tudo isso vai para os volumes
+docker e para o nginx. Por tile:
+- PNG com ≤ 256 cores em RGB vira paleta exata (sem perda, conferido pixel a pixel)
+- recompressão zlib com optimize=True
+- opcional (--quantize=N): paleta de N cores para os tiles com mais cores (com perda)
+O arquivo só é substituído se ficar menor. Tiles deduplicados por hardlink
+(tilelib/storage.py) são processados uma vez por inode e todos os nomes passam
+a apontar para o novo arquivo, então a deduplicação se mantém. Como no storage,
+o arquivo novo vai para tiles/.tmp/ com fsync antes do rename, e o processo
+principal faz fsync dos diretórios (fsync_dirs) antes de registrar a passada.
+O worker devolve o sha1 de antes e o de depois: o processo principal repassa a
+troca ao índice de dedup (.dedup.sqlite) e guarda o hash original para o --refresh.
+"""
+
+import hashlib
+import io
+import os
+import uuid
+
+from PIL import Image, ImageChops
+
+from tilelib.sqlitedb import connect
+
+OPTIMIZE_STATE_FILENAME = '.optimize.sqlite'
+TMP_SUFFIX = '.opt.tmp'
+
+
+def _same_pixels(a, b):
+    mode = 'RGBA' if 'A' in a.mode or 'transparency' in a.info else 'RGB'
+    return ImageChops.difference(a.convert(mode), b.convert(mode)).getbbox() is None
+
+
+def _exact_palette(image):
+    """RGB com ≤ 256 cores → modo P com exatamente essas cores (ou None)"""
+    if image.mode != 'RGB':
+        return None
+    colors = image.getcolors(256)
+    if colors is None:
+        return None
+    palette_image = Image.new('P', (1, 1))
+    palette = [channel for _, color in colors for channel in color]
+    palette_image.putpalette(palette)  # só as cores usadas: PLTE curto
+    converted = image.quantize(palette=palette_image, dither=Image.Dither.NONE)
+    return converted if _same_pixels(image, converted) else None
+
+
+def optimize_png(data, quantize=None):
+    """Bytes PNG recomprimidos. Podem sair maiores que o original: quem chama compara"""
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+    if image.mode in ('RGB', 'RGBA'):
+        palette = _exact_palette(image)
+        if palette is not None:
+            image = palette
+        elif quantize:
+            method = Image.Quantize.FASTOCTREE if image.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+            image = image.quantize(quantize, method=method, dither=Image.Dither.NONE)
+    buf = io.BytesIO()
+    image.save(buf, 'PNG', optimize=True)
+    return buf.getvalue()
+
+
+def _tmp_path(tmp_dir):
+    return os.path.join(tmp_dir, f"{uuid.uuid4().hex}{TMP_SUFFIX}")
+
+
+def _replace_all(paths, data, tmp_dir):
+    """
+    Gravar data no primeiro caminho (temp em tmp_dir + fsync + rename) e
+    religar os demais nomes do mesmo inode ao arquivo novo, cada troca atômica
+    """
+    first = paths[0]
+    tmp = _tmp_path(tmp_dir)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())  # conteúdo no disco antes do nome final
+        os.replace(tmp, first)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    for path in paths[1:]:
+        link_tmp = _tmp_path(tmp_dir)
+        os.link(first, link_tmp)
+        try:
+            os.replace(link_tmp, path)
+        except BaseException:
+            os.unlink(link_tmp)
+            raise
+
+
+def fsync_dirs(dirs):
+    """fsync de cada diretório (uma vez): torna duráveis os renames do _replace_all"""
+    for directory in set(dirs):
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def optimize_group(task):
+    """
+    Worker do pool: otimizar um inode (um ou vários nomes por hardlink).
+    task = (paths, hash conhecido, perfil, quantize, diretório temporário)
+    Retorna (status, bytes antes, bytes depois, hash final, sha1 dos bytes
+    lidos) com status em 'skipped' (hash igual ao da última passada),
+    'optimized', 'kept' (sem ganho) ou 'error'. Em 'optimized' o sha1 do
+    arquivo novo é a parte depois do último ":" no hash final.
+    """
+    paths, known_hash, profile, quantize, tmp_dir = task
+    try:
+        with open(paths[0], 'rb') as f:
+            data = f.read()
+    except OSError:
+        return 'error', 0, 0, None, None
+    digest = source = hashlib.sha1(data).hexdigest()
+    if known_hash == f'{profile}:{digest}':
+        return 'skipped', len(data), len(data), known_hash, source
+    before = len(data)
+    try:
+        optimized = optimize_png(data, quantize)
+        status = 'kept'
+        if len(optimized) < len(data):
+            _replace_all(paths, optimized, tmp_dir)
+            data = optimized
+            digest = hashlib.sha1(data).hexdigest()
+            status = 'optimized'
+    except (OSError, ValueError, SyntaxError):
+        return 'error', before, before, None, source
+    return status, before, len(data), f'{profile}:{digest}', source
+
+
+class OptimizeState:
+    """Hash (perfil:sha1) de cada tile após a última passada, para pular os inalterados"""
+
+    def __init__(self, path):
+        self.conn = connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS optimized ('
+            ' z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL, hash TEXT NOT NULL,'
+            ' PRIMARY KEY (z, x, y)) WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def known(self):
+        """{(z, x, y): hash}"""
+        return {(z, x, y): h for z, x, y, h in self.conn.execute('SELECT z, x, y, hash FROM optimized')}
+
+    def record(self, rows):
+        """rows = [(z, x, y, hash)]"""
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO optimized (z, x, y, hash) VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        self.conn.close()
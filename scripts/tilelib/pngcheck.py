@@ -0,0 +1,143 @@
+"""
+Verificação de integridade de tiles PNG em paralelo.
+
+O analyze-tiles.py antigo só marcava arquivos vazios ou < 100 bytes; PNGs
+truncados ou páginas HTML de erro gravadas como .png passavam. Aqui cada
+arquivo é validado pela estrutura do PNG:
+- assinatura de 8 bytes
+- primeiro chunk IHDR com 13 bytes
+- último chunk IEND
+- (opcional, verify_crc) CRC de todos os chunks — exige ler o arquivo inteiro
+A imagem de bloqueio do OSM (BLOCKED_TILE_SIZE) é um PNG válido e é marcada à
+parte. A varredura é distribuída por diretório tiles/{z}/{x}/ num pool de
+processos (só os diretórios alterados, via tilelib/tileindex.py); o resultado
+vira uma lista de reparo (JSON) que o download-tiles.py --repair consome
+diretamente.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+IEND_CHUNK = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+HEADER_SIZE = 8 + 8 + 13 + 4  # assinatura + (tamanho, tipo) + IHDR + CRC
+BLOCKED_TILE_SIZE = 6987      # imagem "access blocked" do OSM
+REPAIR_LIST_FILENAME = '.repair.json'
+
+
+def check_png(head, tail, size):
+    """
+    Validação estrutural barata: só o cabeçalho e os 12 bytes finais.
+    Retorna None se o tile parece íntegro, senão o motivo.
+    """
+    if size == 0:
+        return 'empty'
+    if not head.startswith(PNG_SIGNATURE):
+        if head.lstrip()[:1] == b'<':
+            return 'html'
+        return 'bad_signature'
+    if size < HEADER_SIZE + len(IEND_CHUNK):
+        return 'truncated'
+    length, ctype = struct.unpack('>I4s', head[8:16])
+    if ctype != b'IHDR' or length != 13:
+        return 'bad_ihdr'
+    if tail != IEND_CHUNK:
+        return 'truncated'
+    if size == BLOCKED_TILE_SIZE:
+        return 'blocked'
+    return None
+
+
+def check_png_crc(data):
+    """Percorrer todos os chunks conferindo o CRC (None se íntegro)"""
+    pos = len(PNG_SIGNATURE)
+    end = len(data)
+    while pos + 12 <= end:
+        length, ctype = struct.unpack('>I4s', data[pos:pos + 8])
+        chunk_end = pos + 8 + length + 4
+        if chunk_end > end:
+            return 'truncated'
+        crc = struct.unpack('>I', data[chunk_end - 4:chunk_end])[0]
+        if zlib.crc32(data[pos + 4:chunk_end - 4]) != crc:
+            return 'bad_crc'
+        if ctype == b'IEND':
+            return None
+        pos = chunk_end
+    return 'truncated'
+
+
+def check_file(path, size, verify_crc=False):
+    """
+    Validar um arquivo de tile; retorna (motivo ou None, hash ou None).
+    O hash do conteúdo (mesmo de storage.content_hash) só sai com verify_crc,
+    que já lê o arquivo inteiro.
+    """
+    digest = None
+    with open(path, 'rb') as f:
+        if verify_crc:
+            data = f.read()
+            head, tail = data[:HEADER_SIZE], data[-len(IEND_CHUNK):]
+        else:
+            head = f.read(HEADER_SIZE)
+            tail = b''
+            if size >= HEADER_SIZE + len(IEND_CHUNK):
+                f.seek(-len(IEND_CHUNK), os.SEEK_END)
+                tail = f.read()
+    problem = check_png(head, tail, size)
+    if verify_crc:
+        digest = hashlib.sha1(data).hexdigest()
+        if problem is None:
+            problem = check_png_crc(data)
+    return problem, digest
+
+
+def scan_x_dir(task):
+    """
+    Worker do pool: validar todos os tiles de tiles/{z}/{x}/.
+    Retorna (z, x, mtime_ns do diretório, rows) com
+    rows = [(y, size, mtime, ino, nlink, hash, motivo)] — o formato do TileIndex.
+    """
+    x_path, z, x, verify_crc = task
+    # mtime antes da leitura: uma gravação durante a varredura força nova releitura
+    mtime_ns = os.stat(x_path).st_mtime_ns
+    rows = []
+    with os.scandir(x_path) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.endswith('.png') or not name[:-4].isdigit():
+                continue
+            st = entry.stat(follow_symlinks=False)
+            try:
+                problem, digest = check_file(entry.path, st.st_size, verify_crc)
+            except OSError:
+                problem, digest = 'unreadable', None
+            rows.append((int(name[:-4]), st.st_size, int(st.st_mtime), st.st_ino, st.st_nlink, digest, problem))
+    return z, x, mtime_ns, rows
+
+
+def write_repair_list(path, tiles):
+    """Gravar a lista de reparo: [(z, x, y, motivo)]"""
+    data = {
+        'created': int(time.time()),
+        'total': len(tiles),
+        'tiles': [{'z': z, 'x': x, 'y': y, 'error': reason} for z, x, y, reason in tiles],
+    }
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def load_repair_list(path):
+    """
+    Ler uma lista de reparo (ou um failed_tiles_*.json do download-tiles.py,
+    que tem o mesmo formato por tile) e retornar [(z, x, y)]
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    entries = data.get('tiles', data.get('failed_tiles', []))
+    return [(t['z'], t['x'], t['y']) for t in entries]
@@ -0,0 +1,152 @@
+"""
+Planejamento de tiles por pontos de interesse (cidades TEDx, centroides, artistas).
+
+collect_essential_tiles() usava uma vizinhança fixa de 3×3 tiles em z5-7:
+em z5 isso são ~3.700 km de lado, em z12 seriam só ~30 km, e nada além das
+cidades TEDx entrava no plano. Aqui cada ponto tem um raio em metros e, em
+cada zoom, entram só os tiles que o círculo toca (o mínimo que cobre a área
+que o usuário olha):
+
+1. bbox do círculo → faixa de tiles candidatos (vetorizado para todos os pontos)
+2. teste exato círculo × retângulo do tile (ponto do tile mais próximo do centro)
+3. união entre pontos (vizinhanças sobrepostas viram um tile só)
+4. descarte do que outra camada já cobre: a camada mundial (z ≤ WORLD_MAX_ZOOM
+   inteiro) e, opcionalmente, o plano regional do download-tiles.py
+
+Círculos que cruzam o antimeridiano são cortados em ±180° (não há pontos lá).
+"""
+
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from tilelib.fermat import load_centroids
+from tilelib.tiling import deg2num_array, tile_bbox_array
+
+EARTH_RADIUS_M = 6371008.8
+WORLD_MAX_ZOOM = 4  # z0-4 sempre baixados inteiros (341 tiles)
+
+
+class PointLayer:
+    """Conjunto de pontos com raio (m) e a faixa de zooms em que entram no plano"""
+
+    def __init__(self, name, lat, lon, radius_m, zooms):
+        self.name = name
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.radius_m = np.broadcast_to(np.asarray(radius_m, dtype=np.float64), self.lat.shape)
+        self.zooms = range(zooms.start, zooms.stop) if isinstance(zooms, range) else range(zooms[0], zooms[1] + 1)
+
+    def __len__(self):
+        return self.lat.size
+
+
+def centroid_layer(path, zooms, buffer_m=0.0):
+    """Localidades do centroides.json, com o radius_km de cada uma (+ buffer)"""
+    centroids = load_centroids(path)
+    values = np.array(list(centroids.values()), dtype=np.float64).reshape(-1, 3)
+    return PointLayer('centroides', values[:, 0], values[:, 1], values[:, 2] * 1000 + buffer_m, zooms)
+
+
+def csv_layer(path, zooms, radius_m):
+    """
+    Coordenadas de um CSV: coluna 'coordenada' ("lat,lon", saída do
+    fermat-coords.py) ou colunas lat/lon
+    """
+    lat, lon = [], []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('coordenada'):
+                a, b = row['coordenada'].split(',')
+            elif row.get('lat') and row.get('lon'):
+                a, b = row['lat'], row['lon']
+            else:
+                continue
+            lat.append(float(a))
+            lon.append(float(b))
+    return PointLayer(Path(path).stem, lat, lon, radius_m, zooms)
+
+
+def circle_tiles(lat, lon, radius_m, zoom):
+    """
+    Tiles (x, y) do zoom que algum círculo toca, sem repetição.
+    Retorna (array (N, 2), nº de pares ponto×tile antes da união).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    radius_m = np.asarray(radius_m, dtype=np.float64)
+    if not lat.size:
+        return np.empty((0, 2), dtype=np.int64), 0
+    dlat = np.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = np.minimum(180.0, dlat / np.maximum(np.cos(np.radians(lat)), 1e-6))
+    x0, y0 = deg2num_array(np.minimum(lat + dlat, 90.0), np.maximum(lon - dlon, -180.0), zoom)
+    x1, y1 = deg2num_array(np.maximum(lat - dlat, -90.0), np.minimum(lon + dlon, 180.0), zoom)
+
+    # Candidatos: a faixa de cada ponto expandida em arrays planos
+    nx = x1 - x0 + 1
+    ny = y1 - y0 + 1
+    counts = nx * ny
+    point = np.repeat(np.arange(lat.size), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    x = x0[point] + offset // ny[point]
+    y = y0[point] + offset % ny[point]
+
+    # Distância do centro ao ponto mais próximo do tile (0 se está dentro)
+    west, south, east, north = tile_bbox_array(zoom, x, y)
+    near_lat = np.radians(np.clip(lat[point], south, north))
+    near_lon = np.radians(np.clip(lon[point], west, east))
+    p_lat = np.radians(lat[point])
+    p_lon = np.radians(lon[point])
+    h = (np.sin((near_lat - p_lat) / 2) ** 2
+         + np.cos(p_lat) * np.cos(near_lat) * np.sin((near_lon - p_lon) / 2) ** 2)
+    dist = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(1.0, h)))
+    hit = dist <= radius_m[point]
+
+    keys = np.unique((x[hit] << 32) | y[hit])
+    return np.column_stack((keys >> 32, keys & 0xFFFFFFFF)), int(hit.sum())
+
+
+def plan_poi_tiles(layers, world_max_zoom=WORLD_MAX_ZOOM, exclude=None):
+    """
+    Tiles dos pontos de todas as camadas, por zoom.
+    exclude(z) → conjunto de (x, y) já cobertos por outro plano (opcional).
+    Retorna ({z: [(x, y), ...]}, {z: estatísticas}) com estatísticas
+    'points', 'pairs' (ponto×tile antes da união), 'merged' (após a união),
+    'excluded' e 'tiles' (no plano).
+    """
+    zooms = sorted({z for layer in layers for z in layer.zooms if z > world_max_zoom})
+    plan = {}
+    stats = {}
+    for z in zooms:
+        active = [layer for layer in layers if z in layer.zooms]
+        lat = np.concatenate([layer.lat for layer in active])
+        lon = np.concatenate([layer.lon for layer in active])
+        radius = np.concatenate([layer.radius_m for layer in active])
+        xy, pairs = circle_tiles(lat, lon, radius, z)
+        tiles = list(map(tuple, xy.tolist()))
+        merged = len(tiles)
+        if exclude is not None:
+            covered = exclude(z)
+            tiles = [t for t in tiles if t not in covered]
+        plan[z] = tiles
+        stats[z] = {'points': lat.size, 'pairs': pairs, 'merged': merged,
+                    'excluded': merged - len(tiles), 'tiles': len(tiles)}
+    return plan, stats
+
+
+def bbox_tile_count(layers, zoom):
+    """Tiles do bbox que envolve todos os pontos: o que um download por bbox pediria"""
+    active = [layer for layer in layers if zoom in layer.zooms and len(layer)]
+    if not active:
+        return 0
+    lat = np.concatenate([layer.lat for layer in active])
+    lon = np.concatenate([layer.lon for layer in active])
+    xs, ys = deg2num_array([lat.max(), lat.min()], [lon.min(), lon.max()], zoom)
+    return int((xs[1] - xs[0] + 1) * (ys[1] - ys[0] + 1))
+
+
+def world_tiles(max_zoom=WORLD_MAX_ZOOM):
+    """Camada mundial: todos os tiles de z0 a max_zoom"""
+    return [(z, x, y) for z in range(max_zoom + 1) for x in range(2 ** z) for y in range(2 ** z)]
+
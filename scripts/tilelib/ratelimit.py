@@ -0,0 +1,111 @@
+"""
+Rate limiting assíncrono por token bucket, com ajuste AIMD.
+
+Um bucket global e um por host (a/b/c.tile...). Cada requisição consome um
+token dos dois. A taxa de cada bucket:
+- cai pela metade (multiplicative decrease) em 429/403/503 ou tile de bloqueio
+- sobe devagar a cada sucesso (additive increase: +ADDITIVE_INCREASE req/s por
+  segundo de tráfego), até o teto configurado
+Assim o download roda na maior taxa que o servidor aceita sem ajuste manual.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+ADDITIVE_INCREASE = 0.2      # req/s recuperados por segundo de sucesso
+MULTIPLICATIVE_DECREASE = 0.5
+DECREASE_HOLDOFF = 2.0       # s — várias respostas 429 da mesma rajada contam uma vez
+MIN_RATE = 0.2               # req/s — nunca para completamente
+
+
+def host_of(url):
+    return urlsplit(url).netloc
+
+
+class TokenBucket:
+    """Bucket de tokens com taxa ajustável em runtime"""
+
+    def __init__(self, rate, burst=None, min_rate=MIN_RATE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.throttle_count = 0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # O lock mantém a ordem de chegada: quem espera o próximo token segura a fila
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def increase(self):
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE / self.rate)
+
+    def decrease(self):
+        now = time.monotonic()
+        if now - self.last_decrease < DECREASE_HOLDOFF:
+            return
+        self._refill()
+        self.last_decrease = now
+        self.throttle_count += 1
+        self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+        self.tokens = min(self.tokens, 0.0)  # sem rajada logo após o corte
+
+
+class AdaptiveRateLimiter:
+    """Bucket global + um bucket por host, ambos AIMD"""
+
+    def __init__(self, global_rate, per_host_rate=None, hosts=()):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_host_rate = per_host_rate or global_rate
+        self.hosts = {}
+        for host in hosts:
+            self._bucket(host)
+
+    def _bucket(self, host):
+        bucket = self.hosts.get(host)
+        if bucket is None:
+            bucket = self.hosts[host] = TokenBucket(self.per_host_rate)
+        return bucket
+
+    async def acquire(self, host):
+        # Host primeiro: não queimar token global enquanto espera um host lento
+        await self._bucket(host).acquire()
+        await self.global_bucket.acquire()
+
+    def on_success(self, host):
+        self._bucket(host).increase()
+        self.global_bucket.increase()
+
+    def on_throttle(self, host):
+        self._bucket(host).decrease()
+        self.global_bucket.decrease()
+
+    @property
+    def rate(self):
+        """Taxa efetiva atual (req/s)"""
+        return min(self.global_bucket.rate, sum(b.rate for b in self.hosts.values()) or self.global_bucket.rate)
+
+    def summary(self):
+        """Linhas legíveis com a taxa final de cada bucket"""
+        lines = [f"global: {self.global_bucket.rate:.1f} req/s "
+                 f"(teto {self.global_bucket.max_rate:.1f}, {self.global_bucket.throttle_count} cortes)"]
+        for host, bucket in sorted(self.hosts.items()):
+            lines.append(f"{host}: {bucket.rate:.1f} req/s "
+                         f"(teto {bucket.max_rate:.1f}, {bucket.throttle_count} cortes)")
+        return lines
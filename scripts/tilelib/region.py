@@ -0,0 +1,67 @@
+"""
+Região de download (América do Sul): bounds por zoom e planejamento de tiles.
+
+Antes os bounds e o cálculo de faixas estavam duplicados em download-tiles.py
+e test-bounds.py, e analyze-tiles.py estimava a cobertura com uma tabela
+fixa de tiles por zoom. Agora o planejador, o dry-run e o analisador usam as
+mesmas definições e as mesmas contagens exatas (tilelib/tiling.py).
+"""
+
+from tilelib.tiling import bbox_tile_range, bbox_tiles, count_bbox_tiles
+
+# Coordenadas da América do Sul (aproximadas)
+# Bounds mais amplos para zoom baixo (visão continental com oceanos)
+SOUTH_AMERICA_BOUNDS_WIDE = {
+    'north': 12.5,   # Norte da Colômbia/Venezuela
+    'south': -56.0,  # Sul da Argentina
+    'west': -81.0,   # Oeste do Peru/Equador (inclui oceano Pacífico)
+    'east': -34.0    # Leste do Brasil (inclui oceano Atlântico)
+}
+
+# Bounds restritos para zooms maiores (exclui maior parte dos oceanos)
+SOUTH_AMERICA_BOUNDS_LAND = {
+    'north': 12.5,   # Norte da Colômbia/Venezuela
+    'south': -56.0,  # Sul da Argentina
+    'west': -73.0,   # Oeste do Peru/Equador (exclui Pacífico)
+    'east': -35.0    # Leste do Brasil (exclui Atlântico)
+}
+
+
+# Amazônia Legal (aproximada): área prioritária do download (tilelib/schedule.py)
+AMAZON_BOUNDS = {
+    'north': 5.3,    # Monte Caburaí (RR)
+    'south': -18.1,  # Sul do Mato Grosso
+    'west': -74.0,   # Acre
+    'east': -44.0    # Oeste do Maranhão
+}
+
+def get_bounds_for_zoom(zoom, min_zoom):
+    """Retorna bounds apropriados para o nível de zoom"""
+    # Zoom mínimo: incluir oceanos para visão continental
+    if zoom <= min_zoom:
+        return SOUTH_AMERICA_BOUNDS_WIDE
+    # Zooms maiores: focar na massa terrestre
+    return SOUTH_AMERICA_BOUNDS_LAND
+
+
+def uses_landmask(zoom, min_zoom, landmask):
+    """A máscara de terra vale só acima do zoom mínimo (que mantém os oceanos)"""
+    return landmask is not None and zoom > min_zoom
+
+
+def iter_zoom_tiles(zoom, min_zoom, landmask=None):
+    """Gerar (x, y) planejados para um zoom"""
+    bounds = get_bounds_for_zoom(zoom, min_zoom)
+    if uses_landmask(zoom, min_zoom, landmask):
+        x_min, x_max, y_min, y_max = bbox_tile_range(bounds, zoom)
+        yield from landmask.tiles_for_zoom(zoom, range(x_min, x_max + 1), range(y_min, y_max + 1))
+    else:
+        # Grade inteira gerada de uma vez pelo NumPy; tolist() devolve ints nativos
+        yield from map(tuple, bbox_tiles(bounds, zoom).tolist())
+
+
+def expected_tiles(zoom, min_zoom, landmask=None):
+    """Número exato de tiles planejados para o zoom (bbox ou bbox ∩ máscara)"""
+    if uses_landmask(zoom, min_zoom, landmask):
+        return sum(1 for _ in iter_zoom_tiles(zoom, min_zoom, landmask))
+    return count_bbox_tiles(get_bounds_for_zoom(zoom, min_zoom), zoom)
@@ -0,0 +1,233 @@
+"""
+Fontes locais de tiles: gerar tiles/{z}/{x}/{y}.png sem HTTP.
+
+Depois do bloqueio do tile.openstreetmap.org dependemos de um único espelho
+(OSM.de). Estas fontes implementam a mesma interface dos clientes de
+tilelib/httpclient.py (`await source.get(url, headers)` → TileResponse), então
+o TileDownloader, o journal, o storage e o cache negativo funcionam sem
+mudança — só a origem dos bytes troca:
+- MBTilesSource (mbtiles:ARQUIVO): lê de um MBTiles raster local (extrato
+  pronto ou gerado por convert-tiles.py); tile ausente vira 404
+- MetatileRenderer (mapnik:ESTILO.xml, requer python-mapnik): renderiza de
+  dados vetoriais locais (PostGIS do osm2pgsql, shapefiles...) num pool de
+  processos. Cada processo desenha um metatile de METATILE×METATILE tiles de
+  uma vez e o recorta, como o renderd/mod_tile — rótulos e símbolos não são
+  cortados na borda de cada tile e o custo fixo de cada render é dividido por 64.
+As fontes recebem URLs locais (LOCAL_TILE_URL) das quais extraem z/x/y.
+"""
+
+import asyncio
+import re
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from tilelib.httpclient import TileClientError, TileResponse
+
+LOCAL_TILE_URL = 'local://source/{z}/{x}/{y}.png'
+TILE_SIZE = 256
+METATILE = 8                    # 8×8 tiles por render (padrão do mod_tile)
+METATILE_BUFFER = 128           # px desenhados além da borda do metatile
+METATILE_CACHE = 256            # metatiles recortados mantidos em memória
+IMAGE_FORMAT = 'png32'          # png256 gera tiles de oceano < 100 bytes, rejeitados pelo downloader
+MERCATOR_HALF = 20037508.342789244  # metade da largura do mundo em EPSG:3857 (m)
+
+_TILE_URL_RE = re.compile(r'/(\d+)/(\d+)/(\d+)\.png$')
+
+
+def parse_tile_url(url):
+    """URL .../{z}/{x}/{y}.png → (z, x, y)"""
+    match = _TILE_URL_RE.search(url)
+    if match is None:
+        raise TileClientError('bad_url', url)
+    return tuple(int(v) for v in match.groups())
+
+
+def metatile_order(tiles, metatile=METATILE):
+    """
+    Reordenar (x, y) de um zoom para que os tiles de um mesmo metatile saiam
+    juntos. Na ordem x/y do planejador um metatile seria pedido em 8 colunas
+    distantes e o cache de metatiles recortados não seguraria todos.
+    """
+    arr = np.array(list(tiles), dtype=np.int64).reshape(-1, 2)
+    order = np.lexsort((arr[:, 1], arr[:, 0], arr[:, 1] // metatile, arr[:, 0] // metatile))
+    return map(tuple, arr[order].tolist())
+
+
+def metatile_extent(z, mx, my, metatile=METATILE):
+    """
+    Tiles cobertos pelo metatile (x0, y0, largura, altura) — menores que
+    metatile nas bordas do mundo e nos zooms < 3
+    """
+    n = 2 ** z
+    x0, y0 = mx * metatile, my * metatile
+    return x0, y0, min(metatile, n - x0), min(metatile, n - y0)
+
+
+def mercator_bbox(z, x0, y0, width, height):
+    """Bbox (minx, miny, maxx, maxy) em EPSG:3857 de um bloco de tiles"""
+    size = 2 * MERCATOR_HALF / 2 ** z
+    return (-MERCATOR_HALF + x0 * size, MERCATOR_HALF - (y0 + height) * size,
+            -MERCATOR_HALF + (x0 + width) * size, MERCATOR_HALF - y0 * size)
+
+
+# Estado de cada processo do pool: (módulo mapnik, Map já carregado)
+_renderer = None
+
+
+def _init_renderer(style_path):
+    """Inicializador do pool: carregar o estilo uma vez por processo"""
+    global _renderer
+    import mapnik
+    m = mapnik.Map(TILE_SIZE, TILE_SIZE)
+    mapnik.load_map(m, style_path)
+    m.srs = '+proj=merc +a=6378137 +b=6378137 +lat_ts=0 +lon_0=0 +x_0=0 +y_0=0 +k=1 +units=m +nadgrids=@null +no_defs'
+    m.buffer_size = METATILE_BUFFER
+    _renderer = (mapnik, m)
+
+
+def render_metatile(task):
+    """
+    Worker do pool: renderizar um metatile e recortá-lo.
+    Retorna {(x, y): bytes PNG} com todos os tiles do metatile.
+    """
+    z, mx, my, metatile = task
+    mapnik, m = _renderer
+    x0, y0, width, height = metatile_extent(z, mx, my, metatile)
+    m.resize(width * TILE_SIZE, height * TILE_SIZE)
+    m.zoom_to_box(mapnik.Box2d(*mercator_bbox(z, x0, y0, width, height)))
+    image = mapnik.Image(width * TILE_SIZE, height * TILE_SIZE)
+    mapnik.render(m, image)
+    tiles = {}
+    for dx in range(width):
+        for dy in range(height):
+            view = image.view(dx * TILE_SIZE, dy * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            tiles[(x0 + dx, y0 + dy)] = view.tostring(IMAGE_FORMAT)
+    return tiles
+
+
+class MetatileRenderer:
+    """Fonte mapnik:ESTILO.xml — render local em metatiles num pool de processos"""
+
+    protocol = 'render local (mapnik, metatiles)'
+
+    def __init__(self, style_path, processes=None, metatile=METATILE, cache_size=METATILE_CACHE):
+        try:
+            import mapnik  # noqa: F401
+        except ImportError as e:
+            raise ImportError("--source=mapnik: requer python-mapnik (apt install python3-mapnik)") from e
+        self.style_path = str(Path(style_path).resolve())
+        self.processes = processes
+        self.metatile = metatile
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (z, mx, my) -> {(x, y): bytes} ou a exceção do render que falhou
+        self.pending = {}           # (z, mx, my) -> future do render em andamento
+        self.rendered = 0
+        self.pool = None
+
+    async def __aenter__(self):
+        self.pool = ProcessPoolExecutor(self.processes, initializer=_init_renderer,
+                                        initargs=(self.style_path,))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _metatile(self, key):
+        tiles = self.cache.get(key)
+        if tiles is not None:
+            self.cache.move_to_end(key)
+            if isinstance(tiles, Exception):
+                raise tiles
+            return tiles
+        # Vários workers pedindo tiles do mesmo metatile esperam o mesmo render
+        future = self.pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, render_metatile, (*key, self.metatile))
+            future.add_done_callback(lambda f, key=key: self._rendered(key, f))
+            self.pending[key] = future
+        return await asyncio.shield(future)
+
+    def _rendered(self, key, future):
+        del self.pending[key]
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self.rendered += 1
+        # Render que falhou fica no cache: os outros 63 tiles do metatile (e as
+        # novas tentativas) falham na hora em vez de renderizar tudo de novo
+        self.cache[key] = future.result() if error is None else error
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def get(self, url, headers=None):
+        z, x, y = parse_tile_url(url)
+        try:
+            tiles = await self._metatile((z, x // self.metatile, y // self.metatile))
+        except (OSError, RuntimeError) as e:
+            raise TileClientError('render_error', str(e)) from e
+        content = tiles.get((x, y))
+        if content is None:
+            return TileResponse(404, {}, b'')
+        return TileResponse(200, {}, content)
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+
+class MBTilesSource:
+    """Fonte mbtiles:ARQUIVO — tiles raster de um MBTiles local (somente leitura)"""
+
+    protocol = 'MBTiles local'
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"MBTiles não encontrado: {self.path}")
+        self.conn = None
+
+    async def __aenter__(self):
+        self.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        row = self.conn.execute("SELECT value FROM metadata WHERE name = 'format'").fetchone()
+        if row is not None and row[0] == 'pbf':
+            self.conn.close()
+            raise ValueError(f"{self.path} é um MBTiles vetorial: renderize com --source=mapnik:ESTILO.xml")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def get(self, url, headers=None):
+        z, x, y = parse_tile_url(url)
+        row = self.conn.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (z, x, (2 ** z - 1) - y)  # MBTiles usa TMS: linha 0 no sul
+        ).fetchone()
+        if row is None:
+            return TileResponse(404, {}, b'')
+        return TileResponse(200, {}, bytes(row[0]))
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def open_source(spec, processes=None):
+    """
+    Abrir a fonte local descrita por spec (usar com `async with`):
+    'mbtiles:ARQUIVO' ou 'mapnik:ESTILO.xml'
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'mbtiles' and target:
+        return MBTilesSource(target)
+    if kind == 'mapnik' and target:
+        return MetatileRenderer(target, processes=processes)
+    raise ValueError(f"fonte local inválida: {spec!r} (use mbtiles:ARQUIVO ou mapnik:ESTILO.xml)")
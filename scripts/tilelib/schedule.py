@@ -0,0 +1,108 @@
+"""
+Ordem de download por prioridade + curva de Hilbert.
+
+Na ordem zoom → x → y uma execução interrompida deixava regiões inteiras sem
+nenhum tile nos zooms altos, e as gravações pulavam entre diretórios x/
+distantes. Aqui o plano sai em faixas:
+
+1. zooms ≤ full_zoom inteiros (o mapa inteiro já navegável em zoom baixo)
+2. zooms maiores, só as áreas prioritárias (Amazônia + centroides das localidades)
+3. o resto dos zooms maiores
+Dentro de cada zoom de cada faixa os tiles seguem a curva de Hilbert: vizinhos
+no mapa saem juntos, então os diretórios z/x/ e as páginas do MBTiles são
+gravados em sequência. Com block > 1 a curva percorre blocos (metatiles) e os
+tiles de um bloco saem juntos, como em render.metatile_order().
+
+Cada faixa de cada zoom sai de um gerador próprio, que percorre os tiles do
+zoom de novo em lotes e guarda só os da sua faixa (a ordenação de Hilbert
+precisa deles juntos). A faixa 3 não fica em memória esperando as faixas 1-2
+de todos os zooms: o custo é listar os zooms > full_zoom duas vezes.
+"""
+
+from itertools import islice
+
+import numpy as np
+
+from tilelib.poiplan import circle_tiles
+from tilelib.tiling import bbox_tile_range, hilbert_codes
+
+PRIORITY_FULL_ZOOM = 8  # zooms até aqui vêm inteiros antes de qualquer área prioritária
+SPLIT_BATCH = 65_536    # tiles por lote ao separar as faixas de um zoom
+
+
+def hilbert_sort(xy, zoom, block=1):
+    """Array (N, 2) de (x, y) reordenado pela curva de Hilbert (de blocos)"""
+    if len(xy) < 2:
+        return xy
+    order = max(1, zoom - (block.bit_length() - 1))
+    codes = hilbert_codes(xy[:, 0] // block, xy[:, 1] // block, order)
+    return xy[np.lexsort((xy[:, 1], xy[:, 0], codes))]
+
+
+class PriorityAreas:
+    """Bboxes ({'north', 'south', 'west', 'east'}) e círculos de pontos (poiplan.PointLayer)"""
+
+    def __init__(self, bounds=(), layers=()):
+        self.bounds = list(bounds)
+        self.layers = [layer for layer in layers if len(layer)]
+        self.poi_keys = {}  # zoom -> chaves (x << 32) | y dos tiles tocados pelos círculos
+
+    def _poi_keys(self, zoom):
+        """Tiles dos círculos num zoom, calculados uma vez (mask() é chamado por lote)"""
+        keys = self.poi_keys.get(zoom)
+        if keys is None:
+            lat = np.concatenate([layer.lat for layer in self.layers])
+            lon = np.concatenate([layer.lon for layer in self.layers])
+            radius = np.concatenate([layer.radius_m for layer in self.layers])
+            poi, _ = circle_tiles(lat, lon, radius, zoom)
+            keys = self.poi_keys[zoom] = (poi[:, 0] << 32) | poi[:, 1]
+        return keys
+
+    def mask(self, zoom, xy):
+        """Booleano por tile: True se está numa área prioritária"""
+        x, y = xy[:, 0], xy[:, 1]
+        hit = np.zeros(len(xy), dtype=bool)
+        for bounds in self.bounds:
+            x_min, x_max, y_min, y_max = bbox_tile_range(bounds, zoom)
+            hit |= (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+        if self.layers:
+            hit |= np.isin((x << 32) | y, self._poi_keys(zoom))
+        return hit
+
+
+def _tier_tiles(zoom_tiles, z, areas, tier, block):
+    """Gerador dos tiles de uma faixa ('full', 'priority' ou 'rest') num zoom, em ordem de Hilbert"""
+    tiles = iter(zoom_tiles(z))
+    parts = []
+    while True:
+        xy = np.array(list(islice(tiles, SPLIT_BATCH)), dtype=np.int64).reshape(-1, 2)
+        if not len(xy):
+            break
+        if tier != 'full':
+            hit = areas.mask(z, xy)
+            xy = xy[hit] if tier == 'priority' else xy[~hit]
+        parts.append(xy)
+    xy = np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.int64)
+    for x, y in hilbert_sort(xy, z, block).tolist():
+        yield z, x, y
+
+
+def scheduled_tiles(zoom_tiles, zooms, areas, full_zoom=PRIORITY_FULL_ZOOM, block=1, tiers=None):
+    """
+    Gerar (z, x, y) na ordem das faixas. zoom_tiles(z) → iterável de (x, y),
+    chamado uma vez por faixa do zoom (duas nos zooms > full_zoom). Em memória
+    fica só a faixa do zoom sendo gerada. tiers, se for um dict, recebe a
+    contagem de cada faixa.
+    """
+    zooms = list(zooms)
+    order = ([(z, 'full' if z <= full_zoom else 'priority') for z in zooms]
+             + [(z, 'rest') for z in zooms if z > full_zoom])
+    if tiers is not None:
+        tiers.setdefault('rest', 0)
+    for z, tier in order:
+        count = 0
+        for tile in _tier_tiles(zoom_tiles, z, areas, tier, block):
+            count += 1
+            yield tile
+        if tiers is not None:
+            tiers[tier] = tiers.get(tier, 0) + count
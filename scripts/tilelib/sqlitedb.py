@@ -0,0 +1,24 @@
+"""
+Conexões sqlite dos índices laterais (.notfound, .dedup, .inventory,
+.validators, .optimize) e do MBTiles.
+
+Com --shards vários processos abrem os mesmos arquivos ao mesmo tempo. Com a
+espera padrão do módulo sqlite3 (5 s) o commit de um shard falhava com
+"database is locked" atrás de um lote grande de outro, e sem WAL (.notfound,
+.dedup) um leitor ainda bloqueava os escritores. Aqui toda conexão espera o
+lock até BUSY_TIMEOUT_MS e usa WAL, então leituras não esperam e os commits
+de cada shard só entram em fila.
+"""
+
+import sqlite3
+
+BUSY_TIMEOUT_MS = 60_000
+
+
+def connect(path, synchronous='NORMAL', check_same_thread=True):
+    """sqlite3.connect() com busy_timeout e WAL (busy_timeout antes: trocar o modo também pega lock)"""
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=check_same_thread)
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+    return conn
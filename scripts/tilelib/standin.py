@@ -0,0 +1,93 @@
+"""
+Servidor de tiles local (aiohttp) que imita o comportamento do OSM, para benchmarks.
+
+Medir os downloaders contra o OSM.de é lento, ruidoso e arrisca bloqueio.
+Este servidor responde em /{z}/{x}/{y}.png com:
+- latência configurável (média + jitter uniforme)
+- regiões de 404: blocos de 4×4 tiles escolhidos por hash (oceano)
+- rajadas de 429: a cada burst_every s, burst_len s recusando tudo
+- imagem de bloqueio (PNG de BLOCKED_TILE_SIZE bytes) numa fração dos tiles
+Tudo é determinístico por tile (mesma semente, mesmas respostas), então duas
+versões do código veem exatamente a mesma carga. GET /stats devolve as
+contagens do lado do servidor.
+"""
+
+import asyncio
+import random
+import struct
+import time
+import zlib
+
+from aiohttp import web
+
+from tilelib.pngcheck import BLOCKED_TILE_SIZE, PNG_SIGNATURE
+
+TILE_BYTES = 8000  # tamanho típico de um tile z10 do OSM
+
+# Cenários prontos do bench-tiles.py
+SCENARIOS = {
+    'baseline': {'latency': 0.02},
+    'jitter': {'latency': 0.02, 'jitter': 0.1},
+    'ocean': {'latency': 0.02, 'not_found': 0.4},
+    'throttle': {'latency': 0.02, 'burst_every': 5.0, 'burst_len': 1.0},
+    'blocked': {'latency': 0.02, 'blocked': 0.002},
+}
+
+
+def _chunk(ctype, data):
+    return struct.pack('>I', len(data)) + ctype + data + struct.pack('>I', zlib.crc32(ctype + data))
+
+
+def make_png(text, size):
+    """PNG 1×1 válido com um chunk tEXt, preenchido até exatamente `size` bytes"""
+    head = PNG_SIGNATURE + _chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0))
+    body = _chunk(b'IDAT', zlib.compress(b'\x00\x00')) + _chunk(b'IEND', b'')
+    keyword = b'Comment\x00' + text.encode()
+    padding = max(0, size - len(head) - len(body) - 12 - len(keyword))
+    return head + _chunk(b'tEXt', keyword + b' ' * padding) + body
+
+
+def tile_fraction(seed, *key):
+    """Valor em [0, 1) fixo por (semente, chave)"""
+    return (zlib.crc32(repr((seed, key)).encode()) & 0xFFFFFFFF) / 2 ** 32
+
+
+def make_app(latency=0.0, jitter=0.0, not_found=0.0, blocked=0.0,
+             burst_every=0.0, burst_len=0.0, tile_bytes=TILE_BYTES, seed=0):
+    """Aplicação aiohttp do servidor (parâmetros dos SCENARIOS)"""
+    start = time.monotonic()
+    rng = random.Random(seed)
+    blocked_png = make_png('blocked', BLOCKED_TILE_SIZE)
+    stats = {'requests': 0, 'ok': 0, 'not_found': 0, 'throttled': 0, 'blocked': 0}
+
+    async def tile(request):
+        z, x, y = (int(request.match_info[k]) for k in ('z', 'x', 'y'))
+        stats['requests'] += 1
+        if burst_every and (time.monotonic() - start) % burst_every < burst_len:
+            stats['throttled'] += 1
+            return web.Response(status=429)
+        delay = latency + (rng.uniform(0, jitter) if jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if tile_fraction(seed, z, x >> 2, y >> 2) < not_found:
+            stats['not_found'] += 1
+            return web.Response(status=404)
+        if tile_fraction(seed, z, x, y) < blocked:
+            stats['blocked'] += 1
+            return web.Response(body=blocked_png, content_type='image/png')
+        stats['ok'] += 1
+        # Conteúdo único por tile: a deduplicação do storage não distorce a medida
+        return web.Response(body=make_png(f'{z}/{x}/{y}', tile_bytes), content_type='image/png')
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get('/stats', get_stats)
+    app.router.add_get('/{z}/{x}/{y}.png', tile)
+    return app
+
+
+def serve(hosts, port, config):
+    """Alvo de multiprocessing.Process: servir até ser terminado"""
+    web.run_app(make_app(**config), host=hosts, port=port, print=None)
@@ -0,0 +1,464 @@
+"""
+Backends de armazenamento de tiles.
+
+- DirectoryStorage: layout original tiles/{z}/{x}/{y}.png (servido pelo nginx);
+  payloads idênticos viram hardlinks para a primeira cópia (índice hash → tile
+  em tiles/.dedup.sqlite); cada gravação atualiza o índice de inventário
+  persistente (tiles/.inventory.sqlite, tilelib/tileindex.py)
+- MBTilesStorage: um único arquivo SQLite no formato MBTiles 1.3, com WAL,
+  transações em lote e deduplicação de blobs idênticos (tabela images indexada
+  pelo hash do conteúdo + tabela map apontando para ela, expostas pela view tiles)
+
+Os dois têm a mesma interface (scan, in, missing, mark_present, write, read,
+tiles, flush, close), de modo que os downloaders não sabem onde o tile vai parar.
+Depois de flush() todo tile aceito por write() está durável — o journal de
+progresso (tilelib/journal.py) depende disso: no diretório cada arquivo
+temporário passa por fsync antes do rename e flush() faz fsync dos diretórios
+alterados (os renames); no MBTiles cada commit de lote sincroniza o WAL
+(synchronous=FULL).
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from tilelib.inventory import TileInventory
+from tilelib.sqlitedb import connect
+from tilelib.tileindex import TileIndex, INVENTORY_INDEX_FILENAME
+
+MBTILES_BATCH_SIZE = 500  # tiles por transação
+DEDUP_INDEX_FILENAME = '.dedup.sqlite'
+TMP_SUFFIX = '.tmp'  # arquivos temporários de escrita atômica (ignorados pelo inventário)
+TMP_DIRNAME = '.tmp'  # tiles/.tmp/: o diretório do tile só muda no rename final
+STALE_TMP_SECONDS = 3600  # sobras em tiles/.tmp/ mais antigas que isso são de escritas interrompidas
+
+
+def content_hash(data):
+    """Hash do conteúdo usado como tile_id (deduplicação)"""
+    return hashlib.sha1(data).hexdigest()
+
+
+class BlobIndex:
+    """Hash do conteúdo → primeiro tile gravado com esse conteúdo (sqlite)"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.known = None  # carregado na primeira consulta
+        self.conn = connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            ' hash TEXT PRIMARY KEY, z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def lookup(self, h):
+        with self.lock:
+            if self.known is None:
+                self.known = {row[0]: tuple(row[1:]) for row in self.conn.execute('SELECT hash, z, x, y FROM blobs')}
+            return self.known.get(h)
+
+    def add(self, h, z, x, y):
+        with self.lock:
+            if self.known is not None:
+                self.known[h] = (z, x, y)
+            self.pending.append((h, z, x, y))
+            if len(self.pending) >= MBTILES_BATCH_SIZE:
+                self._flush()
+
+    def rehash(self, old, new, tiles):
+        """
+        O canônico de old (se estiver em tiles) foi regravado com o conteúdo new
+        (optimize-tiles.py): a entrada passa a ser new → tile, senão o forget()
+        de uma sobrescrita futura, que faz o hash dos bytes em disco, não a acharia
+        """
+        with self.lock:
+            self._flush()
+            row = self.conn.execute('SELECT z, x, y FROM blobs WHERE hash = ?', (old,)).fetchone()
+            if row is None or tuple(row) not in tiles:
+                return False
+            with self.conn:
+                self.conn.execute('DELETE FROM blobs WHERE hash = ?', (old,))
+                self.conn.execute('INSERT OR REPLACE INTO blobs (hash, z, x, y) VALUES (?, ?, ?, ?)', (new, *row))
+            if self.known is not None:
+                self.known.pop(old, None)
+                self.known[new] = tuple(row)
+            return True
+
+    def forget(self, h, tile):
+        """Desfazer h → tile (o tile canônico vai ser sobrescrito com outro conteúdo)"""
+        with self.lock:
+            if self.known is not None and self.known.get(h) == tile:
+                del self.known[h]
+            self.pending = [p for p in self.pending if p[0] != h]
+            with self.conn:
+                self.conn.execute('DELETE FROM blobs WHERE hash = ? AND z = ? AND x = ? AND y = ?', (h, *tile))
+
+    def _flush(self):
+        if self.pending:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO blobs (hash, z, x, y) VALUES (?, ?, ?, ?)', self.pending)
+            self.pending = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.conn.close()
+
+
+class DirectoryStorage:
+    """tiles/{z}/{x}/{y}.png — existência respondida pelo TileInventory"""
+
+    def __init__(self, tiles_dir, dedup=True):
+        self.tiles_dir = Path(tiles_dir)
+        self.tiles_dir.mkdir(parents=True, exist_ok=True)
+        self.inventory = TileInventory(tiles_dir)
+        self.blobs = BlobIndex(self.tiles_dir / DEDUP_INDEX_FILENAME) if dedup else None
+        self.index = TileIndex(self.tiles_dir / INVENTORY_INDEX_FILENAME)
+        self.dedup_hits = 0   # tiles gravados como hardlink
+        self.dedup_bytes = 0  # bytes que não foram gravados de novo
+        self.dirty_dirs = set()  # tiles/{z}/{x}/ com renames ainda sem fsync
+        self.rename_lock = threading.Lock()  # renames, índice e canônicos da dedup na mesma ordem
+        self.tmp_dir = self.tiles_dir / TMP_DIRNAME
+        self.tmp_dir.mkdir(exist_ok=True)
+        self._clean_tmp()
+
+    def tile_path(self, z, x, y):
+        return self.tiles_dir / str(z) / str(x) / f"{y}.png"
+
+    def scan(self, zooms):
+        self.inventory.scan(zooms)
+        return self
+
+    def __contains__(self, tile):
+        return tile in self.inventory
+
+    def missing(self, tiles):
+        return self.inventory.missing(tiles)
+
+    def count(self, z=None):
+        return self.inventory.count(z)
+
+    def mark_present(self, z, x, y):
+        self.inventory.add(z, x, y)
+
+    def _clean_tmp(self):
+        """Sobras de escritas interrompidas por crash (só antigas: outro shard pode estar gravando)"""
+        with os.scandir(self.tmp_dir) as entries:
+            for entry in entries:
+                try:
+                    if time.time() - entry.stat().st_mtime > STALE_TMP_SECONDS:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+
+    def _tmp_path(self, z, x, y):
+        # Fora de tiles/{z}/{x}/, no mesmo sistema de arquivos (rename atômico)
+        return self.tmp_dir / f"{z}-{x}-{y}.{uuid.uuid4().hex[:8]}{TMP_SUFFIX}"
+
+    def write(self, z, x, y, data):
+        """
+        Gravação atômica (temp + rename): um crash no meio nunca deixa um PNG
+        truncado com o nome final. Também evita sobrescrever in-place um inode
+        compartilhado por hardlinks da deduplicação.
+        """
+        if self.inventory.ensure_dir(z, x):
+            self.index.created_dir(z, x)
+        target = self.tile_path(z, x, y)
+        h = content_hash(data) if self.blobs is not None else None
+        tmp = None
+        if self.blobs is None or self.blobs.lookup(h) in (None, (z, x, y)):
+            # Conteúdo novo: a cópia e o fsync ficam fora do lock
+            tmp = self._write_tmp(z, x, y, data)
+        try:
+            # Consulta, rename e registro do canônico sob o mesmo lock: dois
+            # writers do mesmo conteúdo (ou do mesmo tile) não se cruzam
+            with self.rename_lock:
+                if self.blobs is not None:
+                    if (z, x, y) in self.inventory:
+                        # Sobrescrita (--refresh): se este tile era o canônico do conteúdo
+                        # antigo, novos duplicados não podem mais apontar para ele
+                        old = self.read(z, x, y)
+                        if old is not None:
+                            self.blobs.forget(content_hash(old), (z, x, y))
+                    canonical = self.blobs.lookup(h)
+                    if canonical is not None and canonical != (z, x, y) and self._link(canonical, target, z, x, y, h):
+                        self.dedup_hits += 1
+                        self.dedup_bytes += len(data)
+                        return
+                    if tmp is None:
+                        # Cópia original removida ou limite de links:
+                        # grava normalmente e este tile passa a ser o canônico
+                        tmp = self._write_tmp(z, x, y, data)
+                self._commit(tmp, target, z, x, y, h)
+                tmp = None
+                if self.blobs is not None:
+                    self.blobs.add(h, z, x, y)
+        finally:
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+
+    def _write_tmp(self, z, x, y, data):
+        tmp = self._tmp_path(z, x, y)
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())  # conteúdo no disco antes do nome final
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return tmp
+
+    def _link(self, canonical, target, z, x, y, h):
+        """Hardlink do canônico no lugar do tile (False se o canônico sumiu)"""
+        tmp = self._tmp_path(z, x, y)
+        try:
+            os.link(self.tile_path(*canonical), tmp)
+        except OSError:
+            return False
+        try:
+            self._commit(tmp, target, z, x, y, h)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return True
+
+    def _commit(self, tmp, target, z, x, y, h):
+        """Rename final + registro no índice com o mtime do diretório antes/depois (com rename_lock)"""
+        directory = target.parent
+        before = os.stat(directory).st_mtime_ns
+        os.replace(tmp, target)
+        after = os.stat(directory).st_mtime_ns
+        self.index.record(z, x, y, target.stat(), h, (before, after))
+        self.dirty_dirs.add(directory)
+        self.inventory.add(z, x, y)
+
+    def read(self, z, x, y):
+        try:
+            return self.tile_path(z, x, y).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def mtime(self, z, x, y):
+        """mtime do arquivo (If-Modified-Since para tiles sem validadores)"""
+        try:
+            return self.tile_path(z, x, y).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def tiles(self):
+        """Iterar (z, x, y) de todos os tiles no disco"""
+        with os.scandir(self.tiles_dir) as zoom_entries:
+            zooms = sorted(int(e.name) for e in zoom_entries if e.name.isdigit() and e.is_dir())
+        self.inventory.scan(zooms)
+        for z in zooms:
+            for x, y in sorted(self.inventory.present.get(z, ())):
+                yield z, x, y
+
+    def total_size(self):
+        """
+        Bytes em disco — hardlinks contam uma vez só. Sai dos agregados do
+        índice de inventário, sem varrer nada: tiles gravados fora do storage
+        só entram depois de um reconcile (analyze-tiles.py).
+        Como no MBTiles, pode ser chamado depois de close().
+        """
+        index = self.index or TileIndex(self.tiles_dir / INVENTORY_INDEX_FILENAME)
+        try:
+            return index.totals()[2]
+        finally:
+            if index is not self.index:
+                index.close()
+
+    def _sync_dirs(self):
+        """fsync dos diretórios com renames pendentes (e dos diretórios de zoom, por mkdir)"""
+        dirs, self.dirty_dirs = self.dirty_dirs, set()
+        for path in dirs | {d.parent for d in dirs}:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def flush(self):
+        self._sync_dirs()
+        if self.blobs is not None:
+            self.blobs.flush()
+        if self.index is not None:
+            self.index.flush()
+
+    def close(self):
+        self._sync_dirs()
+        if self.blobs is not None:
+            self.blobs.close()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+
+class MBTilesStorage:
+    """Arquivo MBTiles (SQLite) com blobs deduplicados por hash"""
+
+    def __init__(self, path, name='Atlas Cultural Amazonias OSM'):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.present = {}        # z -> {(x, y)} já carregados
+        self.pending_map = []    # (z, col, row, tile_id)
+        self.pending_images = {} # tile_id -> data
+        self.known_ids = None    # tile_ids já gravados (carregado no primeiro write)
+        self.zoom_range = None
+        self.dedup_hits = 0
+        self.dedup_bytes = 0
+
+        self.conn = connect(self.path, synchronous='FULL',  # commit do lote durável (journal)
+                            check_same_thread=False)
+        self.conn.executescript(
+            'CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);'
+            'CREATE TABLE IF NOT EXISTS map ('
+            ' zoom_level INTEGER NOT NULL, tile_column INTEGER NOT NULL,'
+            ' tile_row INTEGER NOT NULL, tile_id TEXT NOT NULL,'
+            ' PRIMARY KEY (zoom_level, tile_column, tile_row));'
+            'CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB NOT NULL);'
+            'CREATE VIEW IF NOT EXISTS tiles AS'
+            ' SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,'
+            ' map.tile_row AS tile_row, images.tile_data AS tile_data'
+            ' FROM map JOIN images ON images.tile_id = map.tile_id;'
+        )
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)',
+            [('name', name), ('format', 'png'), ('type', 'baselayer'), ('version', '1.3'),
+             ('attribution', '© OpenStreetMap contributors')]
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _row(z, y):
+        """MBTiles usa TMS: linha 0 no sul"""
+        return (2 ** z - 1) - y
+
+    def scan(self, zooms):
+        with self.lock:
+            for z in zooms:
+                if z in self.present:
+                    continue
+                rows = self.conn.execute(
+                    'SELECT tile_column, tile_row FROM map WHERE zoom_level = ?', (z,)
+                )
+                top = 2 ** z - 1
+                self.present[z] = {(col, top - row) for col, row in rows}
+        return self
+
+    def __contains__(self, tile):
+        z, x, y = tile
+        if z not in self.present:
+            self.scan([z])
+        return (x, y) in self.present[z]
+
+    def missing(self, tiles):
+        return [t for t in tiles if t not in self]
+
+    def count(self, z=None):
+        if z is None:
+            return sum(len(p) for p in self.present.values())
+        return len(self.present.get(z, ()))
+
+    def mark_present(self, z, x, y):
+        if z not in self.present:
+            self.scan([z])
+        self.present[z].add((x, y))
+
+    def write(self, z, x, y, data):
+        tile_id = content_hash(data)
+        with self.lock:
+            if self.known_ids is None:
+                self.known_ids = {row[0] for row in self.conn.execute('SELECT tile_id FROM images')}
+            if tile_id in self.known_ids:
+                self.dedup_hits += 1
+                self.dedup_bytes += len(data)
+            else:
+                self.known_ids.add(tile_id)
+                self.pending_images[tile_id] = data
+            self.pending_map.append((z, x, self._row(z, y), tile_id))
+            self.present.setdefault(z, set()).add((x, y))
+            lo, hi = self.zoom_range or (z, z)
+            self.zoom_range = (min(lo, z), max(hi, z))
+            if len(self.pending_map) >= MBTILES_BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending_map:
+            return
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)',
+                self.pending_images.items()
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id)'
+                ' VALUES (?, ?, ?, ?)',
+                self.pending_map
+            )
+        self.pending_map = []
+        self.pending_images = {}
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def read(self, z, x, y):
+        with self.lock:
+            self._flush()
+            row = self.conn.execute(
+                'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                (z, x, self._row(z, y))
+            ).fetchone()
+        return row[0] if row else None
+
+    def mtime(self, z, x, y):
+        return None  # MBTiles não guarda data por tile
+
+    def tiles(self):
+        """Iterar (z, x, y) de todos os tiles do arquivo"""
+        self.flush()
+        rows = self.conn.execute(
+            'SELECT zoom_level, tile_column, tile_row FROM map ORDER BY zoom_level, tile_column, tile_row'
+        ).fetchall()
+        for z, col, row in rows:
+            yield z, col, self._row(z, row)
+
+    def total_size(self):
+        """Tamanho em disco (após close() o WAL já foi consolidado no arquivo)"""
+        return sum(p.stat().st_size for p in (self.path, Path(f"{self.path}-wal")) if p.exists())
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.zoom_range:
+                lo, hi = self.zoom_range
+                old = dict(self.conn.execute(
+                    "SELECT name, value FROM metadata WHERE name IN ('minzoom', 'maxzoom')"
+                ))
+                lo = min(lo, int(old.get('minzoom', lo)))
+                hi = max(hi, int(old.get('maxzoom', hi)))
+                with self.conn:
+                    self.conn.executemany(
+                        'INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)',
+                        [('minzoom', str(lo)), ('maxzoom', str(hi))]
+                    )
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.conn.close()
+
+
+def open_storage(tiles_dir, mbtiles_path=None):
+    """MBTiles se um caminho for informado, senão o layout em diretório"""
+    if mbtiles_path:
+        return MBTilesStorage(mbtiles_path)
+    return DirectoryStorage(tiles_dir)
@@ -0,0 +1,320 @@
+"""
+Índice persistente do inventário de tiles (sqlite), atualizado de forma incremental.
+
+Antes, cada execução do analyze-tiles.py e o relatório final do
+download-tiles.py percorriam tiles/{z}/{x}/ inteiro. Aqui cada tile tem uma
+linha (tamanho, mtime, inode, hash, problema de integridade) e cada diretório
+tiles/{z}/{x}/ guarda o mtime visto na última varredura:
+- DirectoryStorage.write() registra os tiles à medida que grava, com o mtime
+  do diretório antes e depois do rename (o temporário fica em tiles/.tmp/,
+  então o rename é a única mudança no diretório): se a cadeia parte do valor
+  indexado (ou de um diretório criado vazio pelo storage), as próprias
+  gravações não deixam o diretório "alterado"; qualquer mudança de fora quebra
+  a cadeia e o diretório é relido
+- reconcile() só relê os diretórios cujo mtime mudou (toda gravação atômica
+  faz um rename no diretório, então tile novo ou sobrescrito muda o mtime);
+  o hash de um tile com mesmo tamanho, mtime e inode é mantido
+- agregados por zoom (contagem, bytes) são mantidos por triggers, então as
+  estatísticas saem do índice sem varrer nada
+- a tabela derived marca os tiles gerados localmente pelo derive-tiles.py
+  (pirâmide/overzoom); uma gravação vinda do servidor remove a marca
+"""
+
+import os
+import threading
+
+from tilelib.pngcheck import scan_x_dir
+from tilelib.sqlitedb import connect
+
+INVENTORY_INDEX_FILENAME = '.inventory.sqlite'
+FLUSH_EVERY = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tiles (
+    z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,
+    size INTEGER NOT NULL, mtime INTEGER NOT NULL,
+    ino INTEGER, nlink INTEGER NOT NULL DEFAULT 1,
+    hash TEXT, problem TEXT,
+    PRIMARY KEY (z, x, y)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tiles_size ON tiles (z, size);
+CREATE INDEX IF NOT EXISTS tiles_ino ON tiles (ino, size);
+CREATE INDEX IF NOT EXISTS tiles_problem ON tiles (problem) WHERE problem IS NOT NULL;
+CREATE TABLE IF NOT EXISTS dirs (
+    z INTEGER NOT NULL, x INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL, crc_checked INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (z, x)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS zoom_stats (
+    z INTEGER PRIMARY KEY, count INTEGER NOT NULL, total_size INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS derived (
+    z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,
+    method TEXT NOT NULL, source_z INTEGER NOT NULL,
+    PRIMARY KEY (z, x, y)) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS tiles_ins AFTER INSERT ON tiles BEGIN
+    INSERT INTO zoom_stats (z, count, total_size) VALUES (NEW.z, 1, NEW.size)
+    ON CONFLICT (z) DO UPDATE SET count = count + 1, total_size = total_size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS tiles_del AFTER DELETE ON tiles BEGIN
+    UPDATE zoom_stats SET count = count - 1, total_size = total_size - OLD.size WHERE z = OLD.z;
+END;
+CREATE TRIGGER IF NOT EXISTS tiles_upd AFTER UPDATE OF size ON tiles BEGIN
+    UPDATE zoom_stats SET total_size = total_size - OLD.size + NEW.size WHERE z = NEW.z;
+END;
+'''
+
+
+class TileIndex:
+    """Tabela (z, x, y) → size, mtime, inode, hash, problema + mtime por diretório"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_dirs = {}  # (z, x) -> [mtime_ns antes da 1ª gravação, depois da última, cadeia ok]
+        self.created = set()    # (z, x) criados vazios pelo storage deste processo
+        self.conn = connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def created_dir(self, z, x):
+        """tiles/{z}/{x}/ acabou de ser criado: tudo o que entrar nele passa por record()"""
+        with self.lock:
+            self.created.add((z, x))
+
+    def record(self, z, x, y, st, h=None, dir_mtimes=None):
+        """
+        Registrar um tile recém-gravado (st = os.stat do arquivo final).
+        dir_mtimes = (mtime_ns do diretório antes, depois do rename), com as
+        gravações de um mesmo diretório registradas na ordem dos renames.
+        """
+        with self.lock:
+            self.pending.append((z, x, y, st.st_size, int(st.st_mtime), st.st_ino, st.st_nlink, h))
+            if dir_mtimes is not None:
+                before, after = dir_mtimes
+                chain = self.pending_dirs.get((z, x))
+                if chain is None:
+                    self.pending_dirs[(z, x)] = [before, after, True]
+                else:
+                    chain[2] = chain[2] and chain[1] == before
+                    chain[1] = after
+            if len(self.pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        if self.pending:
+            chains = [(z, x, before, after) for (z, x), (before, after, ok) in self.pending_dirs.items() if ok]
+            created = [(z, x, after) for z, x, _, after in chains if (z, x) in self.created]
+            known = [(after, z, x, before) for z, x, before, after in chains]
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO tiles (z, x, y, size, mtime, ino, nlink, hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+                    ' ON CONFLICT (z, x, y) DO UPDATE SET size = excluded.size, mtime = excluded.mtime,'
+                    '  ino = excluded.ino, nlink = excluded.nlink, hash = excluded.hash, problem = NULL',
+                    self.pending
+                )
+                # Tile gravado de novo (download real) deixa de ser derivado
+                self.conn.executemany('DELETE FROM derived WHERE z = ? AND x = ? AND y = ?',
+                                      [row[:3] for row in self.pending])
+                # As próprias gravações não tornam o diretório "alterado" para o
+                # reconcile: o mtime indexado avança se a cadeia parte dele. Sem
+                # linha em dirs (nunca indexado) só entra o diretório que criamos
+                # (na primeira vez direto com o mtime final; o UPDATE não casa).
+                self.conn.executemany('INSERT OR IGNORE INTO dirs (z, x, mtime_ns) VALUES (?, ?, ?)', created)
+                self.conn.executemany(
+                    'UPDATE dirs SET mtime_ns = ?, crc_checked = 0 WHERE z = ? AND x = ? AND mtime_ns = ?',
+                    known)
+            self.pending = []
+            self.pending_dirs = {}
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def stale_dirs(self, tiles_dir, verify_crc=False):
+        """
+        Diretórios tiles/{z}/{x}/ a reler (mtime diferente do índice, ou ainda
+        sem CRC conferido quando verify_crc) e (z, x) que sumiram do disco.
+        Custa um stat por diretório x, nenhum por tile.
+        """
+        known = {(z, x): (mtime_ns, crc) for z, x, mtime_ns, crc
+                 in self.conn.execute('SELECT z, x, mtime_ns, crc_checked FROM dirs')}
+        tasks = []
+        seen = set()
+        with os.scandir(tiles_dir) as zoom_entries:
+            zooms = sorted((int(e.name), e.path) for e in zoom_entries if e.name.isdigit() and e.is_dir())
+        for z, zoom_path in zooms:
+            with os.scandir(zoom_path) as x_entries:
+                for x_entry in x_entries:
+                    if not x_entry.name.isdigit() or not x_entry.is_dir(follow_symlinks=False):
+                        continue
+                    x = int(x_entry.name)
+                    seen.add((z, x))
+                    state = known.get((z, x))
+                    mtime_ns = x_entry.stat(follow_symlinks=False).st_mtime_ns
+                    if state is None or state[0] != mtime_ns or (verify_crc and not state[1]):
+                        tasks.append((x_entry.path, z, x, verify_crc))
+        removed = [key for key in known if key not in seen]
+        return tasks, removed
+
+    def replace_dir(self, z, x, mtime_ns, rows, crc_checked):
+        """
+        Substituir as linhas de um diretório pelo resultado de scan_x_dir().
+        Sem verify_crc a varredura não calcula hash: o hash já indexado de um
+        arquivo com mesmo tamanho, mtime e inode é mantido.
+        """
+        with self.lock:
+            self._flush()
+            old = {y: (size, mtime, ino, h) for y, size, mtime, ino, h in self.conn.execute(
+                'SELECT y, size, mtime, ino, hash FROM tiles WHERE z = ? AND x = ? AND hash IS NOT NULL', (z, x))}
+            merged = []
+            for y, size, mtime, ino, nlink, h, problem in rows:
+                if h is None:
+                    prev = old.get(y)
+                    if prev is not None and prev[:3] == (size, mtime, ino):
+                        h = prev[3]
+                merged.append((y, size, mtime, ino, nlink, h, problem))
+            rows = merged
+            with self.conn:
+                self.conn.execute('DELETE FROM tiles WHERE z = ? AND x = ?', (z, x))
+                self.conn.executemany(
+                    'INSERT INTO tiles (z, x, y, size, mtime, ino, nlink, hash, problem)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(z, x, *row) for row in rows]
+                )
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO dirs (z, x, mtime_ns, crc_checked) VALUES (?, ?, ?, ?)',
+                    (z, x, mtime_ns, int(crc_checked))
+                )
+                self.conn.execute(
+                    'DELETE FROM derived WHERE z = ? AND x = ? AND NOT EXISTS'
+                    ' (SELECT 1 FROM tiles t WHERE t.z = derived.z AND t.x = derived.x AND t.y = derived.y)',
+                    (z, x)
+                )
+
+    def forget_dirs(self, dirs):
+        with self.lock:
+            with self.conn:
+                for z, x in dirs:
+                    self.conn.execute('DELETE FROM tiles WHERE z = ? AND x = ?', (z, x))
+                    self.conn.execute('DELETE FROM dirs WHERE z = ? AND x = ?', (z, x))
+                    self.conn.execute('DELETE FROM derived WHERE z = ? AND x = ?', (z, x))
+
+    def reconcile(self, tiles_dir, verify_crc=False, map_fn=map):
+        """
+        Atualizar o índice relendo só os diretórios alterados.
+        map_fn permite distribuir scan_x_dir num pool (ex.: ProcessPoolExecutor.map).
+        Retorna o número de diretórios relidos.
+        """
+        self.flush()
+        tasks, removed = self.stale_dirs(tiles_dir, verify_crc)
+        if removed:
+            self.forget_dirs(removed)
+        for z, x, mtime_ns, rows in map_fn(scan_x_dir, tasks):
+            self.replace_dir(z, x, mtime_ns, rows, verify_crc)
+        return len(tasks)
+
+    def inode_groups(self, zooms=None):
+        """
+        Listas [(z, x, y), ...] por inode, sem os tiles com problema de
+        integridade: nomes ligados por hardlink (dedup) saem juntos, mesmo
+        quando só parte deles está em zooms
+        """
+        self.flush()
+        groups = []
+        group = []
+        current = None
+        rows = self.conn.execute('SELECT ino, z, x, y FROM tiles WHERE problem IS NULL ORDER BY ino, z, x, y')
+        for ino, z, x, y in rows:
+            if (ino != current or ino is None) and group:
+                groups.append(group)
+                group = []
+            current = ino
+            group.append((z, x, y))
+        if group:
+            groups.append(group)
+        if zooms is not None:
+            zooms = set(zooms)
+            groups = [g for g in groups if any(z in zooms for z, _, _ in g)]
+        return groups
+
+    def mark_derived(self, rows):
+        """Marcar tiles gerados localmente: [(z, x, y, método, zoom de origem)]"""
+        with self.lock:
+            self._flush()  # o record() da gravação não pode apagar a marca depois
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO derived (z, x, y, method, source_z) VALUES (?, ?, ?, ?, ?)', rows
+                )
+
+    def derived_tiles(self, method=None):
+        """{z: {(x, y)}} dos tiles derivados (só de um método, se informado)"""
+        self.flush()
+        query = 'SELECT z, x, y FROM derived'
+        params = ()
+        if method is not None:
+            query += ' WHERE method = ?'
+            params = (method,)
+        tiles = {}
+        for z, x, y in self.conn.execute(query, params):
+            tiles.setdefault(z, set()).add((x, y))
+        return tiles
+
+    def derived_stats(self):
+        """{z: {método: contagem}}"""
+        self.flush()
+        stats = {}
+        for z, method, count in self.conn.execute('SELECT z, method, COUNT(*) FROM derived GROUP BY z, method'):
+            stats.setdefault(z, {})[method] = count
+        return stats
+
+    def reset(self):
+        """
+        Esquecer o inventário (próximo reconcile relê a árvore inteira).
+        As marcas de derivados ficam: não dá para reconstruí-las do disco.
+        """
+        with self.lock:
+            self.pending = []
+            with self.conn:
+                self.conn.execute('DELETE FROM tiles')
+                self.conn.execute('DELETE FROM dirs')
+                self.conn.execute('DELETE FROM zoom_stats')
+
+    def zoom_stats(self):
+        """{z: (count, total_size, min_size, max_size)} — agregados + índice (z, size)"""
+        self.flush()
+        stats = {}
+        for z, count, total in self.conn.execute('SELECT z, count, total_size FROM zoom_stats WHERE count > 0 ORDER BY z'):
+            min_size = self.conn.execute('SELECT MIN(size) FROM tiles WHERE z = ?', (z,)).fetchone()[0]
+            max_size = self.conn.execute('SELECT MAX(size) FROM tiles WHERE z = ?', (z,)).fetchone()[0]
+            stats[z] = (count, total, min_size, max_size)
+        return stats
+
+    def zoom_tiles(self, z):
+        """{(x, y)} indexados no zoom z"""
+        self.flush()
+        return set(self.conn.execute('SELECT x, y FROM tiles WHERE z = ?', (z,)))
+
+    def totals(self):
+        """(tiles, bytes lógicos, bytes em disco, inodes compartilhados) — hardlinks contam uma vez"""
+        self.flush()
+        count, total = self.conn.execute(
+            'SELECT COALESCE(SUM(count), 0), COALESCE(SUM(total_size), 0) FROM zoom_stats'
+        ).fetchone()
+        shared, shared_size, shared_logical = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(size * n), 0) FROM'
+            ' (SELECT MAX(size) AS size, COUNT(*) AS n FROM tiles WHERE ino IS NOT NULL'
+            '  GROUP BY ino HAVING COUNT(*) > 1)'
+        ).fetchone()
+        unique = total - shared_logical + shared_size
+        return count, total, unique, shared
+
+    def problems(self):
+        """[(z, x, y, motivo, size)] dos tiles que falharam na verificação de integridade"""
+        self.flush()
+        return self.conn.execute(
+            'SELECT z, x, y, problem, size FROM tiles WHERE problem IS NOT NULL ORDER BY problem, z, x, y'
+        ).fetchall()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.conn.close()
@@ -0,0 +1,190 @@
+"""
+Matemática de tiles Web Mercator (slippy map), vetorizada com NumPy.
+
+deg2num estava copiado em três scripts (um deles com pi truncado em
+3.14159265359) e convertia um ponto por vez em Python puro. Aqui as conversões
+recebem arrays inteiros de lat/lon ou x/y, e as contagens de tiles por bbox
+são exatas e em O(1) por zoom. Também ficam aqui os helpers de bounds de tile
+e de quadkey (ordem Z / Morton) usados pelo planejamento.
+"""
+
+from math import atan, sinh, pi, degrees
+
+import numpy as np
+
+# Limite de latitude do Web Mercator: degrees(atan(sinh(pi)))
+MAX_LATITUDE = 85.0511287798066
+
+# Nível do prefixo de quadkey usado para dividir o trabalho entre processos:
+# 4^8 quadrantes (16×16 tiles cada em z=12), espalhados entre os shards por hash
+SHARD_PREFIX_LEVEL = 8
+
+
+def deg2num_array(lat, lon, zoom):
+    """Arrays de lat/lon (graus) → arrays (x, y) de tiles no zoom"""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    lon = np.asarray(lon, dtype=np.float64)
+    x = np.floor((lon + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n)
+    return (np.clip(x, 0, n - 1).astype(np.int64),
+            np.clip(y, 0, n - 1).astype(np.int64))
+
+
+def deg2num(lat, lon, zoom):
+    """Converter lat/lon para número de tile (escalar)"""
+    x, y = deg2num_array(lat, lon, zoom)
+    return int(x), int(y)
+
+
+def num2deg_array(x, y, zoom):
+    """Arrays (x, y) de tiles → arrays (lat, lon) do canto noroeste"""
+    n = 2 ** zoom
+    lon = np.asarray(x, dtype=np.float64) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * np.asarray(y, dtype=np.float64) / n))))
+    return lat, lon
+
+
+def tile_bbox(z, x, y):
+    """Retorna (west, south, east, north) em graus do tile z/x/y"""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = degrees(atan(sinh(pi * (1 - 2 * y / n))))
+    south = degrees(atan(sinh(pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def tile_bbox_array(zoom, x, y):
+    """Versão vetorizada de tile_bbox: arrays (west, south, east, north)"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    north, west = num2deg_array(x, y, zoom)
+    south, east = num2deg_array(x + 1, y + 1, zoom)
+    return west, south, east, north
+
+
+def bbox_tile_range(bounds, zoom):
+    """
+    Faixa de tiles (x_min, x_max, y_min, y_max), inclusiva, que cobre
+    bounds = {'north', 'south', 'west', 'east'}
+    """
+    xs, ys = deg2num_array([bounds['north'], bounds['south']], [bounds['west'], bounds['east']], zoom)
+    return int(xs.min()), int(xs.max()), int(ys.min()), int(ys.max())
+
+
+def count_bbox_tiles(bounds, zoom):
+    """Número exato de tiles que cobrem o bbox no zoom"""
+    x_min, x_max, y_min, y_max = bbox_tile_range(bounds, zoom)
+    return (x_max - x_min + 1) * (y_max - y_min + 1)
+
+
+def bbox_tiles(bounds, zoom):
+    """Array (N, 2) de (x, y) cobrindo o bbox, x por fora e y por dentro"""
+    x_min, x_max, y_min, y_max = bbox_tile_range(bounds, zoom)
+    xs, ys = np.meshgrid(np.arange(x_min, x_max + 1), np.arange(y_min, y_max + 1), indexing='ij')
+    return np.column_stack((xs.ravel(), ys.ravel()))
+
+
+def count_polygon_tiles(landmask, zoom, bounds=None):
+    """
+    Número exato de tiles que tocam o polígono da máscara (LandMask), limitado
+    ao bbox quando informado. Com buffer_deg=0 é a interseção geométrica.
+    """
+    if bounds is None:
+        return sum(1 for _ in landmask.tiles_for_zoom(zoom))
+    x_min, x_max, y_min, y_max = bbox_tile_range(bounds, zoom)
+    return sum(1 for _ in landmask.tiles_for_zoom(zoom, range(x_min, x_max + 1), range(y_min, y_max + 1)))
+
+
+def _spread_bits(v):
+    """Intercalar zeros entre os bits (x → x0 0 x1 0 ...), até 32 bits"""
+    v = np.asarray(v).astype(np.uint64)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def morton_codes(x, y):
+    """
+    Código Morton (ordem Z) de arrays x/y. Os dígitos em base 4 do código são
+    exatamente os dígitos do quadkey, então ordenar por ele agrupa tiles
+    vizinhos e code >> 2*(z - k) é o prefixo de quadkey de nível k.
+    """
+    return _spread_bits(x) | (_spread_bits(y) << np.uint64(1))
+
+
+def quadkey(z, x, y):
+    """Quadkey (string base 4, estilo Bing) do tile z/x/y"""
+    digits = []
+    for i in range(z, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def quadkey_to_tile(key):
+    """Inverso de quadkey(): retorna (z, x, y)"""
+    x = y = 0
+    z = len(key)
+    for i, digit in enumerate(key):
+        mask = 1 << (z - i - 1)
+        d = int(digit)
+        if d & 1:
+            x |= mask
+        if d & 2:
+            y |= mask
+    return z, x, y
+
+
+def quadkey_prefix(z, x, y, level):
+    """
+    Prefixo de quadkey de nível `level` do tile, como inteiro (código Morton).
+    Tiles acima do nível usam o quadrante do seu canto noroeste.
+    """
+    if z >= level:
+        px, py = x >> (z - level), y >> (z - level)
+    else:
+        px, py = x << (level - z), y << (level - z)
+    code = 0
+    for i in range(level):
+        code |= ((px >> i) & 1) << (2 * i) | ((py >> i) & 1) << (2 * i + 1)
+    return code
+
+
+def shard_of(z, x, y, shards, level=SHARD_PREFIX_LEVEL):
+    """
+    Shard (0..shards-1) de um tile. Quadrantes inteiros ficam no mesmo shard
+    (localidade nos diretórios x/); o hash multiplicativo do prefixo equilibra
+    a carga mesmo com a terra concentrada em poucos quadrantes (um simples
+    prefixo % shards repete o padrão Morton e desequilibra até 2:1).
+    """
+    h = (quadkey_prefix(z, x, y, level) * 2654435761) & 0xFFFFFFFF
+    return (h * shards) >> 32
+
+
+def hilbert_codes(x, y, order):
+    """
+    Índice na curva de Hilbert de arrays x/y numa grade 2^order × 2^order.
+    Tiles com índices próximos são vizinhos no mapa (ao contrário da ordem Z,
+    a curva nunca salta entre quadrantes distantes).
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    n = 1 << order
+    d = np.zeros(np.broadcast(x, y).shape, dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotacionar o quadrante para que a sub-curva comece onde a anterior terminou
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return d
@@ -0,0 +1,141 @@
+"""
+Índice lateral de validadores HTTP (ETag / Last-Modified) por tile.
+
+Permite o modo --refresh de download-tiles.py: em vez de `rm -rf tiles/*` e
+baixar tudo de novo, cada tile é revalidado com GET condicional
+(If-None-Match / If-Modified-Since). Tiles inalterados voltam 304 sem corpo e
+não são regravados. checked_at/changed_at permitem priorizar a revalidação
+pelos tiles verificados há mais tempo. sha1 é o hash dos bytes como o servidor
+os entregou: o arquivo em disco pode ter sido recomprimido pelo
+optimize-tiles.py, então a comparação de um 200 sem validadores usa este hash,
+não os bytes locais.
+"""
+
+import time
+from email.utils import formatdate
+
+from tilelib.sqlitedb import connect
+
+VALIDATORS_FILENAME = '.validators.sqlite'
+FLUSH_EVERY = 500
+
+
+class ValidatorIndex:
+    """Tabela (z, x, y) → etag, last_modified, checked_at, changed_at"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self.conn = connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS validators ('
+            ' z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,'
+            ' etag TEXT, last_modified TEXT,'
+            ' checked_at INTEGER NOT NULL DEFAULT 0, changed_at INTEGER NOT NULL DEFAULT 0,'
+            ' sha1 TEXT,'
+            ' PRIMARY KEY (z, x, y)) WITHOUT ROWID'
+        )
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(validators)')}
+        if 'sha1' not in columns:  # índice criado antes da coluna
+            self.conn.execute('ALTER TABLE validators ADD COLUMN sha1 TEXT')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS validators_age ON validators (checked_at, z)')
+        self.conn.commit()
+
+    def get(self, z, x, y):
+        """(etag, last_modified) conhecidos, ou (None, None)"""
+        row = self.conn.execute(
+            'SELECT etag, last_modified FROM validators WHERE z = ? AND x = ? AND y = ?', (z, x, y)
+        ).fetchone()
+        return row if row else (None, None)
+
+    def downloaded_hash(self, z, x, y):
+        """sha1 do último conteúdo recebido do servidor, ou None (sem flush: cada tile é visto uma vez por execução)"""
+        row = self.conn.execute(
+            'SELECT sha1 FROM validators WHERE z = ? AND x = ? AND y = ?', (z, x, y)
+        ).fetchone()
+        return row[0] if row else None
+
+    def conditional_headers(self, z, x, y, fallback_mtime=None):
+        """
+        Headers de GET condicional. Sem validadores gravados (ex.: tiles do dump
+        antigo), usa o mtime do arquivo como If-Modified-Since.
+        """
+        etag, last_modified = self.get(z, x, y)
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        elif fallback_mtime is not None:
+            headers['If-Modified-Since'] = formatdate(fallback_mtime, usegmt=True)
+        return headers
+
+    def record(self, z, x, y, etag=None, last_modified=None, changed=True, sha1=None):
+        """Registrar uma verificação (200 ou 304; sha1 do corpo num 200)"""
+        now = int(time.time())
+        self.pending.append((z, x, y, etag, last_modified, now, now if changed else 0, sha1))
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO validators (z, x, y, etag, last_modified, checked_at, changed_at, sha1)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (z, x, y) DO UPDATE SET'
+                '  etag = COALESCE(excluded.etag, etag),'
+                '  last_modified = COALESCE(excluded.last_modified, last_modified),'
+                '  checked_at = excluded.checked_at,'
+                '  changed_at = CASE WHEN excluded.changed_at > 0 THEN excluded.changed_at ELSE changed_at END,'
+                '  sha1 = COALESCE(excluded.sha1, sha1)',
+                self.pending
+            )
+        self.pending = []
+
+    def backfill_hashes(self, rows):
+        """
+        rows = [(z, x, y, sha1)] dos bytes originais de tiles baixados antes da
+        coluna sha1 (o optimize-tiles.py grava antes de recomprimi-los); um hash
+        já conhecido não é trocado
+        """
+        self.flush()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO validators (z, x, y, sha1) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (z, x, y) DO UPDATE SET sha1 = COALESCE(sha1, excluded.sha1)', rows
+            )
+
+    def ensure(self, tiles):
+        """Registrar tiles ainda desconhecidos com checked_at = 0 (nunca verificados)"""
+        batch = []
+        for z, x, y in tiles:
+            batch.append((z, x, y))
+            if len(batch) >= 10000:
+                self._ensure_batch(batch)
+                batch = []
+        self._ensure_batch(batch)
+
+    def _ensure_batch(self, batch):
+        if batch:
+            with self.conn:
+                self.conn.executemany('INSERT OR IGNORE INTO validators (z, x, y) VALUES (?, ?, ?)', batch)
+
+    def due(self, min_zoom, max_zoom, older_than_seconds, order='age'):
+        """
+        Tiles a revalidar, verificados há mais de older_than_seconds.
+        order='age': mais antigos primeiro (desempate por zoom baixo)
+        order='zoom': zooms baixos primeiro (mais visíveis), depois idade
+        """
+        self.flush()
+        order_by = 'z, checked_at' if order == 'zoom' else 'checked_at, z'
+        cutoff = int(time.time()) - older_than_seconds
+        return self.conn.execute(
+            f'SELECT z, x, y FROM validators WHERE z BETWEEN ? AND ? AND checked_at < ? ORDER BY {order_by}',
+            (min_zoom, max_zoom, cutoff)
+        ).fetchall()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
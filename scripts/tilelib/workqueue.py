@@ -0,0 +1,62 @@
+"""
+Pipeline produtor/consumidor para downloads.
+
+Um gerador preguiçoso de (z, x, y) alimenta uma asyncio.Queue limitada, servida
+por N workers de vida longa. Não há barreira de lote: um tile lento (5 retries)
+ocupa só o seu worker enquanto os outros continuam puxando da fila, e a memória
+fica constante — a lista completa de tiles nunca é materializada.
+"""
+
+import asyncio
+
+QUEUE_SIZE_PER_WORKER = 4
+
+
+async def run_pipeline(tiles, handle, workers, on_done=None, should_stop=None, queue_size=None,
+                       on_queue=None):
+    """
+    Processar `tiles` (qualquer iterável de (z, x, y)) com `workers` corrotinas.
+
+    handle(z, x, y) -> resultado (corrotina)
+    on_done(tile, resultado) é chamado a cada tile concluído
+    should_stop() interrompe o produtor; os workers descartam o que restou na fila
+    on_queue(fila) recebe a asyncio.Queue antes do início (métrica de profundidade)
+    Uma exceção do iterável ou de on_done cancela o produtor e os workers e é
+    repassada a quem chamou (nada fica preso num put() de fila cheia).
+    """
+    queue = asyncio.Queue(maxsize=queue_size or workers * QUEUE_SIZE_PER_WORKER)
+    if on_queue is not None:
+        on_queue(queue)
+
+    async def producer():
+        for tile in tiles:
+            if should_stop is not None and should_stop():
+                break
+            await queue.put(tile)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            tile = await queue.get()
+            if tile is None:
+                return
+            if should_stop is not None and should_stop():
+                continue
+            try:
+                result = await handle(*tile)
+            except Exception as e:
+                # Um tile com erro inesperado não pode derrubar o worker
+                result = (False, f"error_{type(e).__name__}")
+            if on_done is not None:
+                on_done(tile, result)
+
+    tasks = [asyncio.ensure_future(producer())] + [asyncio.ensure_future(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Worker morto: o produtor ficaria esperando vaga na fila para sempre
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise